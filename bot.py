@@ -22,8 +22,16 @@ from rich.traceback import install
 from src.common.logger import initialize_logging, get_logger, shutdown_logging
 initialize_logging()
 
+# 设置 MAIBOT_PROFILE_IMPORTS=1 时统计启动阶段各模块的导入耗时
+from src.common.import_profiler import import_profiler, PROFILE_IMPORTS_ENV #noqa
+if os.getenv(PROFILE_IMPORTS_ENV) == "1":
+    import_profiler.install()
+
 from src.main import MainSystem #noqa
 from src.manager.async_task_manager import async_task_manager #noqa
+from src.llm_models.model_client.base_client import client_registry #noqa
+from src.llm_models.response_cache import response_cache #noqa
+from src.llm_models.utils import llm_usage_recorder #noqa
 
 
 
@@ -104,6 +112,15 @@ async def graceful_shutdown():
             except Exception as e:
                 logger.error(f"等待任务取消时发生异常: {e}")
 
+        # 关闭各事件循环上缓存的API客户端连接池
+        await client_registry.close_all()
+
+        # 保存LLM响应缓存
+        response_cache.save_all()
+
+        # 写入尚未落盘的LLM用量记录
+        llm_usage_recorder.flush()
+
         logger.info("麦麦优雅关闭完成")
 
         # 关闭日志系统，释放文件句柄
@@ -0,0 +1,78 @@
+"""
+过滤词/过滤正则匹配性能对比
+
+对比逐个 `in` / `re.search` 的旧实现与预编译的 BanMatcher。
+用法: python scripts/benchmark_ban_matcher.py [--words 5000] [--regex 50] [--messages 2000]
+"""
+
+import argparse
+import importlib.util
+import os
+import random
+import re
+import string
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 直接按文件加载匹配器模块，避免导入整个 src.chat 包（需要数据库与配置）
+_spec = importlib.util.spec_from_file_location(
+    "ban_matcher", os.path.join(project_root, "src", "chat", "message_receive", "ban_matcher.py")
+)
+ban_matcher = importlib.util.module_from_spec(_spec)  # type: ignore
+_spec.loader.exec_module(ban_matcher)  # type: ignore
+
+CHARSET = string.ascii_lowercase + "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会"
+
+
+def random_text(rng: random.Random, min_len: int, max_len: int) -> str:
+    return "".join(rng.choice(CHARSET) for _ in range(rng.randint(min_len, max_len)))
+
+
+def legacy_check_words(text: str, ban_words) -> bool:
+    return any(word in text for word in ban_words)
+
+
+def legacy_check_regex(text: str, ban_regex) -> bool:
+    return any(re.search(pattern, text) for pattern in ban_regex)
+
+
+def run_benchmark(word_count: int, regex_count: int, message_count: int, seed: int = 42):
+    rng = random.Random(seed)
+    ban_words = {random_text(rng, 3, 8) for _ in range(word_count)}
+    ban_regex = {rf"{random_text(rng, 2, 4)}\d+{random_text(rng, 1, 3)}" for _ in range(regex_count)}
+    messages = [random_text(rng, 10, 120) for _ in range(message_count)]
+    # 混入少量命中样本
+    sample_words = list(ban_words)
+    for i in range(0, message_count, 50):
+        messages[i] += rng.choice(sample_words)
+
+    start = time.perf_counter()
+    matcher = ban_matcher.BanMatcher(ban_words, ban_regex)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy_results = [legacy_check_words(m, ban_words) or legacy_check_regex(m, ban_regex) for m in messages]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_results = [bool(matcher.match_word(m) or matcher.match_regex(m)) for m in messages]
+    new_time = time.perf_counter() - start
+
+    if legacy_results != new_results:
+        raise AssertionError("预编译匹配器与旧实现结果不一致")
+
+    print(f"过滤词: {len(ban_words)}  过滤正则: {len(ban_regex)}  消息数: {message_count}")
+    print(f"构建耗时: {build_time * 1000:.1f} ms")
+    print(f"旧实现:   {legacy_time * 1000:.1f} ms  ({legacy_time / message_count * 1e6:.1f} us/条)")
+    print(f"预编译:   {new_time * 1000:.1f} ms  ({new_time / message_count * 1e6:.1f} us/条)")
+    print(f"加速比:   {legacy_time / max(new_time, 1e-9):.1f}x  命中数: {sum(new_results)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="过滤词匹配性能对比")
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--regex", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+    run_benchmark(args.words, args.regex, args.messages)
@@ -0,0 +1,105 @@
+"""
+GIF抽帧内存/耗时对比
+
+对比旧实现（先解码全部帧再按MSE挑选）与流式感知哈希抽帧的峰值内存和耗时。
+用法: python scripts/benchmark_gif_sampler.py [--size 480] [--frames 200] [--gif path/to/file.gif]
+"""
+
+import argparse
+import importlib.util
+import io
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 直接按文件加载抽帧模块，避免导入整个 src.chat 包（需要数据库与配置）
+_spec = importlib.util.spec_from_file_location(
+    "gif_sampler", os.path.join(project_root, "src", "chat", "utils", "gif_sampler.py")
+)
+gif_sampler = importlib.util.module_from_spec(_spec)  # type: ignore
+_spec.loader.exec_module(gif_sampler)  # type: ignore
+
+
+def make_gif(size: int, frame_count: int) -> bytes:
+    """生成一个带移动色块的测试GIF，每隔几帧画面才有明显变化"""
+    rng = np.random.default_rng(42)
+    background = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+    frames = []
+    for i in range(frame_count):
+        data = background.copy()
+        offset = (i // 4) * 7 % (size - 40)
+        data[offset : offset + 40, offset : offset + 40] = (255, 0, 0)
+        frames.append(Image.fromarray(data).convert("P", palette=Image.Palette.ADAPTIVE))
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="GIF", save_all=True, append_images=frames[1:], duration=40, loop=0)
+    return buffer.getvalue()
+
+
+def legacy_transform(gif_data: bytes, similarity_threshold: float = 1000.0, max_frames: int = 15) -> Image.Image:
+    """旧实现：解码全部帧为RGB副本后按MSE挑选"""
+    gif = Image.open(io.BytesIO(gif_data))
+    all_frames = []
+    try:
+        while True:
+            gif.seek(len(all_frames))
+            all_frames.append(gif.convert("RGB").copy())
+    except EOFError:
+        pass
+    selected = [all_frames[0]]
+    last = np.array(all_frames[0])
+    for frame in all_frames[1:]:
+        current = np.array(frame)
+        if np.mean((current - last) ** 2) > similarity_threshold:
+            selected.append(frame)
+            last = current
+            if len(selected) >= max_frames:
+                break
+    width, height = selected[0].size
+    target_width = max(int(200 / height * width), 1)
+    combined = Image.new("RGB", (target_width * len(selected), 200))
+    for idx, frame in enumerate(selected):
+        combined.paste(frame.resize((target_width, 200), Image.Resampling.LANCZOS), (idx * target_width, 0))
+    return combined
+
+
+def measure(func, gif_data: bytes):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(gif_data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_benchmark(gif_data: bytes):
+    with Image.open(io.BytesIO(gif_data)) as gif:
+        print(f"GIF尺寸: {gif.size}  帧数: {getattr(gif, 'n_frames', 1)}  文件大小: {len(gif_data) / 1024:.0f} KB")
+
+    legacy_image, legacy_time, legacy_peak = measure(legacy_transform, gif_data)
+    new_image, new_time, new_peak = measure(gif_sampler.sample_gif_frames, gif_data)
+
+    print(
+        f"旧实现:   {legacy_time * 1000:.0f} ms  峰值内存 {legacy_peak / 1024 / 1024:.1f} MB  输出 {legacy_image.size}"
+    )
+    print(f"流式抽帧: {new_time * 1000:.0f} ms  峰值内存 {new_peak / 1024 / 1024:.1f} MB  输出 {new_image.size}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GIF抽帧内存/耗时对比")
+    parser.add_argument("--size", type=int, default=480, help="生成测试GIF的边长")
+    parser.add_argument("--frames", type=int, default=200, help="生成测试GIF的帧数")
+    parser.add_argument("--gif", type=str, default="", help="使用已有的GIF文件代替生成的测试GIF")
+    args = parser.parse_args()
+
+    if args.gif:
+        with open(args.gif, "rb") as f:
+            data = f.read()
+    else:
+        data = make_gif(args.size, args.frames)
+    run_benchmark(data)
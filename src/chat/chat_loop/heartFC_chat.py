@@ -2,6 +2,7 @@ import asyncio
 import time
 import traceback
 import random
+import functools
 from typing import List, Optional, Dict, Any, Tuple
 from rich.traceback import install
 from collections import deque
@@ -28,6 +29,7 @@ from src.mais4u.s4u_config import s4u_config
 from src.chat.chat_loop.hfc_utils import send_typing, stop_typing
 # 导入记忆系统
 from src.chat.memory_system.Hippocampus import hippocampus_manager
+from src.manager.background_job_scheduler import JobClass, background_job_scheduler
 from src.chat.frequency_control.talk_frequency_control import talk_frequency_control
 from src.chat.frequency_control.focus_value_control import focus_value_control
 
@@ -281,7 +283,8 @@ class HeartFChatting:
         
         if should_process:
             self.last_read_time = time.time()
-            await self._observe(interest_value = interest_value)
+            with background_job_scheduler.track_interactive():
+                await self._observe(interest_value = interest_value)
 
         else:
             # Normal模式：消息数量不足，等待
@@ -378,14 +381,16 @@ class HeartFChatting:
 
         async with global_prompt_manager.async_message_scope(self.chat_stream.context.get_template_name()):
             await self.relationship_builder.build_relation()
-            await self.expression_learner.trigger_learning_for_chat()
+            # 表达学习和记忆构建交给后台任务调度器，不阻塞本次思考
+            background_job_scheduler.submit(
+                JobClass.EXPRESSION, f"expression:{self.stream_id}", self.expression_learner.trigger_learning_for_chat
+            )
+            background_job_scheduler.submit(
+                JobClass.MEMORY,
+                f"memory:{self.stream_id}",
+                functools.partial(hippocampus_manager.build_memory_for_chat, self.stream_id),
+            )
 
-            # 记忆构建：为当前chat_id构建记忆
-            try:
-                await hippocampus_manager.build_memory_for_chat(self.stream_id)
-            except Exception as e:
-                logger.error(f"{self.log_prefix} 记忆构建失败: {e}")
-                
 
             if random.random() > self.focus_value_control.get_current_focus_value() and mode == ChatMode.FOCUS:
                 #如果激活度没有激活，并且聊天活跃度低，有可能不进行plan，相当于不在电脑前，不进行认真思考
@@ -414,7 +419,7 @@ class HeartFChatting:
                     current_available_actions=planner_info[2],
                 )
                 if not await events_manager.handle_mai_events(
-                    EventType.ON_PLAN, None, prompt_info[0], None, self.chat_stream.stream_id
+                    EventType.ON_PLAN, None, f"{prompt_info[2]}\n{prompt_info[0]}", None, self.chat_stream.stream_id
                 ):
                     return False
                 with Timer("规划器", cycle_timers):
@@ -8,17 +8,20 @@ import traceback
 import io
 import re
 import binascii
+import functools
 
-from typing import Optional, Tuple, List, Any
+from typing import Optional, Tuple, List, Any, Dict, Iterable, Set
 from PIL import Image
 from rich.traceback import install
 
 from src.common.database.database_model import Emoji
 from src.common.database.database import db as peewee_db
 from src.common.logger import get_logger
+from src.manager.background_job_scheduler import JobClass, background_job_scheduler
 from src.config.config import global_config, model_config
 from src.chat.utils.utils_image import image_path_to_base64, get_image_manager
 from src.llm_models.utils_model import LLMRequest
+from .emoji_watcher import DirectoryWatcher
 
 install(extra_lines=3)
 
@@ -28,6 +31,8 @@ BASE_DIR = os.path.join("data")
 EMOJI_DIR = os.path.join(BASE_DIR, "emoji")  # 表情包存储目录
 EMOJI_REGISTERED_DIR = os.path.join(BASE_DIR, "emoji_registed")  # 已注册的表情包注册目录
 MAX_EMOJI_FOR_PROMPT = 20  # 最大允许的表情包描述数量于图片替换的 prompt 中
+EMOJI_FILE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif")
+EMOJI_REGISTER_CONCURRENCY = 2  # 同时注册的新表情包数量上限（每个注册都要调用VLM）
 
 """
 还没经过测试，有些地方数据库和内存数据同步可能不完全
@@ -295,6 +300,11 @@ def _to_emoji_objects(data: Any) -> Tuple[List["MaiEmoji"], int]:
     return emoji_objects, load_errors
 
 
+def _path_key(path: str) -> str:
+    """路径索引的键，数据库中的相对路径和拼接出的路径指向同一文件时得到相同的键"""
+    return os.path.normcase(os.path.abspath(path))
+
+
 def _ensure_emoji_dir() -> None:
     """确保表情存储目录存在"""
     os.makedirs(EMOJI_DIR, exist_ok=True)
@@ -388,6 +398,14 @@ class EmojiManager:
         self.emoji_num_max = global_config.emoji.max_reg_num
         self.emoji_num_max_reach_deletion = global_config.emoji.do_replace
         self.emoji_objects: list[MaiEmoji] = []  # 存储MaiEmoji对象的列表，使用类型注解明确列表元素类型
+        # 与 emoji_objects 同步维护的索引，增删都通过 _add_emoji / _remove_emojis 进行
+        self._emoji_by_hash: Dict[str, MaiEmoji] = {}
+        self._emoji_by_path: Dict[str, MaiEmoji] = {}
+
+        self._registering: Set[str] = set()  # 正在注册的文件名，避免同一文件重复排队
+        self._register_tasks: Set[asyncio.Task] = set()
+        self._register_semaphore = asyncio.Semaphore(EMOJI_REGISTER_CONCURRENCY)
+        self._capacity_lock = asyncio.Lock()  # 并发注册时串行执行容量检查和入库，避免超出上限
 
         logger.info("启动表情包管理器")
 
@@ -400,6 +418,29 @@ class EmojiManager:
         Emoji.create_table(safe=True)  # Ensures table exists
         self._initialized = True
 
+    def _set_emoji_objects(self, emoji_objects: List["MaiEmoji"]) -> None:
+        """替换全部表情包并重建索引"""
+        self.emoji_objects = emoji_objects
+        self._emoji_by_hash = {emoji.hash: emoji for emoji in emoji_objects}
+        self._emoji_by_path = {_path_key(emoji.full_path): emoji for emoji in emoji_objects}
+        self.emoji_num = len(emoji_objects)
+
+    def _add_emoji(self, emoji: "MaiEmoji") -> None:
+        self.emoji_objects.append(emoji)
+        self._emoji_by_hash[emoji.hash] = emoji
+        self._emoji_by_path[_path_key(emoji.full_path)] = emoji
+        self.emoji_num = len(self.emoji_objects)
+
+    def _remove_emojis(self, emojis: Iterable["MaiEmoji"]) -> None:
+        """从列表和索引中移除一批表情包"""
+        removed_ids = {id(emoji) for emoji in emojis}
+        if not removed_ids:
+            return
+        self.emoji_objects = [e for e in self.emoji_objects if id(e) not in removed_ids]
+        self._emoji_by_hash = {h: e for h, e in self._emoji_by_hash.items() if id(e) not in removed_ids}
+        self._emoji_by_path = {p: e for p, e in self._emoji_by_path.items() if id(e) not in removed_ids}
+        self.emoji_num = len(self.emoji_objects)
+
     def _ensure_db(self) -> None:
         """确保数据库已初始化"""
         if not self._initialized:
@@ -531,7 +572,6 @@ class EmojiManager:
             #     return
 
             total_count = len(self.emoji_objects)
-            self.emoji_num = total_count
             removed_count = 0
             # 使用列表复制进行遍历，因为我们会在遍历过程中修改列表
             objects_to_remove = []
@@ -548,8 +588,6 @@ class EmojiManager:
                         # 执行表情包对象的删除方法
                         await emoji.delete()  # delete 方法现在会标记 is_deleted
                         objects_to_remove.append(emoji)  # 标记删除后，也收集起来移除
-                        # 更新计数
-                        self.emoji_num -= 1
                         removed_count += 1
                         continue
 
@@ -558,7 +596,6 @@ class EmojiManager:
                         logger.warning(f"[检查] 表情包描述为空，视为无效: {emoji.filename}")
                         await emoji.delete()
                         objects_to_remove.append(emoji)
-                        self.emoji_num -= 1
                         removed_count += 1
                         continue
 
@@ -567,9 +604,8 @@ class EmojiManager:
                     # 即使出错，也尝试继续检查下一个
                     continue
 
-            # 从 self.emoji_objects 中移除标记的对象
-            if objects_to_remove:
-                self.emoji_objects = [e for e in self.emoji_objects if e not in objects_to_remove]
+            # 从 self.emoji_objects 和索引中移除标记的对象
+            self._remove_emojis(objects_to_remove)
 
             # 清理 EMOJI_REGISTERED_DIR 目录中未被追踪的文件
             removed_count = await clean_unused_emojis(EMOJI_REGISTERED_DIR, self.emoji_objects, removed_count)
@@ -586,60 +622,111 @@ class EmojiManager:
             logger.error(traceback.format_exc())
 
     async def start_periodic_check_register(self) -> None:
-        """定期检查表情包完整性和数量"""
+        """
+        监视表情包目录并注册新表情包
+
+        启动时全量检查一次已注册表情包的完整性，之后由目录变化通知驱动：
+        表情包目录中新写入的文件排队注册（最多同时注册 EMOJI_REGISTER_CONCURRENCY 个），
+        已注册目录中被删除的文件同步删除数据库记录。每隔 check_interval 清理临时文件，
+        并重新扫描一次表情包目录，处理之前因容量已满等原因没有注册的文件。
+        """
         await self.get_all_emoji_from_db()
-        while True:
-            # logger.info("[扫描] 开始检查表情包完整性...")
-            await self.check_emoji_file_integrity()
-            await clear_temp_emoji()
-            logger.info("[扫描] 开始扫描新表情包...")
-
-            # 检查表情包目录是否存在
-            if not os.path.exists(EMOJI_DIR):
-                logger.warning(f"[警告] 表情包目录不存在: {EMOJI_DIR}")
-                os.makedirs(EMOJI_DIR, exist_ok=True)
-                logger.info(f"[创建] 已创建表情包目录: {EMOJI_DIR}")
-                await asyncio.sleep(global_config.emoji.check_interval * 60)
-                continue
+        await self.check_emoji_file_integrity()
+        _ensure_emoji_dir()
 
-            # 检查目录是否为空
-            files = os.listdir(EMOJI_DIR)
-            if not files:
-                logger.warning(f"[警告] 表情包目录为空: {EMOJI_DIR}")
-                await asyncio.sleep(global_config.emoji.check_interval * 60)
-                continue
+        watcher = DirectoryWatcher([EMOJI_DIR, EMOJI_REGISTERED_DIR])
+        logger.info(f"[扫描] 使用{watcher.backend_name}监视表情包目录")
+        try:
+            await asyncio.gather(self._watch_emoji_dirs(watcher), self._periodic_rescan())
+        finally:
+            watcher.close()
 
-            # 检查是否需要处理表情包(数量超过最大值或不足)
-            if global_config.emoji.steal_emoji and (
-                (self.emoji_num > self.emoji_num_max and global_config.emoji.do_replace)
-                or (self.emoji_num < self.emoji_num_max)
-            ):
-                try:
-                    # 获取目录下所有图片文件
-                    files_to_process = [
-                        f
-                        for f in files
-                        if os.path.isfile(os.path.join(EMOJI_DIR, f))
-                        and f.lower().endswith((".jpg", ".jpeg", ".png", ".gif"))
-                    ]
-
-                    # 处理每个符合条件的文件
-                    for filename in files_to_process:
-                        # 尝试注册表情包
-                        success = await self.register_emoji_by_filename(filename)
-                        if success:
-                            # 注册成功则跳出循环
-                            break
-
-                        # 注册失败则删除对应文件
-                        file_path = os.path.join(EMOJI_DIR, filename)
-                        os.remove(file_path)
-                        logger.warning(f"[清理] 删除注册失败的表情包文件: {filename}")
-                except Exception as e:
-                    logger.error(f"[错误] 扫描表情包目录失败: {str(e)}")
+    async def _watch_emoji_dirs(self, watcher: DirectoryWatcher) -> None:
+        async for batch in watcher.watch():
+            try:
+                if batch.overflow:
+                    logger.warning("[扫描] 目录变化事件溢出，执行全量检查")
+                    await self.check_emoji_file_integrity()
+                    self._scan_emoji_dir()
+                    continue
+                if registered_changes := batch.changes.get(EMOJI_REGISTERED_DIR):
+                    await self._handle_registered_files_removed(registered_changes.removed)
+                if new_changes := batch.changes.get(EMOJI_DIR):
+                    for filename in new_changes.added:
+                        self._schedule_registration(filename)
+            except Exception as e:
+                logger.error(f"[错误] 处理表情包目录变化失败: {str(e)}")
+                logger.error(traceback.format_exc())
 
+    async def _periodic_rescan(self) -> None:
+        while True:
+            await clear_temp_emoji()
+            self._scan_emoji_dir()
             await asyncio.sleep(global_config.emoji.check_interval * 60)
 
+    def _can_register(self) -> bool:
+        """是否需要注册新表情包（允许偷表情包，且数量未满或允许替换）"""
+        return global_config.emoji.steal_emoji and (
+            self.emoji_num < self.emoji_num_max or global_config.emoji.do_replace
+        )
+
+    def _scan_emoji_dir(self) -> None:
+        """列出表情包目录，把尚未注册的文件加入注册队列"""
+        if not os.path.exists(EMOJI_DIR):
+            logger.warning(f"[警告] 表情包目录不存在: {EMOJI_DIR}")
+            os.makedirs(EMOJI_DIR, exist_ok=True)
+            logger.info(f"[创建] 已创建表情包目录: {EMOJI_DIR}")
+            return
+        try:
+            for filename in os.listdir(EMOJI_DIR):
+                if os.path.isfile(os.path.join(EMOJI_DIR, filename)):
+                    self._schedule_registration(filename)
+        except Exception as e:
+            logger.error(f"[错误] 扫描表情包目录失败: {str(e)}")
+
+    def _schedule_registration(self, filename: str) -> None:
+        if filename in self._registering or not filename.lower().endswith(EMOJI_FILE_EXTENSIONS):
+            return
+        if not self._can_register():
+            return
+        self._registering.add(filename)
+        task = asyncio.create_task(self._register_new_file(filename))
+        self._register_tasks.add(task)
+        task.add_done_callback(self._register_tasks.discard)
+
+    async def _register_new_file(self, filename: str) -> None:
+        file_path = os.path.join(EMOJI_DIR, filename)
+        try:
+            async with self._register_semaphore:
+                # 排队期间文件可能已被清理，或者表情包已经注册满
+                if not os.path.exists(file_path) or not self._can_register():
+                    return
+                success = await background_job_scheduler.run(
+                    JobClass.EMOJI, f"emoji:{filename}", functools.partial(self.register_emoji_by_filename, filename)
+                )
+                # 注册失败则删除对应文件
+                if not success and os.path.exists(file_path):
+                    os.remove(file_path)
+                    logger.warning(f"[清理] 删除注册失败的表情包文件: {filename}")
+        except Exception as e:
+            logger.error(f"[错误] 注册表情包失败 ({filename}): {str(e)}")
+        finally:
+            self._registering.discard(filename)
+
+    async def _handle_registered_files_removed(self, filenames: Set[str]) -> None:
+        """已注册目录中的文件被外部删除时，删除对应的数据库记录"""
+        missing = []
+        for filename in filenames:
+            full_path = os.path.join(EMOJI_REGISTERED_DIR, filename)
+            emoji = self._emoji_by_path.get(_path_key(full_path))
+            # 找不到或已标记删除的是管理器自己删除/替换的文件
+            if emoji is None or emoji.is_deleted or os.path.exists(full_path):
+                continue
+            logger.warning(f"[检查] 表情包文件丢失: {full_path}")
+            await emoji.delete()
+            missing.append(emoji)
+        self._remove_emojis(missing)
+
     async def get_all_emoji_from_db(self) -> None:
         """获取所有表情包并初始化为MaiEmoji类对象，更新 self.emoji_objects"""
         try:
@@ -649,9 +736,8 @@ class EmojiManager:
             emoji_peewee_instances = Emoji.select()
             emoji_objects, load_errors = _to_emoji_objects(emoji_peewee_instances)
 
-            # 更新内存中的列表和数量
-            self.emoji_objects = emoji_objects
-            self.emoji_num = len(emoji_objects)
+            # 更新内存中的列表、索引和数量
+            self._set_emoji_objects(emoji_objects)
 
             logger.info(f"[数据库] 加载完成: 共加载 {self.emoji_num} 个表情包记录。")
             if load_errors > 0:
@@ -659,8 +745,7 @@ class EmojiManager:
 
         except Exception as e:
             logger.error(f"[错误] 从数据库加载所有表情包对象失败: {str(e)}")
-            self.emoji_objects = []  # 加载失败则清空列表
-            self.emoji_num = 0
+            self._set_emoji_objects([])  # 加载失败则清空列表
 
     async def get_emoji_from_db(self, emoji_hash: Optional[str] = None) -> List["MaiEmoji"]:
         """获取指定哈希值的表情包并初始化为MaiEmoji类对象列表 (主要用于调试或特定查找)
@@ -695,19 +780,18 @@ class EmojiManager:
             return []
 
     async def get_emoji_from_manager(self, emoji_hash: str) -> Optional["MaiEmoji"]:
-        # sourcery skip: use-next
-        """从内存中的 emoji_objects 列表获取表情包
+        """从内存中的哈希索引获取表情包
 
         参数:
             emoji_hash: 要查找的表情包哈希值
         返回:
             MaiEmoji 或 None: 如果找到则返回 MaiEmoji 对象，否则返回 None
         """
-        for emoji in self.emoji_objects:
-            # 确保对象未被标记为删除且哈希值匹配
-            if not emoji.is_deleted and emoji.hash == emoji_hash:
-                return emoji
-        return None  # 如果循环结束还没找到，则返回 None
+        emoji = self._emoji_by_hash.get(emoji_hash)
+        # 确保对象未被标记为删除
+        if emoji is not None and not emoji.is_deleted:
+            return emoji
+        return None
     
     async def get_emoji_tag_by_hash(self, emoji_hash: str) -> Optional[str]:
         """根据哈希值获取已注册表情包的描述
@@ -796,10 +880,8 @@ class EmojiManager:
             success = await emoji.delete()
 
             if success:
-                # 从emoji_objects列表中移除该对象
-                self.emoji_objects = [e for e in self.emoji_objects if e.hash != emoji_hash]
-                # 更新计数
-                self.emoji_num -= 1
+                # 从emoji_objects列表和索引中移除该对象
+                self._remove_emojis([emoji])
                 logger.info(f"[统计] 当前表情包数量: {self.emoji_num}")
 
                 return True
@@ -878,8 +960,7 @@ class EmojiManager:
                         # 修复：等待异步注册完成
                         register_success = await new_emoji.register_to_db()
                         if register_success:
-                            self.emoji_objects.append(new_emoji)
-                            self.emoji_num += 1
+                            self._add_emoji(new_emoji)
                             logger.info(f"[成功] 注册: {new_emoji.filename}")
                             return True
                         else:
@@ -1059,40 +1140,46 @@ class EmojiManager:
                 return False
 
             # 4. 检查容量并决定是否替换或直接注册
-            if self.emoji_num >= self.emoji_num_max:
-                logger.warning(f"表情包数量已达到上限({self.emoji_num}/{self.emoji_num_max})，尝试替换...")
-                replaced = await self.replace_a_emoji(new_emoji)
-                if not replaced:
-                    logger.error("[注册失败] 替换表情包失败，无法完成注册")
-                    # 替换失败，删除新表情包文件
-                    try:
-                        os.remove(file_full_path)  # new_emoji 的 full_path 此时还是源路径
-                        logger.info(f"[清理] 删除替换失败的新表情文件: {filename}")
-                    except Exception as e:
-                        logger.error(f"[错误] 删除替换失败文件时出错: {str(e)}")
+            # 生成描述期间可能有其他注册完成，在锁内重新检查重复和容量
+            async with self._capacity_lock:
+                if await self.get_emoji_from_manager(new_emoji.hash):
+                    logger.warning(f"[注册跳过] 表情包已在其他注册中完成 (Hash: {new_emoji.hash}): {filename}")
+                    os.remove(file_full_path)
                     return False
-                # 替换成功时，replace_a_emoji 内部已处理 new_emoji 的注册和添加到列表
-                return True
-            else:
-                # 直接注册
-                register_success = await new_emoji.register_to_db()  # 此方法会移动文件并更新 DB
-                if register_success:
-                    # 注册成功后，添加到内存列表
-                    self.emoji_objects.append(new_emoji)
-                    self.emoji_num += 1
-                    logger.info(f"[成功] 注册新表情包: {filename} (当前: {self.emoji_num}/{self.emoji_num_max})")
-                    return True
-                else:
-                    logger.error(f"[注册失败] 保存表情包到数据库/移动文件失败: {filename}")
-                    # register_to_db 失败时，内部会尝试清理移动后的文件，源文件可能还在
-                    # 是否需要删除源文件？
-                    if os.path.exists(file_full_path):
+
+                if self.emoji_num >= self.emoji_num_max:
+                    logger.warning(f"表情包数量已达到上限({self.emoji_num}/{self.emoji_num_max})，尝试替换...")
+                    replaced = await self.replace_a_emoji(new_emoji)
+                    if not replaced:
+                        logger.error("[注册失败] 替换表情包失败，无法完成注册")
+                        # 替换失败，删除新表情包文件
                         try:
-                            os.remove(file_full_path)
-                            logger.info(f"[清理] 删除注册失败的源文件: {filename}")
+                            os.remove(file_full_path)  # new_emoji 的 full_path 此时还是源路径
+                            logger.info(f"[清理] 删除替换失败的新表情文件: {filename}")
                         except Exception as e:
-                            logger.error(f"[错误] 删除注册失败源文件时出错: {str(e)}")
-                    return False
+                            logger.error(f"[错误] 删除替换失败文件时出错: {str(e)}")
+                        return False
+                    # 替换成功时，replace_a_emoji 内部已处理 new_emoji 的注册和添加到列表
+                    return True
+                else:
+                    # 直接注册
+                    register_success = await new_emoji.register_to_db()  # 此方法会移动文件并更新 DB
+                    if register_success:
+                        # 注册成功后，添加到内存列表
+                        self._add_emoji(new_emoji)
+                        logger.info(f"[成功] 注册新表情包: {filename} (当前: {self.emoji_num}/{self.emoji_num_max})")
+                        return True
+                    else:
+                        logger.error(f"[注册失败] 保存表情包到数据库/移动文件失败: {filename}")
+                        # register_to_db 失败时，内部会尝试清理移动后的文件，源文件可能还在
+                        # 是否需要删除源文件？
+                        if os.path.exists(file_full_path):
+                            try:
+                                os.remove(file_full_path)
+                                logger.info(f"[清理] 删除注册失败的源文件: {filename}")
+                            except Exception as e:
+                                logger.error(f"[错误] 删除注册失败源文件时出错: {str(e)}")
+                        return False
 
         except Exception as e:
             logger.error(f"[错误] 注册表情包时发生未预期错误 ({filename}): {str(e)}")
@@ -0,0 +1,188 @@
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from src.common.logger import get_logger
+
+logger = get_logger("emoji")
+
+DEBOUNCE_SECONDS = 1.0
+"""收到第一个事件后等待的时间，把同一批文件的事件合并处理"""
+POLL_INTERVAL_SECONDS = 10.0
+"""不支持inotify时轮询目录的间隔"""
+
+# inotify 常量，见 <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+_ADDED_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO
+_REMOVED_MASK = _IN_DELETE | _IN_MOVED_FROM
+
+
+@dataclass
+class DirChanges:
+    """一个目录中一批文件的变化（只包含文件名）"""
+
+    added: Set[str] = field(default_factory=set)
+    """新写入完成或移入的文件"""
+    removed: Set[str] = field(default_factory=set)
+    """被删除或移出的文件"""
+
+
+@dataclass
+class WatchBatch:
+    changes: Dict[str, DirChanges]
+    overflow: bool = False
+    """事件队列溢出，部分变化丢失，调用方需要全量检查目录"""
+
+
+class DirectoryWatcher:
+    """
+    监视若干目录中文件的新增和删除
+
+    Linux 下通过 inotify（ctypes 调用 libc）接收目录变化通知，其他平台或 inotify 不可用时
+    退化为定时轮询目录：文件的大小和修改时间在两次轮询间保持不变才视为写入完成。
+    """
+
+    def __init__(self, directories: List[str]) -> None:
+        self.directories = directories
+        self._fd: Optional[int] = None
+        self._wd_to_dir: Dict[int, str] = {}
+        self._pending: Dict[str, DirChanges] = {}
+        self._overflow = False
+        self._wakeup = asyncio.Event()
+        if sys.platform.startswith("linux"):
+            self._init_inotify()
+
+    @property
+    def backend_name(self) -> str:
+        return "inotify" if self._fd is not None else "轮询"
+
+    def _init_inotify(self) -> None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+            for directory in self.directories:
+                wd = libc.inotify_add_watch(fd, os.fsencode(directory), _ADDED_MASK | _REMOVED_MASK)
+                if wd < 0:
+                    os.close(fd)
+                    raise OSError(ctypes.get_errno(), f"无法监视目录 {directory}")
+                self._wd_to_dir[wd] = directory
+            self._fd = fd
+        except Exception as e:
+            logger.warning(f"[监视] inotify 不可用，改为轮询表情包目录: {e}")
+            self._fd = None
+            self._wd_to_dir.clear()
+
+    def _changes_of(self, directory: str) -> DirChanges:
+        if directory not in self._pending:
+            self._pending[directory] = DirChanges()
+        return self._pending[directory]
+
+    def _on_inotify_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)  # type: ignore
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_len].rstrip(b"\0"))
+            offset += name_len
+            if mask & _IN_Q_OVERFLOW:
+                self._overflow = True
+                continue
+            directory = self._wd_to_dir.get(wd)
+            if directory is None or not name:
+                continue
+            changes = self._changes_of(directory)
+            if mask & _ADDED_MASK:
+                changes.added.add(name)
+                changes.removed.discard(name)
+            elif mask & _REMOVED_MASK:
+                changes.removed.add(name)
+                changes.added.discard(name)
+        self._wakeup.set()
+
+    async def _poll(self) -> None:
+        """轮询目录，把变化写入待处理的事件中"""
+        known: Dict[str, Dict[str, Tuple[int, int]]] = {d: self._snapshot(d) for d in self.directories}
+        unstable: Dict[str, Dict[str, Tuple[int, int]]] = {d: {} for d in self.directories}
+        while True:
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            for directory in self.directories:
+                current = await asyncio.to_thread(self._snapshot, directory)
+                previous = known[directory]
+                changes = self._changes_of(directory)
+                changes.removed.update(name for name in previous if name not in current)
+                for name, signature in current.items():
+                    if previous.get(name) == signature:
+                        continue
+                    # 新文件或被改写的文件，等下一次轮询确认大小和修改时间不再变化
+                    if unstable[directory].get(name) == signature:
+                        changes.added.add(name)
+                        previous[name] = signature
+                        del unstable[directory][name]
+                    else:
+                        unstable[directory][name] = signature
+                for name in list(unstable[directory]):
+                    if name not in current:
+                        del unstable[directory][name]
+                known[directory] = {name: sig for name, sig in previous.items() if name in current}
+            if any(c.added or c.removed for c in self._pending.values()):
+                self._wakeup.set()
+
+    @staticmethod
+    def _snapshot(directory: str) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    async def watch(self) -> AsyncIterator[WatchBatch]:
+        """持续产出合并后的目录变化"""
+        loop = asyncio.get_running_loop()
+        poll_task = None
+        if self._fd is not None:
+            loop.add_reader(self._fd, self._on_inotify_readable)
+        else:
+            poll_task = asyncio.create_task(self._poll())
+        try:
+            while True:
+                await self._wakeup.wait()
+                await asyncio.sleep(DEBOUNCE_SECONDS)
+                self._wakeup.clear()
+                batch = WatchBatch(changes=self._pending, overflow=self._overflow)
+                self._pending = {}
+                self._overflow = False
+                yield batch
+        finally:
+            if self._fd is not None:
+                loop.remove_reader(self._fd)
+            if poll_task:
+                poll_task.cancel()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
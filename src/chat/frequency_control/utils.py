@@ -1,4 +1,6 @@
-from typing import Optional
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
 import hashlib
 
 
@@ -34,4 +36,90 @@ def parse_stream_config_to_chat_id(stream_config_str: str) -> Optional[str]:
         return hashlib.md5(key.encode()).hexdigest()
 
     except (ValueError, IndexError):
-        return None
\ No newline at end of file
+        return None
+
+
+def current_minute_of_day() -> int:
+    """当前时间在一天中的分钟数"""
+    now = datetime.now()
+    return now.hour * 60 + now.minute
+
+
+class TimeSchedule:
+    """按一天中的分钟数排序的时段配置，二分查找当前时段的值"""
+
+    __slots__ = ("minutes", "values")
+
+    def __init__(self, pairs: List[Tuple[int, float]]):
+        # 稳定排序，同一时刻的多个配置以最后一个为准
+        pairs = sorted(pairs, key=lambda x: x[0])
+        self.minutes = [minutes for minutes, _ in pairs]
+        self.values = [value for _, value in pairs]
+
+    @classmethod
+    def parse(cls, time_value_list: Sequence[str]) -> Optional["TimeSchedule"]:
+        """
+        解析 ["HH:MM,value", ...] 形式的配置，忽略格式错误的项
+
+        Returns:
+            TimeSchedule: 时段配置，如果没有有效项则返回 None
+        """
+        pairs = []
+        for time_value_str in time_value_list:
+            try:
+                time_str, value_str = time_value_str.split(",")
+                hour, minute = map(int, time_str.split(":"))
+                pairs.append((hour * 60 + minute, float(value_str)))
+            except (ValueError, IndexError):
+                continue
+        return cls(pairs) if pairs else None
+
+    def value_at(self, minute_of_day: int) -> float:
+        """获取指定时刻所在时段的值，早于所有配置时间时使用最后一个时段的值（跨天逻辑）"""
+        index = bisect_right(self.minutes, minute_of_day) - 1
+        return self.values[index]
+
+
+class CompiledScheduleConfig:
+    """
+    将 [["platform:id:type", "HH:MM,value", ...], ...] 形式的配置预编译为 chat_id -> TimeSchedule
+
+    第一个元素为空字符串的配置是全局配置；同一个聊天流或全局配置出现多次时以第一个为准。
+    """
+
+    def __init__(self, config_items: Sequence[Sequence[str]]):
+        self.stream_schedules: Dict[str, Optional[TimeSchedule]] = {}
+        self.global_schedule: Optional[TimeSchedule] = None
+        has_global = False
+        for config_item in config_items:
+            if not config_item or len(config_item) < 2:
+                continue
+            if config_item[0] == "":
+                if not has_global:
+                    has_global = True
+                    self.global_schedule = TimeSchedule.parse(config_item[1:])
+                continue
+            config_chat_id = parse_stream_config_to_chat_id(config_item[0])
+            if config_chat_id is not None and config_chat_id not in self.stream_schedules:
+                self.stream_schedules[config_chat_id] = TimeSchedule.parse(config_item[1:])
+
+    def get_stream_value(self, chat_id: str, minute_of_day: int) -> Optional[float]:
+        schedule = self.stream_schedules.get(chat_id)
+        return None if schedule is None else schedule.value_at(minute_of_day)
+
+    def get_global_value(self, minute_of_day: int) -> Optional[float]:
+        return None if self.global_schedule is None else self.global_schedule.value_at(minute_of_day)
+
+
+_compiled_configs: Dict[str, Tuple[Sequence, int, CompiledScheduleConfig]] = {}
+"""配置项名称 -> (配置列表, 长度, 预编译结果)，每个配置项只保留最新一份"""
+
+
+def get_compiled_schedule(config_name: str, config_items: Sequence[Sequence[str]]) -> CompiledScheduleConfig:
+    """获取配置列表对应的预编译时段表，配置列表被替换或长度变化（重新加载）时重新编译并替换旧结果"""
+    cached = _compiled_configs.get(config_name)
+    if cached is not None and cached[0] is config_items and cached[1] == len(config_items):
+        return cached[2]
+    compiled = CompiledScheduleConfig(config_items)
+    _compiled_configs[config_name] = (config_items, len(config_items), compiled)
+    return compiled
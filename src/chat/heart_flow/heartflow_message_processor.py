@@ -1,4 +1,4 @@
-import asyncio
+import functools
 import re
 import math
 import traceback
@@ -14,6 +14,7 @@ from src.chat.utils.utils import is_mentioned_bot_in_message
 from src.chat.utils.timer_calculator import Timer
 from src.chat.utils.chat_message_builder import replace_user_references_sync
 from src.common.logger import get_logger
+from src.manager.background_job_scheduler import JobClass, background_job_scheduler
 from src.mood.mood_manager import mood_manager
 from src.person_info.person_info import Person
 
@@ -121,7 +122,12 @@ class HeartFCMessageReceiver:
             # subheartflow.add_message_to_normal_chat_cache(message, interested_rate, is_mentioned)
             if global_config.mood.enable_mood:  
                 chat_mood = mood_manager.get_mood_by_chat_id(subheartflow.chat_id)
-                asyncio.create_task(chat_mood.update_mood_by_message(message, interested_rate))
+                # 情绪更新按每条消息的兴趣度各自判定概率，不能合并，否则聊天越活跃更新越少
+                background_job_scheduler.submit(
+                    JobClass.MOOD,
+                    None,
+                    functools.partial(chat_mood.update_mood_by_message, message, interested_rate),
+                )
 
             # 3. 日志记录
             mes_name = chat.group_info.group_name if chat.group_info else "私聊"
@@ -3,8 +3,9 @@ import json
 import os
 import math
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -63,6 +64,31 @@ EMBEDDING_TEST_STRINGS = [
 ]
 EMBEDDING_TEST_FILE = os.path.join(ROOT_PATH, "data", "embedding_model_test.json")
 EMBEDDING_SIM_THRESHOLD = 0.99
+LOAD_PROGRESS_INTERVAL = 1000  # 后台加载时每加载多少条回调一次进度
+
+
+_embedding_loop: Optional[asyncio.AbstractEventLoop] = None
+_embedding_loop_lock = threading.Lock()
+
+
+def _get_embedding_loop() -> asyncio.AbstractEventLoop:
+    """获取同步嵌入请求共用的后台事件循环
+
+    所有线程的嵌入请求都提交到这一个长期运行的事件循环上，
+    这样 ClientRegistry 在其中缓存的客户端与连接池可以一直复用，不必每次请求重新建立连接。
+    """
+    global _embedding_loop
+    with _embedding_loop_lock:
+        if _embedding_loop is None or _embedding_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="embedding-loop", daemon=True).start()
+            _embedding_loop = loop
+        return _embedding_loop
+
+
+def _run_in_embedding_loop(coro: Coroutine[Any, Any, Any]) -> Any:
+    """在后台事件循环中执行协程并同步等待结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_embedding_loop()).result()
 
 
 def cosine_similarity(a, b):
@@ -117,11 +143,7 @@ class EmbeddingStore:
         self.idx2hash = None
 
     def _get_embedding(self, s: str) -> List[float]:
-        """获取字符串的嵌入向量，使用完全同步的方式避免事件循环问题"""
-        # 创建新的事件循环并在完成后立即关闭
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
+        """获取字符串的嵌入向量，在共用的后台事件循环中执行以复用连接"""
         try:
             # 创建新的LLMRequest实例
             from src.llm_models.utils_model import LLMRequest
@@ -129,8 +151,7 @@ class EmbeddingStore:
             
             llm = LLMRequest(model_set=model_config.model_task_config.embedding, request_type="embedding")
             
-            # 使用新的事件循环运行异步方法
-            embedding, _ = loop.run_until_complete(llm.get_embedding(s))
+            embedding, _ = _run_in_embedding_loop(llm.get_embedding(s))
             
             if embedding and len(embedding) > 0:
                 return embedding
@@ -141,12 +162,6 @@ class EmbeddingStore:
         except Exception as e:
             logger.error(f"获取嵌入时发生异常: {s}, 错误: {e}")
             return []
-        finally:
-            # 确保事件循环被正确关闭
-            try:
-                loop.close()
-            except Exception:
-                pass
 
     def _get_embeddings_batch_threaded(self, strs: List[str], chunk_size: int = 10, max_workers: int = 10, progress_callback=None) -> List[Tuple[str, List[float]]]:
         """使用多线程批量获取嵌入向量
@@ -187,13 +202,8 @@ class EmbeddingStore:
                 
                 for i, s in enumerate(chunk_strs):
                     try:
-                        # 在线程中创建独立的事件循环
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            embedding = loop.run_until_complete(llm.get_embedding(s))
-                        finally:
-                            loop.close()
+                        # 在共用的后台事件循环中执行，线程间复用同一个连接池
+                        embedding = _run_in_embedding_loop(llm.get_embedding(s))
                             
                         if embedding and len(embedding) > 0:
                             chunk_results.append((start_idx + i, s, embedding[0]))  # embedding[0] 是实际的向量
@@ -421,30 +431,41 @@ class EmbeddingStore:
                 f.write(json.dumps(self.idx2hash, ensure_ascii=False, indent=4))
             logger.info(f"{self.namespace}嵌入库的idx2hash映射保存成功")
 
-    def load_from_file(self) -> None:
-        """从文件中加载"""
+    def load_from_file(self, progress_callback: Optional[Callable[[int, int], None]] = None) -> None:
+        """
+        从文件中加载
+        :param progress_callback: 进度回调 (已加载条数, 总条数)，提供时不显示控制台进度条（多个库并行加载时只能有一个进度条）
+        """
         if not os.path.exists(self.embedding_file_path):
             raise Exception(f"文件{self.embedding_file_path}不存在")
         logger.info("正在加载嵌入库...")
         logger.debug(f"正在从文件{self.embedding_file_path}中加载{self.namespace}嵌入库")
         data_frame = pd.read_parquet(self.embedding_file_path, engine="pyarrow")
         total = len(data_frame)
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(),
-            TaskProgressColumn(),
-            MofNCompleteColumn(),
-            "•",
-            TimeElapsedColumn(),
-            "<",
-            TimeRemainingColumn(),
-            transient=False,
-        ) as progress:
-            task = progress.add_task("加载嵌入库", total=total)
-            for _, row in data_frame.iterrows():
-                self.store[row["hash"]] = EmbeddingStoreItem(row["hash"], row["embedding"], row["str"])
-                progress.update(task, advance=1)
+        if progress_callback is not None:
+            progress_callback(0, total)
+            rows = zip(data_frame["hash"], data_frame["embedding"], data_frame["str"], strict=True)
+            for loaded, (item_hash, embedding, content) in enumerate(rows, start=1):
+                self.store[item_hash] = EmbeddingStoreItem(item_hash, embedding, content)
+                if loaded % LOAD_PROGRESS_INTERVAL == 0 or loaded == total:
+                    progress_callback(loaded, total)
+        else:
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(),
+                TaskProgressColumn(),
+                MofNCompleteColumn(),
+                "•",
+                TimeElapsedColumn(),
+                "<",
+                TimeRemainingColumn(),
+                transient=False,
+            ) as progress:
+                task = progress.add_task("加载嵌入库", total=total)
+                for _, row in data_frame.iterrows():
+                    self.store[row["hash"]] = EmbeddingStoreItem(row["hash"], row["embedding"], row["str"])
+                    progress.update(task, advance=1)
         logger.info(f"{self.namespace}嵌入库加载成功")
 
         try:
@@ -1,9 +1,16 @@
-from src.chat.knowledge.embedding_store import EmbeddingManager
+from src.chat.knowledge.embedding_store import EmbeddingManager, EmbeddingStore
 from src.chat.knowledge.qa_manager import QAManager
 from src.chat.knowledge.kg_manager import KGManager
 from src.chat.knowledge.global_logger import logger
 from src.config.config import global_config
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, Optional
+from fastapi import APIRouter
 import os
+import threading
+import time
 
 INVALID_ENTITY = [
     "",
@@ -27,47 +34,151 @@ ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..",
 DATA_PATH = os.path.join(ROOT_PATH, "data")
 
 
+class KnowledgeState(Enum):
+    DISABLED = "disabled"
+    WARMING = "warming"
+    """后台加载中，查询会直接返回空结果"""
+    READY = "ready"
+
+
+@dataclass
+class ComponentProgress:
+    """单个嵌入库或KG的加载进度"""
+
+    state: str = "pending"
+    loaded: int = 0
+    total: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+
+class KnowledgeLoader:
+    """
+    LPMM知识库的后台加载器
+
+    段落/实体/关系嵌入库和KG在后台线程中并行加载，加载完成前知识库处于 WARMING 状态，
+    查询直接返回空结果而不阻塞启动和消息处理。
+    """
+
+    def __init__(self, embed_manager: Optional[EmbeddingManager] = None, kg_manager: Optional[KGManager] = None):
+        self.embed_manager = embed_manager
+        self.kg_manager = kg_manager
+        self.state = KnowledgeState.WARMING if embed_manager and kg_manager else KnowledgeState.DISABLED
+        self.progress: Dict[str, ComponentProgress] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        return self.state == KnowledgeState.READY
+
+    def start(self) -> None:
+        """启动后台加载线程，重复调用无效果"""
+        with self._lock:
+            if self.state != KnowledgeState.WARMING or self._thread is not None:
+                return
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._load_all, name="lpmm-loader", daemon=True)
+            self._thread.start()
+        logger.info("LPMM知识库开始在后台加载")
+
+    def _load_all(self) -> None:
+        assert self.embed_manager and self.kg_manager
+        stores: Dict[str, EmbeddingStore] = {
+            "paragraph": self.embed_manager.paragraphs_embedding_store,
+            "entity": self.embed_manager.entities_embedding_store,
+            "relation": self.embed_manager.relation_embedding_store,
+        }
+        jobs: Dict[str, Callable[[ComponentProgress], None]] = {
+            name: lambda p, store=store: store.load_from_file(progress_callback=self._progress_updater(p))
+            for name, store in stores.items()
+        }
+        jobs["kg"] = lambda _: self.kg_manager.load_from_file()  # type: ignore
+        self.progress = {name: ComponentProgress() for name in jobs}
+
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="lpmm-load") as executor:
+            for name, job in jobs.items():
+                executor.submit(self._run_component, name, job)
+
+        # 从段落库中获取已存储的hash
+        self.embed_manager.stored_pg_hashes = set(self.embed_manager.paragraphs_embedding_store.store.keys())
+        logger.info(f"KG节点数量：{len(self.kg_manager.graph.get_node_list())}")
+        logger.info(f"KG边数量：{len(self.kg_manager.graph.get_edge_list())}")
+
+        # 数据比对：Embedding库与KG的段落hash集合
+        for pg_hash in self.kg_manager.stored_paragraph_hashes:
+            # 使用与EmbeddingStore中一致的命名空间格式
+            key = f"paragraph-{pg_hash}"
+            if key not in self.embed_manager.stored_pg_hashes:
+                logger.warning(f"KG中存在Embedding库中不存在的段落：{key}")
+
+        self.finished_at = time.time()
+        # 第一次导入知识前没有数据文件，此时仍视为就绪（查询返回空结果）
+        self.state = KnowledgeState.READY
+        timing = "，".join(f"{name} {p.seconds:.2f}秒" for name, p in self.progress.items())
+        logger.info(f"LPMM知识库加载完成，总耗时{self.finished_at - self.started_at:.2f}秒（{timing}）")  # type: ignore
+
+    def _run_component(self, name: str, job: Callable[[ComponentProgress], None]) -> None:
+        progress = self.progress[name]
+        progress.state = "loading"
+        start_time = time.perf_counter()
+        try:
+            job(progress)
+            progress.state = "loaded"
+        except Exception as e:
+            progress.state = "failed"
+            progress.error = str(e)
+            logger.warning(f"此消息不会影响正常使用：从文件加载{name}时，{e}")
+            # logger.warning("如果你是第一次导入知识，或者还未导入知识，请忽略此错误")
+        progress.seconds = time.perf_counter() - start_time
+
+    @staticmethod
+    def _progress_updater(progress: ComponentProgress) -> Callable[[int, int], None]:
+        def update(loaded: int, total: int) -> None:
+            progress.loaded = loaded
+            progress.total = total
+
+        return update
+
+    def get_status(self) -> dict:
+        """加载状态、各部分进度和耗时，用于监控"""
+        end_time = self.finished_at or time.time()
+        return {
+            "state": self.state.value,
+            "elapsed_seconds": round(end_time - self.started_at, 3) if self.started_at else 0.0,
+            "components": {
+                name: {
+                    "state": p.state,
+                    "loaded": p.loaded,
+                    "total": p.total,
+                    "seconds": round(p.seconds, 3),
+                    "error": p.error,
+                }
+                for name, p in self.progress.items()
+            },
+        }
+
+
 qa_manager = None
 inspire_manager = None
+knowledge_loader = KnowledgeLoader()
 
 # 检查LPMM知识库是否启用
 if global_config.lpmm_knowledge.enable:
     logger.info("正在初始化Mai-LPMM")
     logger.info("创建LLM客户端")
 
-    # 初始化Embedding库
+    # 先创建空的Embedding库和KG，数据由 knowledge_loader.start() 在后台线程中加载
     embed_manager = EmbeddingManager()
-    logger.info("正在从文件加载Embedding库")
-    try:
-        embed_manager.load_from_file()
-    except Exception as e:
-        logger.warning(f"此消息不会影响正常使用：从文件加载Embedding库时，{e}")
-        # logger.warning("如果你是第一次导入知识，或者还未导入知识，请忽略此错误")
-    logger.info("Embedding库加载完成")
-    # 初始化KG
     kg_manager = KGManager()
-    logger.info("正在从文件加载KG")
-    try:
-        kg_manager.load_from_file()
-    except Exception as e:
-        logger.warning(f"此消息不会影响正常使用：从文件加载KG时，{e}")
-        # logger.warning("如果你是第一次导入知识，或者还未导入知识，请忽略此错误")
-    logger.info("KG加载完成")
-
-    logger.info(f"KG节点数量：{len(kg_manager.graph.get_node_list())}")
-    logger.info(f"KG边数量：{len(kg_manager.graph.get_edge_list())}")
-
-    # 数据比对：Embedding库与KG的段落hash集合
-    for pg_hash in kg_manager.stored_paragraph_hashes:
-        # 使用与EmbeddingStore中一致的命名空间格式
-        key = f"paragraph-{pg_hash}"
-        if key not in embed_manager.stored_pg_hashes:
-            logger.warning(f"KG中存在Embedding库中不存在的段落：{key}")
+    knowledge_loader = KnowledgeLoader(embed_manager, kg_manager)
 
     # 问答系统（用于知识库）
     qa_manager = QAManager(
         embed_manager,
         kg_manager,
+        is_ready=knowledge_loader.is_ready,
     )
 
     # # 记忆激活（用于记忆库）
@@ -78,3 +189,12 @@ if global_config.lpmm_knowledge.enable:
 else:
     logger.info("LPMM知识库已禁用，跳过初始化")
     # 创建空的占位符对象，避免导入错误
+
+
+router = APIRouter()
+
+
+@router.get("/knowledge/status")
+async def get_knowledge_status():
+    """LPMM知识库加载状态"""
+    return knowledge_loader.get_status()
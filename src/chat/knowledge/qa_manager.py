@@ -1,5 +1,5 @@
 import time
-from typing import Tuple, List, Dict, Optional
+from typing import Callable, Tuple, List, Dict, Optional
 
 from .global_logger import logger
 from .embedding_store import EmbeddingManager
@@ -19,9 +19,14 @@ class QAManager:
         self,
         embed_manager: EmbeddingManager,
         kg_manager: KGManager,
+        is_ready: Optional[Callable[[], bool]] = None,
     ):
+        """
+        :param is_ready: 知识库是否已加载完成，未完成时查询直接返回空结果
+        """
         self.embed_manager = embed_manager
         self.kg_manager = kg_manager
+        self.is_ready = is_ready or (lambda: True)
         self.qa_model = LLMRequest(model_set=model_config.model_task_config.lpmm_qa, request_type="lpmm.qa")
 
     async def process_query(
@@ -100,6 +105,9 @@ class QAManager:
 
     async def get_knowledge(self, question: str) -> Optional[str]:
         """获取知识"""
+        if not self.is_ready():
+            logger.debug("LPMM知识库仍在后台加载，暂时跳过知识查询")
+            return None
         # 处理查询
         processed_result = await self.process_query(question)
         if processed_result is not None:
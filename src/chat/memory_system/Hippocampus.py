@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import datetime
+import heapq
 import math
 import random
 import time
@@ -7,17 +9,29 @@ import re
 import jieba
 import networkx as nx
 import numpy as np
-from typing import List, Tuple, Set, Coroutine, Any, Dict
+from typing import List, Tuple, Set, Coroutine, Any, Dict, Iterable, Optional, Union
 from collections import Counter
+from dataclasses import dataclass
+from functools import reduce
 from itertools import combinations
+import operator
 import traceback
 
 from rich.traceback import install
 
 from src.llm_models.utils_model import LLMRequest
 from src.config.config import global_config, model_config
+from src.common.database.database import db
 from src.common.database.database_model import GraphNodes, GraphEdges  # Peewee Models导入
 from src.common.logger import get_logger
+from src.chat.memory_system.memory_snapshot import (
+    Fingerprint,
+    MemoryGraphState,
+    MemorySnapshotStore,
+    compute_db_fingerprint,
+    compute_rows_fingerprint,
+    update_fingerprint,
+)
 from src.chat.utils.chat_message_builder import (
     build_readable_messages,
     get_raw_msg_by_timestamp_with_chat_inclusive,
@@ -55,16 +69,172 @@ def calculate_information_content(text):
 
 logger = get_logger("memory")
 
+FORGET_KIND_EDGE = 0
+FORGET_KIND_NODE = 1
 
+FORGET_MIN_BATCH = 200
+"""每次遗忘至少处理的到期条目数"""
+FORGET_CHUNK_SIZE = 100
+"""遗忘时每批处理的条目数，批次之间让出事件循环"""
 
 
+@dataclass
+class ForgetStats:
+    """遗忘操作的累计统计"""
 
-
+    runs: int = 0
+    checked: int = 0
+    weakened_edges: int = 0
+    removed_edges: int = 0
+    removed_nodes: int = 0
+    last_run_seconds: float = 0.0
+    total_run_seconds: float = 0.0
+    backlog: bool = False
+    """上次运行结束时是否仍有到期条目未处理"""
 
 
 class MemoryGraph:
     def __init__(self):
         self.G = nx.Graph()  # 使用 networkx 的图结构
+        # 自上次同步数据库以来发生变化的节点和边，同步时只写入这些变化
+        self.dirty_nodes: Set[str] = set()
+        self.dirty_edges: Set[Tuple[str, str]] = set()
+        # 遗忘索引：按到期时间排序的小顶堆 (到期时间, 类型, 键)，修改时推入新条目，旧条目惰性作废
+        self._forget_heap: List[Tuple[float, int, Any]] = []
+        self._node_due: Dict[str, float] = {}
+        self._edge_due: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def edge_key(concept1, concept2) -> Tuple[str, str]:
+        """无向边的规范化键"""
+        return (concept1, concept2) if str(concept1) <= str(concept2) else (concept2, concept1)
+
+    def mark_node_dirty(self, concept) -> None:
+        self.dirty_nodes.add(concept)
+        self._schedule_node(concept)
+
+    def mark_edge_dirty(self, concept1, concept2) -> None:
+        key = self.edge_key(concept1, concept2)
+        self.dirty_edges.add(key)
+        self._schedule_edge(key)
+
+    @staticmethod
+    def _retention_seconds() -> float:
+        return 3600 * global_config.memory.memory_forget_time
+
+    def _node_due_time(self, concept) -> float:
+        """节点的遗忘到期时间：权重越高保留越久，空节点立即到期"""
+        data = self.G.nodes[concept]
+        memory_items = data.get("memory_items", "")
+        if not memory_items or memory_items.strip() == "":
+            return 0.0
+        last_modified = data.get("last_modified") or datetime.datetime.now().timestamp()
+        return last_modified + self._retention_seconds() * data.get("weight", 1.0)
+
+    def _edge_due_time(self, key: Tuple[str, str]) -> float:
+        last_modified = self.G[key[0]][key[1]].get("last_modified") or datetime.datetime.now().timestamp()
+        return last_modified + self._retention_seconds()
+
+    def _schedule_node(self, concept) -> None:
+        if concept not in self.G:
+            self._node_due.pop(concept, None)
+            return
+        due = self._node_due_time(concept)
+        if self._node_due.get(concept) != due:
+            self._node_due[concept] = due
+            heapq.heappush(self._forget_heap, (due, FORGET_KIND_NODE, concept))
+            self._maybe_compact_forget_heap()
+
+    def _schedule_edge(self, key: Tuple[str, str]) -> None:
+        if not self.G.has_edge(*key):
+            self._edge_due.pop(key, None)
+            return
+        due = self._edge_due_time(key)
+        if self._edge_due.get(key) != due:
+            self._edge_due[key] = due
+            heapq.heappush(self._forget_heap, (due, FORGET_KIND_EDGE, key))
+            self._maybe_compact_forget_heap()
+
+    def _heapify_forget_index(self) -> None:
+        self._forget_heap = [(due, FORGET_KIND_NODE, concept) for concept, due in self._node_due.items()]
+        self._forget_heap.extend((due, FORGET_KIND_EDGE, key) for key, due in self._edge_due.items())
+        heapq.heapify(self._forget_heap)
+
+    def _maybe_compact_forget_heap(self) -> None:
+        """作废条目过多时按当前有效的到期时间重建堆"""
+        if len(self._forget_heap) > 2 * self.forget_index_size + 1024:
+            self._heapify_forget_index()
+
+    def rebuild_forget_index(self) -> None:
+        """按当前图重建遗忘索引（从数据库或快照整体加载后调用）"""
+        self._node_due = {concept: self._node_due_time(concept) for concept in self.G.nodes()}
+        self._edge_due = {}
+        for source, target in self.G.edges():
+            key = self.edge_key(source, target)
+            self._edge_due[key] = self._edge_due_time(key)
+        self._heapify_forget_index()
+
+    def pop_due(self, now: float, limit: int) -> List[Tuple[int, Union[str, Tuple[str, str]]]]:
+        """取出最多 limit 个已到期的节点或边，按到期时间先后排列
+
+        作废的条目直接丢弃；到期时间因配置变化而推迟的条目重新入堆。
+        取出的条目不再保留在索引中，处理后如仍存在（例如边被减弱），由修改时的标记重新入堆。
+        """
+        due_items: List[Tuple[int, Union[str, Tuple[str, str]]]] = []
+        heap = self._forget_heap
+        while heap and len(due_items) < limit and heap[0][0] <= now:
+            due, kind, key = heapq.heappop(heap)
+            due_map: Dict[Any, float] = self._node_due if kind == FORGET_KIND_NODE else self._edge_due
+            if due_map.get(key) != due:
+                continue
+            exists = key in self.G if kind == FORGET_KIND_NODE else self.G.has_edge(*key)
+            if not exists:
+                del due_map[key]
+                continue
+            actual_due = self._node_due_time(key) if kind == FORGET_KIND_NODE else self._edge_due_time(key)
+            if actual_due > now:
+                due_map[key] = actual_due
+                heapq.heappush(heap, (actual_due, kind, key))
+                continue
+            del due_map[key]
+            due_items.append((kind, key))
+        return due_items
+
+    def has_due(self, now: float) -> bool:
+        """堆顶是否已到期（可能是作废条目，仅用于判断是否还有积压）"""
+        return bool(self._forget_heap) and self._forget_heap[0][0] <= now
+
+    @property
+    def forget_index_size(self) -> int:
+        return len(self._node_due) + len(self._edge_due)
+
+    def add_edge(self, concept1, concept2, **attrs) -> None:
+        """添加或覆盖一条边并标记为待同步"""
+        self.G.add_edge(concept1, concept2, **attrs)
+        self.mark_edge_dirty(concept1, concept2)
+
+    def remove_edge(self, concept1, concept2) -> None:
+        """移除一条边并标记为待同步"""
+        self.G.remove_edge(concept1, concept2)
+        self.mark_edge_dirty(concept1, concept2)
+
+    def remove_node(self, concept) -> None:
+        """移除节点及其所有连接，并标记为待同步"""
+        for neighbor in self.G.neighbors(concept):
+            self.mark_edge_dirty(concept, neighbor)
+        self.G.remove_node(concept)
+        self.mark_node_dirty(concept)
+
+    def clear_dirty(self) -> None:
+        """清空待同步标记（例如已从数据库完整加载或已完整重写）"""
+        self.dirty_nodes.clear()
+        self.dirty_edges.clear()
+
+    def pop_dirty(self) -> Tuple[Set[str], Set[Tuple[str, str]]]:
+        """取出并清空当前的待同步节点和边"""
+        dirty_nodes, dirty_edges = self.dirty_nodes, self.dirty_edges
+        self.dirty_nodes, self.dirty_edges = set(), set()
+        return dirty_nodes, dirty_edges
 
     def connect_dot(self, concept1, concept2):
         # 避免自连接
@@ -78,9 +248,10 @@ class MemoryGraph:
             self.G[concept1][concept2]["strength"] = self.G[concept1][concept2].get("strength", 1) + 1
             # 更新最后修改时间
             self.G[concept1][concept2]["last_modified"] = current_time
+            self.mark_edge_dirty(concept1, concept2)
         else:
             # 如果是新边,初始化 strength 为 1
-            self.G.add_edge(
+            self.add_edge(
                 concept1,
                 concept2,
                 strength=1,
@@ -122,6 +293,7 @@ class MemoryGraph:
                     self.G.nodes[concept]["created_time"] = current_time
             # 更新最后修改时间
             self.G.nodes[concept]["last_modified"] = current_time
+            self.mark_node_dirty(concept)
         else:
             # 如果是新节点,创建新的记忆字符串
             self.G.add_node(
@@ -131,6 +303,7 @@ class MemoryGraph:
                 created_time=current_time,  # 添加创建时间
                 last_modified=current_time,
             )  # 添加最后修改时间
+            self.mark_node_dirty(concept)
 
     def get_dot(self, concept):
         # 检查节点是否存在于图中
@@ -236,15 +409,15 @@ class MemoryGraph:
             # 既然每个节点现在是一个完整的记忆内容，直接删除整个节点
             if memory_items:
                 # 删除整个节点
-                self.G.remove_node(topic)
+                self.remove_node(topic)
                 return f"删除了节点 {topic} 的完整记忆: {memory_items[:50]}..." if len(memory_items) > 50 else f"删除了节点 {topic} 的完整记忆: {memory_items}"
             else:
                 # 如果没有记忆项，删除该节点
-                self.G.remove_node(topic)
+                self.remove_node(topic)
                 return None
         else:
             # 如果没有memory_items字段，删除该节点
-            self.G.remove_node(topic)
+            self.remove_node(topic)
             return None
 
 
@@ -260,8 +433,9 @@ class Hippocampus:
         # 初始化子组件
         self.entorhinal_cortex = EntorhinalCortex(self)
         self.parahippocampal_gyrus = ParahippocampalGyrus(self)
-        # 从数据库加载记忆图
-        self.entorhinal_cortex.sync_memory_from_db()
+        # 加载记忆图（启用快照时优先从快照加载）
+        self.entorhinal_cortex.load_memory_graph()
+        self.memory_graph.rebuild_forget_index()
         self.model_small = LLMRequest(model_set=model_config.model_task_config.utils_small, request_type="memory.modify")
 
     def get_all_node_names(self) -> list:
@@ -707,170 +881,230 @@ class EntorhinalCortex:
     def __init__(self, hippocampus: Hippocampus):
         self.hippocampus = hippocampus
         self.memory_graph = hippocampus.memory_graph
+        self._sync_lock = asyncio.Lock()
+        self.snapshot_store = MemorySnapshotStore() if global_config.memory.enable_memory_snapshot else None
+        self._db_fingerprint: Optional[Fingerprint] = None
+        """启用快照时当前数据库内容的校验和，启动时全表计算一次，之后随增量同步只根据变化的行更新"""
+
+    def load_memory_graph(self):
+        """加载记忆图：启用快照时优先从快照加载，快照缺失或与数据库不一致时回退到数据库"""
+        if self.snapshot_store is None:
+            self.sync_memory_from_db()
+            return
 
-    async def sync_memory_to_db(self):
-        """将记忆图同步到数据库"""
         start_time = time.time()
-        current_time = datetime.datetime.now().timestamp()
+        db_fingerprint = None
+        try:
+            state = self.snapshot_store.load()
+            if state is not None:
+                db_fingerprint = compute_db_fingerprint()
+            if state is not None and state.fingerprint == db_fingerprint:
+                state.load_into(self.memory_graph.G)
+                self.memory_graph.clear_dirty()
+                self._db_fingerprint = db_fingerprint
+                logger.info(
+                    f"[快照] 从快照加载记忆图完成: {len(state.nodes)} 个节点, {len(state.edges)} 条边, "
+                    f"耗时 {time.time() - start_time:.2f}秒"
+                )
+                if self.snapshot_store.needs_compaction():
+                    self.snapshot_store.write_snapshot(state)
+                return
+            if state is not None:
+                logger.info("[快照] 记忆图快照与数据库不一致，从数据库重新加载")
+        except Exception as e:
+            logger.warning(f"[快照] 读取记忆图快照失败，从数据库加载: {e}")
 
-        # 获取数据库中所有节点和内存中所有节点
-        db_nodes = {node.concept: node for node in GraphNodes.select()}
-        memory_nodes = list(self.memory_graph.G.nodes(data=True))
+        db_modified = self.sync_memory_from_db()
+        # 加载过程没有修改数据库时沿用刚才计算的校验和，避免再次全表扫描
+        self._rewrite_snapshot(None if db_modified else db_fingerprint)
 
-        # 批量准备节点数据
-        nodes_to_create = []
-        nodes_to_update = []
-        nodes_to_delete = set()
+    def _rewrite_snapshot(self, db_fingerprint: Optional[Fingerprint] = None):
+        """以当前内存图（须与数据库一致）重写快照，未给出数据库校验和时全表计算"""
+        if self.snapshot_store is None:
+            return
+        try:
+            if db_fingerprint is None:
+                db_fingerprint = compute_db_fingerprint()
+            self.snapshot_store.write_snapshot(MemoryGraphState.from_graph(self.memory_graph.G, db_fingerprint))
+            self._db_fingerprint = db_fingerprint
+        except Exception as e:
+            logger.warning(f"[快照] 写入记忆图快照失败: {e}")
+            self._db_fingerprint = None
+            self.snapshot_store.remove()
 
-        # 处理节点
-        for concept, data in memory_nodes:
-            if not concept or not isinstance(concept, str):
-                self.memory_graph.G.remove_node(concept)
-                continue
+    def _persist_changes(
+        self,
+        nodes_to_upsert: List[Dict[str, Any]],
+        nodes_to_delete: Set[str],
+        dirty_edges: Set[Tuple[str, str]],
+        edges_to_insert: List[Dict[str, Any]],
+    ) -> None:
+        """写入数据库，并在启用快照时追加变更日志（在线程中执行）
+
+        变更记录的校验和由写入前后变化的行推算，不扫描全表
+        """
+        store = self.snapshot_store
+        prev_fingerprint = self._db_fingerprint
+        if store is None or prev_fingerprint is None or not store.exists():
+            self._write_changes(nodes_to_upsert, nodes_to_delete, dirty_edges, edges_to_insert)
+            return
 
-            memory_items = data.get("memory_items", "")
-            
-            # 直接检查字符串是否为空，不需要分割成列表
-            if not memory_items or memory_items.strip() == "":
-                self.memory_graph.G.remove_node(concept)
-                continue
+        changed_concepts = {n["concept"] for n in nodes_to_upsert} | set(nodes_to_delete)
+        rows_before = compute_rows_fingerprint(changed_concepts, dirty_edges)
+        self._write_changes(nodes_to_upsert, nodes_to_delete, dirty_edges, edges_to_insert)
+        try:
+            fingerprint = update_fingerprint(
+                prev_fingerprint, rows_before, compute_rows_fingerprint(changed_concepts, dirty_edges)
+            )
+            self._db_fingerprint = fingerprint
+            store.append_log(
+                [
+                    (n["concept"], n["memory_items"], n["weight"], n["created_time"], n["last_modified"])
+                    for n in nodes_to_upsert
+                ],
+                nodes_to_delete,
+                dirty_edges,
+                [
+                    (e["source"], e["target"], e["strength"], e["created_time"], e["last_modified"])
+                    for e in edges_to_insert
+                ],
+                prev_fingerprint,
+                fingerprint,
+            )
+            if store.needs_compaction():
+                store.compact()
+        except Exception as e:
+            # 日志缺失会导致快照回放不完整，直接作废快照，下次启动从数据库加载
+            logger.warning(f"[快照] 追加记忆图变更日志失败，快照已作废: {e}")
+            self._db_fingerprint = None
+            store.remove()
 
-            # 计算内存中节点的特征值
-            memory_hash = self.hippocampus.calculate_node_hash(concept, memory_items)
-            created_time = data.get("created_time", current_time)
-            last_modified = data.get("last_modified", current_time)
+    async def sync_memory_to_db(self):
+        """将记忆图中自上次同步以来发生变化的节点和边增量写入数据库
 
-            # memory_items直接作为字符串存储，不需要JSON序列化
-            if not memory_items:
-                continue
+        变化由 MemoryGraph 在修改时记录；写入在线程中以批量事务执行，不阻塞事件循环
+        """
+        async with self._sync_lock:
+            start_time = time.time()
+            current_time = datetime.datetime.now().timestamp()
 
-            # 获取权重属性
-            weight = data.get("weight", 1.0)
+            dirty_nodes, dirty_edges = self.memory_graph.pop_dirty()
+            if not dirty_nodes and not dirty_edges:
+                logger.debug("[数据库] 记忆图没有变化，跳过同步")
+                return
+
+            G = self.memory_graph.G
 
-            if concept not in db_nodes:
-                nodes_to_create.append(
+            # 整理节点变化：图中存在且有记忆的节点写入，其余删除
+            nodes_to_upsert = []
+            nodes_to_delete = set()
+            for concept in dirty_nodes:
+                if not concept or not isinstance(concept, str):
+                    if concept in G:
+                        self.memory_graph.remove_node(concept)
+                        dirty_edges |= self.memory_graph.pop_dirty()[1]
+                    continue
+                if concept not in G:
+                    nodes_to_delete.add(concept)
+                    continue
+
+                data = G.nodes[concept]
+                memory_items = data.get("memory_items", "")
+                # 直接检查字符串是否为空，不需要分割成列表
+                if not memory_items or memory_items.strip() == "":
+                    self.memory_graph.remove_node(concept)
+                    dirty_edges |= self.memory_graph.pop_dirty()[1]
+                    nodes_to_delete.add(concept)
+                    continue
+
+                nodes_to_upsert.append(
                     {
                         "concept": concept,
                         "memory_items": memory_items,
-                        "weight": weight,
-                        "hash": memory_hash,
-                        "created_time": created_time,
-                        "last_modified": last_modified,
+                        "weight": data.get("weight", 1.0),
+                        "hash": self.hippocampus.calculate_node_hash(concept, memory_items),
+                        "created_time": data.get("created_time", current_time),
+                        "last_modified": data.get("last_modified", current_time),
                     }
                 )
-            else:
-                db_node = db_nodes[concept]
-                if db_node.hash != memory_hash:
-                    nodes_to_update.append(
-                        {
-                            "concept": concept,
-                            "memory_items": memory_items,
-                            "weight": weight,
-                            "hash": memory_hash,
-                            "last_modified": last_modified,
-                        }
-                    )
-
-        # 计算需要删除的节点
-        memory_concepts = {concept for concept, _ in memory_nodes}
-        nodes_to_delete = set(db_nodes.keys()) - memory_concepts
 
-        # 批量处理节点
-        if nodes_to_create:
-            batch_size = 100
-            for i in range(0, len(nodes_to_create), batch_size):
-                batch = nodes_to_create[i : i + batch_size]
-                GraphNodes.insert_many(batch).execute()
-
-        if nodes_to_update:
-            batch_size = 100
-            for i in range(0, len(nodes_to_update), batch_size):
-                batch = nodes_to_update[i : i + batch_size]
-                for node_data in batch:
-                    GraphNodes.update(**{k: v for k, v in node_data.items() if k != "concept"}).where(
-                        GraphNodes.concept == node_data["concept"]
-                    ).execute()
-
-        if nodes_to_delete:
-            GraphNodes.delete().where(GraphNodes.concept.in_(nodes_to_delete)).execute()  # type: ignore
-
-        # 处理边的信息
-        db_edges = list(GraphEdges.select())
-        memory_edges = list(self.memory_graph.G.edges(data=True))
-
-        # 创建边的哈希值字典
-        db_edge_dict = {}
-        for edge in db_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(edge.source, edge.target)
-            db_edge_dict[(edge.source, edge.target)] = {"hash": edge_hash, "strength": edge.strength}
-
-        # 批量准备边数据
-        edges_to_create = []
-        edges_to_update = []
-
-        # 处理边
-        for source, target, data in memory_edges:
-            edge_hash = self.hippocampus.calculate_edge_hash(source, target)
-            edge_key = (source, target)
-            strength = data.get("strength", 1)
-            created_time = data.get("created_time", current_time)
-            last_modified = data.get("last_modified", current_time)
-
-            if edge_key not in db_edge_dict:
-                edges_to_create.append(
+            # 整理边变化：先删除数据库中的旧行（两个方向），再写入图中仍存在的边
+            edges_to_insert = []
+            for source, target in dirty_edges:
+                if not G.has_edge(source, target):
+                    continue
+                data = G[source][target]
+                edges_to_insert.append(
                     {
                         "source": source,
                         "target": target,
-                        "strength": strength,
-                        "hash": edge_hash,
-                        "created_time": created_time,
-                        "last_modified": last_modified,
+                        "strength": data.get("strength", 1),
+                        "hash": self.hippocampus.calculate_edge_hash(source, target),
+                        "created_time": data.get("created_time", current_time),
+                        "last_modified": data.get("last_modified", current_time),
                     }
                 )
-            elif db_edge_dict[edge_key]["hash"] != edge_hash:
-                edges_to_update.append(
-                    {
-                        "source": source,
-                        "target": target,
-                        "strength": strength,
-                        "hash": edge_hash,
-                        "last_modified": last_modified,
-                    }
+
+            try:
+                await asyncio.to_thread(
+                    self._persist_changes, nodes_to_upsert, nodes_to_delete, dirty_edges, edges_to_insert
                 )
+            except Exception as e:
+                # 写入失败时保留变化标记，下次同步重试
+                self.memory_graph.dirty_nodes |= dirty_nodes
+                self.memory_graph.dirty_edges |= dirty_edges
+                logger.error(f"[数据库] 增量同步记忆图失败: {e}")
+                return
 
-        # 计算需要删除的边
-        memory_edge_keys = {(source, target) for source, target, _ in memory_edges}
-        edges_to_delete = set(db_edge_dict.keys()) - memory_edge_keys
+            end_time = time.time()
+            logger.info(f"[数据库] 同步完成，总耗时: {end_time - start_time:.2f}秒")
+            logger.info(
+                f"[数据库] 同步了 {len(nodes_to_upsert)} 个节点和 {len(edges_to_insert)} 条边，"
+                f"删除了 {len(nodes_to_delete)} 个节点和 {len(dirty_edges) - len(edges_to_insert)} 条边"
+            )
 
-        # 批量处理边
-        if edges_to_create:
-            batch_size = 100
-            for i in range(0, len(edges_to_create), batch_size):
-                batch = edges_to_create[i : i + batch_size]
-                GraphEdges.insert_many(batch).execute()
+    @staticmethod
+    def _write_changes(
+        nodes_to_upsert: List[Dict[str, Any]],
+        nodes_to_delete: Iterable[str],
+        dirty_edges: Iterable[Tuple[str, str]],
+        edges_to_insert: List[Dict[str, Any]],
+        batch_size: int = 100,
+    ) -> None:
+        """在一个事务中批量写入记忆图的变化（在线程中执行）"""
+        nodes_to_delete = list(nodes_to_delete)
+        dirty_edges = list(dirty_edges)
+        with db.atomic():
+            for i in range(0, len(nodes_to_upsert), batch_size):
+                GraphNodes.insert_many(nodes_to_upsert[i : i + batch_size]).on_conflict(
+                    conflict_target=[GraphNodes.concept],
+                    preserve=[GraphNodes.memory_items, GraphNodes.weight, GraphNodes.hash, GraphNodes.last_modified],
+                ).execute()
 
-        if edges_to_update:
-            batch_size = 100
-            for i in range(0, len(edges_to_update), batch_size):
-                batch = edges_to_update[i : i + batch_size]
-                for edge_data in batch:
-                    GraphEdges.update(**{k: v for k, v in edge_data.items() if k not in ["source", "target"]}).where(
-                        (GraphEdges.source == edge_data["source"]) & (GraphEdges.target == edge_data["target"])
-                    ).execute()
+            for i in range(0, len(nodes_to_delete), batch_size):
+                GraphNodes.delete().where(GraphNodes.concept.in_(nodes_to_delete[i : i + batch_size])).execute()  # type: ignore
 
-        if edges_to_delete:
-            for source, target in edges_to_delete:
-                GraphEdges.delete().where((GraphEdges.source == source) & (GraphEdges.target == target)).execute()
+            # 每条边的条件包含两个方向，批次不宜过大以免超过SQLite表达式深度限制
+            edge_batch_size = 50
+            for i in range(0, len(dirty_edges), edge_batch_size):
+                conditions = [
+                    ((GraphEdges.source == source) & (GraphEdges.target == target))
+                    | ((GraphEdges.source == target) & (GraphEdges.target == source))
+                    for source, target in dirty_edges[i : i + edge_batch_size]
+                ]
+                GraphEdges.delete().where(reduce(operator.or_, conditions)).execute()
 
-        end_time = time.time()
-        logger.info(f"[数据库] 同步完成，总耗时: {end_time - start_time:.2f}秒")
-        logger.info(f"[数据库] 同步了 {len(nodes_to_create) + len(nodes_to_update)} 个节点和 {len(edges_to_create) + len(edges_to_update)} 条边")
+            for i in range(0, len(edges_to_insert), batch_size):
+                GraphEdges.insert_many(edges_to_insert[i : i + batch_size]).execute()
 
     async def resync_memory_to_db(self):
         """清空数据库并重新同步所有记忆数据"""
         start_time = time.time()
         logger.info("[数据库] 开始重新同步所有记忆数据...")
 
+        # 完整重写后之前的变化标记不再需要
+        self.memory_graph.clear_dirty()
+
         # 清空数据库
         clear_start = time.time()
         GraphNodes.delete().execute()
@@ -948,14 +1182,22 @@ class EntorhinalCortex:
                 batch = edges_data[i : i + batch_size]
                 GraphEdges.insert_many(batch).execute()
 
+        # 数据库已整体重写，快照随之重建
+        self._rewrite_snapshot()
+
         end_time = time.time()
         logger.info(f"[数据库] 重新同步完成，总耗时: {end_time - start_time:.2f}秒")
         logger.info(f"[数据库] 同步了 {len(nodes_data)} 个节点和 {len(edges_data)} 条边")
 
-    def sync_memory_from_db(self):
-        """从数据库同步数据到内存中的图结构"""
+    def sync_memory_from_db(self) -> bool:
+        """从数据库同步数据到内存中的图结构
+
+        Returns:
+            bool: 加载过程中是否修改了数据库（补充时间字段或删除无效的行）
+        """
         current_time = datetime.datetime.now().timestamp()
         need_update = False
+        db_modified = False
 
         # 清空当前图
         self.memory_graph.G.clear()
@@ -964,6 +1206,9 @@ class EntorhinalCortex:
         total_nodes = 0
         loaded_nodes = 0
         skipped_nodes = 0
+        # 加载时跳过的节点和端点缺失的边，加载完成后从数据库删除
+        stale_nodes = set()
+        stale_edges = set()
 
         # 从数据库加载所有节点
         nodes = list(GraphNodes.select())
@@ -976,6 +1221,7 @@ class EntorhinalCortex:
                 if not node.memory_items or node.memory_items.strip() == "":
                     logger.warning(f"节点 {concept} 的memory_items为空，跳过")
                     skipped_nodes += 1
+                    stale_nodes.add(concept)
                     continue
                 
                 # 直接使用memory_items
@@ -992,6 +1238,7 @@ class EntorhinalCortex:
 
                     if update_data:
                         GraphNodes.update(**update_data).where(GraphNodes.concept == concept).execute()
+                        db_modified = True
 
                 # 获取时间信息(如果不存在则使用当前时间)
                 created_time = node.created_time or current_time
@@ -1008,6 +1255,7 @@ class EntorhinalCortex:
             except Exception as e:
                 logger.error(f"加载节点 {concept} 时发生错误: {e}")
                 skipped_nodes += 1
+                stale_nodes.add(concept)
                 continue
 
         # 从数据库加载所有边
@@ -1040,12 +1288,25 @@ class EntorhinalCortex:
                 self.memory_graph.G.add_edge(
                     source, target, strength=strength, created_time=created_time, last_modified=last_modified
                 )
+            else:
+                stale_edges.add(self.memory_graph.edge_key(source, target))
+
+        # 增量同步只会处理内存图中变化过的部分，未加载的行在这里直接删除，
+        # 保证加载完成后数据库与内存图一致（之后写入的快照也以此为准）
+        if stale_nodes or stale_edges:
+            self._write_changes([], stale_nodes, stale_edges, [])
+            db_modified = True
+            logger.info(f"[数据库] 已删除 {len(stale_nodes)} 个无效节点和 {len(stale_edges)} 条端点缺失的边")
+
+        # 内存图与数据库一致，无需再次写入
+        self.memory_graph.clear_dirty()
 
         if need_update:
             logger.info("[数据库] 已为缺失的时间字段进行补充")
             
         # 输出加载统计信息
         logger.info(f"[数据库] 记忆加载完成: 总计 {total_nodes} 个节点, 成功加载 {loaded_nodes} 个, 跳过 {skipped_nodes} 个")
+        return db_modified or need_update
 
 
 # 负责整合，遗忘，合并记忆
@@ -1053,7 +1314,8 @@ class ParahippocampalGyrus:
     def __init__(self, hippocampus: Hippocampus):
         self.hippocampus = hippocampus
         self.memory_graph = hippocampus.memory_graph
-        
+        self.forget_stats = ForgetStats()
+
         self.memory_modify_model = LLMRequest(model_set=model_config.model_task_config.utils, request_type="memory.modify")
 
     async def memory_compress(self, messages: list, compress_rate=0.1):
@@ -1171,36 +1433,24 @@ class ParahippocampalGyrus:
         return compressed_memory, similar_topics_dict
 
     async def operation_forget_topic(self, percentage=0.005):
+        """遗忘超过保留期的节点和连接
+
+        通过 MemoryGraph 的遗忘索引按到期时间取出已过期的条目，只处理这些条目，
+        每次最多处理 max(FORGET_MIN_BATCH, 条目总数 * percentage) 个，剩余的留到下一次。
+        """
         start_time = time.time()
-        logger.info("[遗忘] 开始检查数据库...")
+        logger.info("[遗忘] 开始检查记忆图...")
 
         # 验证百分比参数
         if not 0 <= percentage <= 1:
             logger.warning(f"[遗忘] 无效的遗忘百分比: {percentage}, 使用默认值 0.005")
             percentage = 0.005
 
-        all_nodes = list(self.memory_graph.G.nodes())
-        all_edges = list(self.memory_graph.G.edges())
-
-        if not all_nodes and not all_edges:
+        if self.memory_graph.forget_index_size == 0:
             logger.info("[遗忘] 记忆图为空,无需进行遗忘操作")
             return
 
-        # 确保至少检查1个节点和边，且不超过总数
-        check_nodes_count = max(1, min(len(all_nodes), int(len(all_nodes) * percentage)))
-        check_edges_count = max(1, min(len(all_edges), int(len(all_edges) * percentage)))
-
-        # 只有在有足够的节点和边时才进行采样
-        if len(all_nodes) >= check_nodes_count and len(all_edges) >= check_edges_count:
-            try:
-                nodes_to_check = random.sample(all_nodes, check_nodes_count)
-                edges_to_check = random.sample(all_edges, check_edges_count)
-            except ValueError as e:
-                logger.error(f"[遗忘] 采样错误: {str(e)}")
-                return
-        else:
-            logger.info("[遗忘] 没有足够的节点或边进行遗忘操作")
-            return
+        batch_limit = max(FORGET_MIN_BATCH, int(self.memory_graph.forget_index_size * percentage))
 
         # 使用列表存储变化信息
         edge_changes = {
@@ -1213,75 +1463,58 @@ class ParahippocampalGyrus:
         }
 
         current_time = datetime.datetime.now().timestamp()
+        checked = 0
+        while checked < batch_limit:
+            due_items = self.memory_graph.pop_due(current_time, min(FORGET_CHUNK_SIZE, batch_limit - checked))
+            if not due_items:
+                break
+            checked += len(due_items)
+
+            for kind, key in due_items:
+                if kind == FORGET_KIND_EDGE:
+                    source, target = key
+                    edge_data = self.memory_graph.G[source][target]
+                    current_strength = edge_data.get("strength", 1)
+                    new_strength = current_strength - 1
+
+                    if new_strength <= 0:
+                        self.memory_graph.remove_edge(source, target)
+                        edge_changes["removed"].append(f"{source} -> {target}")
+                    else:
+                        edge_data["strength"] = new_strength
+                        edge_data["last_modified"] = current_time
+                        self.memory_graph.mark_edge_dirty(source, target)
+                        edge_changes["weakened"].append(f"{source}-{target} (强度: {current_strength} -> {new_strength})")
+                    continue
 
-        logger.info("[遗忘] 开始检查连接...")
-        edge_check_start = time.time()
-        for source, target in edges_to_check:
-            edge_data = self.memory_graph.G[source][target]
-            last_modified = edge_data.get("last_modified")
-
-            if current_time - last_modified > 3600 * global_config.memory.memory_forget_time:
-                current_strength = edge_data.get("strength", 1)
-                new_strength = current_strength - 1
-
-                if new_strength <= 0:
-                    self.memory_graph.G.remove_edge(source, target)
-                    edge_changes["removed"].append(f"{source} -> {target}")
+                node_data = self.memory_graph.G.nodes[key]
+                memory_items = node_data.get("memory_items", "")
+                node_weight = node_data.get("weight", 1.0)
+                self.memory_graph.remove_node(key)
+                if not memory_items or memory_items.strip() == "":
+                    node_changes["removed"].append(f"{key}(空节点)")  # 标记为空节点移除
+                    logger.debug(f"[遗忘] 移除了空的节点: {key}")
                 else:
-                    edge_data["strength"] = new_strength
-                    edge_data["last_modified"] = current_time
-                    edge_changes["weakened"].append(f"{source}-{target} (强度: {current_strength} -> {new_strength})")
-        edge_check_end = time.time()
-        logger.info(f"[遗忘] 连接检查耗时: {edge_check_end - edge_check_start:.2f}秒")
-
-        logger.info("[遗忘] 开始检查节点...")
-        node_check_start = time.time()
-        for node in nodes_to_check:
-            # 检查节点是否存在，以防在迭代中被移除（例如边移除导致）
-            if node not in self.memory_graph.G:
-                continue
-
-            node_data = self.memory_graph.G.nodes[node]
-
-            # 首先获取记忆项
-            memory_items = node_data.get("memory_items", "")
-            # 直接检查记忆内容是否为空
-            if not memory_items or memory_items.strip() == "":
-                try:
-                    self.memory_graph.G.remove_node(node)
-                    node_changes["removed"].append(f"{node}(空节点)")  # 标记为空节点移除
-                    logger.debug(f"[遗忘] 移除了空的节点: {node}")
-                except nx.NetworkXError as e:
-                    logger.warning(f"[遗忘] 移除空节点 {node} 时发生错误（可能已被移除）: {e}")
-                continue  # 处理下一个节点
-
-            # --- 如果节点不为空，则执行原来的不活跃检查和随机移除逻辑 ---
-            last_modified = node_data.get("last_modified", current_time)
-            node_weight = node_data.get("weight", 1.0)
-            
-            # 条件1：检查是否长时间未修改 (使用配置的遗忘时间)
-            time_threshold = 3600 * global_config.memory.memory_forget_time
-            
-            # 基于权重调整遗忘阈值：权重越高，需要更长时间才能被遗忘
-            # 权重为1时使用默认阈值，权重越高阈值越大（越难遗忘）
-            adjusted_threshold = time_threshold * node_weight
-            
-            if current_time - last_modified > adjusted_threshold and memory_items:
-                # 既然每个节点现在是完整记忆，直接删除整个节点
-                try:
-                    self.memory_graph.G.remove_node(node)
-                    node_changes["removed"].append(f"{node}(长时间未修改,权重{node_weight:.1f})")
-                    logger.debug(f"[遗忘] 移除了长时间未修改的节点: {node} (权重: {node_weight:.1f})")
-                except nx.NetworkXError as e:
-                    logger.warning(f"[遗忘] 移除节点 {node} 时发生错误（可能已被移除）: {e}")
-                    continue
-        node_check_end = time.time()
-        logger.info(f"[遗忘] 节点检查耗时: {node_check_end - node_check_start:.2f}秒")
+                    # 既然每个节点现在是完整记忆，直接删除整个节点
+                    node_changes["removed"].append(f"{key}(长时间未修改,权重{node_weight:.1f})")
+                    logger.debug(f"[遗忘] 移除了长时间未修改的节点: {key} (权重: {node_weight:.1f})")
+
+            # 分批处理之间让出事件循环
+            await asyncio.sleep(0)
+
+        stats = self.forget_stats
+        stats.runs += 1
+        stats.checked += checked
+        stats.weakened_edges += len(edge_changes["weakened"])
+        stats.removed_edges += len(edge_changes["removed"])
+        stats.removed_nodes += len(node_changes["removed"])
+        stats.backlog = self.memory_graph.has_due(current_time)
+        logger.info(f"[遗忘] 检查了 {checked} 个到期条目{'，仍有积压留待下次' if stats.backlog else ''}")
 
         if any(edge_changes.values()) or any(node_changes.values()):
             sync_start = time.time()
 
-            await self.hippocampus.entorhinal_cortex.resync_memory_to_db()
+            await self.hippocampus.entorhinal_cortex.sync_memory_to_db()
 
             sync_end = time.time()
             logger.info(f"[遗忘] 数据库同步耗时: {sync_end - sync_start:.2f}秒")
@@ -1311,6 +1544,8 @@ class ParahippocampalGyrus:
             logger.info("[遗忘] 本次检查没有节点或连接满足遗忘条件")
 
         end_time = time.time()
+        stats.last_run_seconds = end_time - start_time
+        stats.total_run_seconds += stats.last_run_seconds
         logger.info(f"[遗忘] 总耗时: {end_time - start_time:.2f}秒")
 
 
@@ -1356,6 +1591,12 @@ class HippocampusManager:
             raise RuntimeError("HippocampusManager 尚未初始化，请先调用 initialize 方法")
         return await self._hippocampus.parahippocampal_gyrus.operation_forget_topic(percentage)
 
+    def get_forget_stats(self) -> ForgetStats:
+        """获取遗忘操作的累计统计"""
+        if not self._initialized:
+            raise RuntimeError("HippocampusManager 尚未初始化，请先调用 initialize 方法")
+        return self._hippocampus.parahippocampal_gyrus.forget_stats
+
     async def build_memory_for_chat(self, chat_id: str):
         """为指定chat_id构建记忆（在heartFC_chat.py中调用）"""
         if not self._initialized:
@@ -1389,7 +1630,7 @@ class HippocampusManager:
                             for similar_topic, similarity in similar_topics:
                                 if topic != similar_topic:
                                     strength = int(similarity * 10)
-                                    self._hippocampus.memory_graph.G.add_edge(
+                                    self._hippocampus.memory_graph.add_edge(
                                         topic, similar_topic, 
                                         strength=strength,
                                         created_time=current_time,
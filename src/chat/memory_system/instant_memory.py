@@ -10,13 +10,30 @@ from datetime import datetime, timedelta
 
 from src.llm_models.utils_model import LLMRequest
 from src.common.logger import get_logger
-from src.common.database.database_model import Memory  # Peewee Models导入
+from src.common.database.database import db
+from src.common.database.database_model import Memory, MemoryKeyword  # Peewee Models导入
 from src.config.config import model_config
 
 
 logger = get_logger(__name__)
 
 
+def normalize_keywords(keywords) -> list[str]:
+    """规范化关键词：去除首尾空白、丢弃空项并去重（保持顺序）"""
+    return list(dict.fromkeys(str(k).strip() for k in keywords if str(k).strip()))
+
+
+def parse_stored_keywords(raw: str | None) -> list[str]:
+    """解析 Memory.keywords 中保存的关键词（list 的字符串形式，旧数据可能是/分隔）"""
+    if not raw:
+        return []
+    try:
+        parsed = ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return normalize_keywords(raw.split("/"))
+    return normalize_keywords(parsed) if isinstance(parsed, list) else []
+
+
 class MemoryItem:
     def __init__(self, memory_id: str, chat_id: str, memory_text: str, keywords: list[str]):
         self.memory_id = memory_id
@@ -112,15 +129,29 @@ class InstantMemory:
             logger.info(f"不需要记忆：{text}")
 
     async def store_memory(self, memory_item: MemoryItem):
-        memory = Memory(
-            memory_id=memory_item.memory_id,
-            chat_id=memory_item.chat_id,
-            memory_text=memory_item.memory_text,
-            keywords=memory_item.keywords,
-            create_time=memory_item.create_time,
-            last_view_time=memory_item.last_view_time,
-        )
-        memory.save()
+        keywords = normalize_keywords(memory_item.keywords)
+        with db.atomic():
+            Memory.create(
+                memory_id=memory_item.memory_id,
+                chat_id=memory_item.chat_id,
+                memory_text=memory_item.memory_text,
+                keywords=keywords,
+                create_time=memory_item.create_time,
+                last_view_time=memory_item.last_view_time,
+            )
+            # 同时写入关键词倒排索引
+            if keywords:
+                MemoryKeyword.insert_many(
+                    [
+                        {
+                            "keyword": keyword,
+                            "chat_id": memory_item.chat_id,
+                            "memory_id": memory_item.memory_id,
+                            "create_time": memory_item.create_time,
+                        }
+                        for keyword in keywords
+                    ]
+                ).execute()
 
     async def get_memory(self, target: str):
         from json_repair import repair_json
@@ -152,46 +183,30 @@ class InstantMemory:
                 # 解析keywords
                 keywords = result.get("keywords", "")
                 if isinstance(keywords, str):
-                    keywords_list = [k.strip() for k in keywords.split("/") if k.strip()]
+                    keywords_list = normalize_keywords(keywords.split("/"))
                 elif isinstance(keywords, list):
-                    keywords_list = keywords
+                    keywords_list = normalize_keywords(keywords)
                 else:
                     keywords_list = []
                 # 解析time为时间段
                 time_str = result.get("time", "").strip()
                 start_time, end_time = self._parse_time_range(time_str)
                 logger.info(f"start_time: {start_time}, end_time: {end_time}")
-                # 检索包含关键词的记忆
-                memories_set = set()
+                if not keywords_list:
+                    return []
+                # 通过关键词倒排索引检索包含任一关键词的记忆
+                conditions = (MemoryKeyword.chat_id == self.chat_id) & (MemoryKeyword.keyword.in_(keywords_list))
                 if start_time and end_time:
-                    start_ts = start_time.timestamp()
-                    end_ts = end_time.timestamp()
-                    query = Memory.select().where(
-                        (Memory.chat_id == self.chat_id)
-                        & (Memory.create_time >= start_ts)  # type: ignore
-                        & (Memory.create_time < end_ts)  # type: ignore
+                    conditions &= (MemoryKeyword.create_time >= start_time.timestamp()) & (  # type: ignore
+                        MemoryKeyword.create_time < end_time.timestamp()  # type: ignore
                     )
-                else:
-                    query = Memory.select().where(Memory.chat_id == self.chat_id)
-
-                for mem in query:
-                    # 对每条记忆
-                    mem_keywords = mem.keywords or ""
-                    parsed = ast.literal_eval(mem_keywords)
-                    if isinstance(parsed, list):
-                        mem_keywords = [str(k).strip() for k in parsed if str(k).strip()]
-                    else:
-                        mem_keywords = []
-                    # logger.info(f"mem_keywords: {mem_keywords}")
-                    # logger.info(f"keywords_list: {keywords_list}")
-                    for kw in keywords_list:
-                        # logger.info(f"kw: {kw}")
-                        # logger.info(f"kw in mem_keywords: {kw in mem_keywords}")
-                        if kw in mem_keywords:
-                            # logger.info(f"mem.memory_text: {mem.memory_text}")
-                            memories_set.add(mem.memory_text)
-                            break
-                return list(memories_set)
+                query = (
+                    Memory.select(Memory.memory_text)
+                    .join(MemoryKeyword, on=(MemoryKeyword.memory_id == Memory.memory_id))
+                    .where(conditions)
+                    .distinct()
+                )
+                return list({mem.memory_text for mem in query})
             except Exception as parse_e:
                 logger.error(f"解析记忆json失败：{str(parse_e)} {traceback.format_exc()}")
                 return None
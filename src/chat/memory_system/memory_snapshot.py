@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+记忆图快照与变更日志
+
+启动时从数据库逐行重建 networkx 图的开销随记忆图规模增长，这里提供一个可选的磁盘快照：
+- 快照文件：以紧凑数组保存概念、记忆文本、权重、时间戳以及边的端点下标和强度，启动时一次读取
+- 变更日志：每次增量同步数据库后追加一条变更记录，定期合并回快照
+
+数据库始终是唯一可信来源。快照和每条变更记录都带有写入时数据库内容的校验和（各行哈希之和，
+增量同步时只根据变化的行推算），加载时回放到最后一条记录后与当前数据库全表计算的校验和比对，
+不一致则放弃快照、回退到从数据库加载。
+"""
+
+import hashlib
+import operator
+import os
+import pickle
+import struct
+import zlib
+
+import numpy as np
+
+from dataclasses import dataclass, field
+from functools import reduce
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.common.database.database import ROOT_PATH
+from src.common.database.database_model import GraphNodes, GraphEdges
+from src.common.logger import get_logger
+
+logger = get_logger("memory")
+
+SNAPSHOT_DIR = os.path.join(ROOT_PATH, "data", "memory_graph")
+SNAPSHOT_MAGIC = b"MMGSNAP1"
+SNAPSHOT_VERSION = 3
+
+# 变更日志超过快照大小的该比例（且不小于最小值）时合并
+COMPACT_RATIO = 0.5
+COMPACT_MIN_BYTES = 1024 * 1024
+
+_LOG_FRAME_HEADER = struct.Struct("<II")  # (payload长度, crc32)
+
+NodeRow = Tuple[str, str, float, float, float]
+"""(concept, memory_items, weight, created_time, last_modified)"""
+EdgeRow = Tuple[str, str, int, float, float]
+"""(source, target, strength, created_time, last_modified)"""
+
+
+def edge_key(source: str, target: str) -> Tuple[str, str]:
+    """无向边的规范化键，与 MemoryGraph.edge_key 保持一致"""
+    return (source, target) if str(source) <= str(target) else (target, source)
+
+
+Fingerprint = Tuple[int, int, int]
+"""(节点行数, 边行数, 各行哈希之和)"""
+
+_DIGEST_MODULUS = 1 << 128
+_NODE_FIELDS = (
+    GraphNodes.concept,
+    GraphNodes.memory_items,
+    GraphNodes.weight,
+    GraphNodes.created_time,
+    GraphNodes.last_modified,
+)
+_EDGE_FIELDS = (
+    GraphEdges.source,
+    GraphEdges.target,
+    GraphEdges.strength,
+    GraphEdges.created_time,
+    GraphEdges.last_modified,
+)
+
+
+def _row_digest(tag: bytes, row: Tuple) -> int:
+    return int.from_bytes(hashlib.sha256(tag + repr(tuple(row)).encode("utf-8")).digest()[:16], "big")
+
+
+def _fingerprint_rows(node_rows: Iterable[Tuple], edge_rows: Iterable[Tuple]) -> Fingerprint:
+    node_count = edge_count = digest = 0
+    for row in node_rows:
+        node_count += 1
+        digest += _row_digest(b"n", row)
+    for row in edge_rows:
+        edge_count += 1
+        digest += _row_digest(b"e", row)
+    return node_count, edge_count, digest % _DIGEST_MODULUS
+
+
+def compute_db_fingerprint() -> Fingerprint:
+    """
+    读取记忆图两张表的全部行计算内容校验和
+
+    每行内容（包括长度不变、未更新 last_modified 的修改）单独哈希后求和，与行的顺序无关，
+    因此增量同步时只需读取变化的行即可用 update_fingerprint 推算新的校验和。
+    需要全表扫描，只在启动校验快照和重建快照时调用。
+    """
+    return _fingerprint_rows(
+        GraphNodes.select(*_NODE_FIELDS).tuples().iterator(),
+        GraphEdges.select(*_EDGE_FIELDS).tuples().iterator(),
+    )
+
+
+def compute_rows_fingerprint(concepts: Iterable[str], edge_keys: Iterable[Tuple[str, str]]) -> Fingerprint:
+    """只读取指定概念的节点行和指定边（两个方向）的行，计算它们的校验和"""
+    concepts = list(set(concepts))
+    edge_keys = list({edge_key(source, target) for source, target in edge_keys})
+    node_rows: List[Tuple] = []
+    edge_rows: List[Tuple] = []
+    for i in range(0, len(concepts), 100):
+        node_rows.extend(
+            GraphNodes.select(*_NODE_FIELDS).where(GraphNodes.concept.in_(concepts[i : i + 100])).tuples()  # type: ignore
+        )
+    # 与 EntorhinalCortex._write_changes 相同，批次不宜过大以免超过SQLite表达式深度限制
+    for i in range(0, len(edge_keys), 50):
+        conditions = [
+            ((GraphEdges.source == source) & (GraphEdges.target == target))
+            | ((GraphEdges.source == target) & (GraphEdges.target == source))
+            for source, target in edge_keys[i : i + 50]
+        ]
+        edge_rows.extend(GraphEdges.select(*_EDGE_FIELDS).where(reduce(operator.or_, conditions)).tuples())
+    return _fingerprint_rows(node_rows, edge_rows)
+
+
+def update_fingerprint(fingerprint: Fingerprint, removed: Fingerprint, added: Fingerprint) -> Fingerprint:
+    """从校验和中减去写入前的行、加上写入后的行"""
+    return (
+        fingerprint[0] - removed[0] + added[0],
+        fingerprint[1] - removed[1] + added[1],
+        (fingerprint[2] - removed[2] + added[2]) % _DIGEST_MODULUS,
+    )
+
+
+@dataclass
+class MemoryGraphState:
+    """快照回放过程中的记忆图状态"""
+
+    nodes: Dict[str, Tuple[str, float, float, float]] = field(default_factory=dict)
+    """concept -> (memory_items, weight, created_time, last_modified)"""
+    edges: Dict[Tuple[str, str], EdgeRow] = field(default_factory=dict)
+    """规范化边键 -> 边数据"""
+    fingerprint: Optional[Tuple] = None
+
+    @classmethod
+    def from_graph(cls, graph, fingerprint: Tuple) -> "MemoryGraphState":
+        state = cls(fingerprint=fingerprint)
+        for concept, data in graph.nodes(data=True):
+            state.nodes[concept] = (
+                data.get("memory_items", ""),
+                data.get("weight", 1.0),
+                data.get("created_time", 0.0),
+                data.get("last_modified", 0.0),
+            )
+        for source, target, data in graph.edges(data=True):
+            state.edges[edge_key(source, target)] = (
+                source,
+                target,
+                data.get("strength", 1),
+                data.get("created_time", 0.0),
+                data.get("last_modified", 0.0),
+            )
+        return state
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        """回放一条变更记录，语义与 EntorhinalCortex._write_changes 一致"""
+        for concept, memory_items, weight, created_time, last_modified in record["nodes"]:
+            self.nodes[concept] = (memory_items, weight, created_time, last_modified)
+        for concept in record["deleted_nodes"]:
+            self.nodes.pop(concept, None)
+        for source, target in record["dirty_edges"]:
+            self.edges.pop(edge_key(source, target), None)
+        for row in record["edges"]:
+            self.edges[edge_key(row[0], row[1])] = tuple(row)  # type: ignore
+        self.fingerprint = tuple(record["fingerprint"])
+
+    def load_into(self, graph) -> None:
+        """批量写入 networkx 图，端点缺失的边会被跳过"""
+        graph.clear()
+        graph.add_nodes_from(
+            (
+                concept,
+                {"memory_items": memory_items, "weight": weight, "created_time": created, "last_modified": modified},
+            )
+            for concept, (memory_items, weight, created, modified) in self.nodes.items()
+        )
+        graph.add_edges_from(
+            (source, target, {"strength": strength, "created_time": created, "last_modified": modified})
+            for source, target, strength, created, modified in self.edges.values()
+            if source in graph and target in graph
+        )
+
+    def to_payload(self) -> Dict[str, Any]:
+        """转换为紧凑数组形式：字符串列表 + 定长数值数组，边端点以节点下标保存"""
+        concepts = list(self.nodes)
+        index = {concept: i for i, concept in enumerate(concepts)}
+        node_values = list(self.nodes.values())
+        edges = [edge for edge in self.edges.values() if edge[0] in index and edge[1] in index]
+        return {
+            "version": SNAPSHOT_VERSION,
+            "fingerprint": self.fingerprint,
+            "concepts": concepts,
+            "memory_items": [value[0] for value in node_values],
+            "node_weight": np.array([value[1] for value in node_values], dtype=np.float64),
+            "node_created": np.array([value[2] for value in node_values], dtype=np.float64),
+            "node_modified": np.array([value[3] for value in node_values], dtype=np.float64),
+            "edge_source": np.array([index[edge[0]] for edge in edges], dtype=np.int32),
+            "edge_target": np.array([index[edge[1]] for edge in edges], dtype=np.int32),
+            "edge_strength": np.array([edge[2] for edge in edges], dtype=np.int64),
+            "edge_created": np.array([edge[3] for edge in edges], dtype=np.float64),
+            "edge_modified": np.array([edge[4] for edge in edges], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "MemoryGraphState":
+        state = cls(fingerprint=tuple(payload["fingerprint"]))
+        concepts = payload["concepts"]
+        state.nodes = dict(
+            zip(
+                concepts,
+                zip(
+                    payload["memory_items"],
+                    payload["node_weight"].tolist(),
+                    payload["node_created"].tolist(),
+                    payload["node_modified"].tolist(),
+                    strict=True,
+                ),
+                strict=True,
+            )
+        )
+        for source_idx, target_idx, strength, created, modified in zip(
+            payload["edge_source"].tolist(),
+            payload["edge_target"].tolist(),
+            payload["edge_strength"].tolist(),
+            payload["edge_created"].tolist(),
+            payload["edge_modified"].tolist(),
+            strict=True,
+        ):
+            source, target = concepts[source_idx], concepts[target_idx]
+            state.edges[edge_key(source, target)] = (source, target, strength, created, modified)
+        return state
+
+
+class MemorySnapshotStore:
+    """记忆图快照文件与变更日志的读写"""
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "memory_graph.snapshot")
+        self.log_path = os.path.join(directory, "memory_graph.wal")
+
+    def load(self) -> Optional[MemoryGraphState]:
+        """读取快照并回放变更日志，快照不存在或损坏时返回None"""
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        header_size = len(SNAPSHOT_MAGIC) + 32
+        if len(data) < header_size or not data.startswith(SNAPSHOT_MAGIC):
+            logger.warning("[快照] 记忆图快照格式不正确，忽略")
+            return None
+        digest, body = data[len(SNAPSHOT_MAGIC) : header_size], data[header_size:]
+        if hashlib.sha256(body).digest() != digest:
+            logger.warning("[快照] 记忆图快照校验失败，忽略")
+            return None
+
+        payload = pickle.loads(body)
+        if payload.get("version") != SNAPSHOT_VERSION:
+            logger.info("[快照] 记忆图快照版本不匹配，忽略")
+            return None
+        state = MemoryGraphState.from_payload(payload)
+
+        for record in self._read_log():
+            if tuple(record["prev_fingerprint"]) != state.fingerprint:
+                # 中间缺失了变更记录（例如写入数据库后进程中断），无法保证回放结果正确
+                logger.warning("[快照] 记忆图变更日志不连续，忽略快照")
+                return None
+            state.apply(record)
+        return state
+
+    def _read_log(self) -> Iterable[Dict[str, Any]]:
+        """逐条读取变更日志，遇到截断或损坏的记录时停止"""
+        try:
+            with open(self.log_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        offset = 0
+        while offset + _LOG_FRAME_HEADER.size <= len(data):
+            length, crc = _LOG_FRAME_HEADER.unpack_from(data, offset)
+            start = offset + _LOG_FRAME_HEADER.size
+            frame = data[start : start + length]
+            if len(frame) < length or zlib.crc32(frame) != crc:
+                logger.warning("[快照] 记忆图变更日志末尾不完整，已忽略后续内容")
+                return
+            yield pickle.loads(frame)
+            offset = start + length
+
+    def write_snapshot(self, state: MemoryGraphState) -> None:
+        """原子地写入新快照并清空变更日志"""
+        os.makedirs(self.directory, exist_ok=True)
+        body = pickle.dumps(state.to_payload(), protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(hashlib.sha256(body).digest())
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # 新快照已包含日志中的全部变化
+        with open(self.log_path, "wb"):
+            pass
+
+    def append_log(
+        self,
+        nodes: List[NodeRow],
+        deleted_nodes: Iterable[str],
+        dirty_edges: Iterable[Tuple[str, str]],
+        edges: List[EdgeRow],
+        prev_fingerprint: Tuple,
+        fingerprint: Tuple,
+    ) -> None:
+        """追加一条增量同步的变更记录，记录写入前后的数据库指纹用于校验连续性"""
+        if not self.exists():
+            # 没有快照作为基准时日志没有意义
+            return
+        frame = pickle.dumps(
+            {
+                "nodes": nodes,
+                "deleted_nodes": list(deleted_nodes),
+                "dirty_edges": list(dirty_edges),
+                "edges": edges,
+                "prev_fingerprint": prev_fingerprint,
+                "fingerprint": fingerprint,
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        with open(self.log_path, "ab") as f:
+            f.write(_LOG_FRAME_HEADER.pack(len(frame), zlib.crc32(frame)))
+            f.write(frame)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.snapshot_path)
+
+    def needs_compaction(self) -> bool:
+        """变更日志相对快照过大时需要合并"""
+        try:
+            log_size = os.path.getsize(self.log_path)
+            snapshot_size = os.path.getsize(self.snapshot_path)
+        except OSError:
+            return False
+        return log_size >= max(COMPACT_MIN_BYTES, snapshot_size * COMPACT_RATIO)
+
+    def compact(self) -> bool:
+        """把变更日志合并进快照。只基于磁盘上的内容，不受内存中未同步变化的影响"""
+        state = self.load()
+        if state is None:
+            return False
+        self.write_snapshot(state)
+        return True
+
+    def remove(self) -> None:
+        """删除快照与日志（例如快照与数据库不一致时）"""
+        for path in (self.snapshot_path, self.log_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,140 @@
+import re
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+# 含有反向引用（\1 或 (?P=name)）的正则在合并后组号会错位，需要单独编译
+_BACKREF_PATTERN = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class AhoCorasickMatcher:
+    """基于 Aho–Corasick 自动机的多模式字符串匹配器
+
+    构建一次后，单次扫描即可判断文本中是否出现任意一个过滤词，
+    复杂度与文本长度线性相关，与过滤词数量无关。
+    """
+
+    def __init__(self, words: Iterable[str]):
+        # 每个状态的转移表、失败指针与输出（到达该状态时可命中的过滤词）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+        self.word_count = 0
+
+        for word in words:
+            if word:
+                self._add_word(word)
+        self._build_fail_links()
+
+    def _add_word(self, word: str) -> None:
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            state = next_state
+        if self._output[state] is None:
+            self._output[state] = word
+            self.word_count += 1
+
+    def _build_fail_links(self) -> None:
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail_state = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                fail_target = self._goto[fail_state].get(char, 0)
+                self._fail[next_state] = fail_target if fail_target != next_state else 0
+                # 失败链上的输出合并到当前状态，匹配时无需再沿失败链回溯
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> Optional[str]:
+        """返回文本中最先出现（结束位置最靠前）的过滤词，未命中返回 None"""
+        if not self.word_count or not text:
+            return None
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+class RegexSetMatcher:
+    """将多个正则合并为一个预编译的交替表达式
+
+    每个正则包裹在具名分组中，命中后通过分组名找回对应的原始规则。
+    无法安全合并的正则（含反向引用、合并后编译失败等）退化为单独预编译。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = [pattern for pattern in patterns if pattern]
+        self._group_to_pattern: Dict[str, str] = {}
+        self._combined: Optional[Pattern[str]] = None
+        self._standalone: List[Tuple[Pattern[str], str]] = []
+
+        mergeable: List[str] = []
+        for pattern in self.patterns:
+            if _BACKREF_PATTERN.search(pattern):
+                self._standalone.append((re.compile(pattern), pattern))
+            else:
+                mergeable.append(pattern)
+
+        if mergeable:
+            try:
+                self._combined = self._compile_combined(mergeable)
+            except re.error:
+                # 合并失败（例如分组名冲突、行内全局标志），逐个编译
+                self._group_to_pattern.clear()
+                self._standalone.extend((re.compile(pattern), pattern) for pattern in mergeable)
+
+    def _compile_combined(self, patterns: List[str]) -> Pattern[str]:
+        parts = []
+        for index, pattern in enumerate(patterns):
+            group_name = f"_ban{index}"
+            self._group_to_pattern[group_name] = pattern
+            parts.append(f"(?P<{group_name}>{pattern})")
+        return re.compile("|".join(parts))
+
+    def search(self, text: str) -> Optional[str]:
+        """返回命中的原始正则，未命中返回 None"""
+        if self._combined is not None:
+            if match := self._combined.search(text):
+                if match.lastgroup in self._group_to_pattern:
+                    return self._group_to_pattern[match.lastgroup]
+                for group_name, value in match.groupdict().items():
+                    if value is not None and group_name in self._group_to_pattern:
+                        return self._group_to_pattern[group_name]
+        for compiled, pattern in self._standalone:
+            if compiled.search(text):
+                return pattern
+        return None
+
+
+class BanMatcher:
+    """过滤词与过滤正则的预编译匹配器"""
+
+    def __init__(self, ban_words: Iterable[str], ban_regex: Iterable[str]):
+        self.word_matcher = AhoCorasickMatcher(ban_words)
+        self.regex_matcher = RegexSetMatcher(ban_regex)
+
+    def match_word(self, text: str) -> Optional[str]:
+        """返回命中的过滤词"""
+        return self.word_matcher.search(text)
+
+    def match_regex(self, text: str) -> Optional[str]:
+        """返回命中的过滤正则"""
+        return self.regex_matcher.search(text)
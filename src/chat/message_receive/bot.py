@@ -1,8 +1,7 @@
 import traceback
 import os
-import re
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from maim_message import UserInfo
 
 from src.common.logger import get_logger
@@ -10,6 +9,7 @@ from src.config.config import global_config
 from src.mood.mood_manager import mood_manager  # 导入情绪管理器
 from src.chat.message_receive.chat_stream import get_chat_manager, ChatStream
 from src.chat.message_receive.message import MessageRecv, MessageRecvS4U
+from src.chat.message_receive.ban_matcher import BanMatcher
 from src.chat.message_receive.storage import MessageStorage
 from src.chat.heart_flow.heartflow_message_processor import HeartFCMessageReceiver
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
@@ -27,6 +27,23 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..
 logger = get_logger("chat")
 
 
+_ban_matcher: Optional[BanMatcher] = None
+_ban_matcher_source: Optional[Tuple[int, int, int, int]] = None
+
+
+def get_ban_matcher() -> BanMatcher:
+    """获取预编译的过滤匹配器，过滤配置被替换或增删后自动重建"""
+    global _ban_matcher, _ban_matcher_source
+    ban_words = global_config.message_receive.ban_words
+    ban_regex = global_config.message_receive.ban_msgs_regex
+    source = (id(ban_words), len(ban_words), id(ban_regex), len(ban_regex))
+    if _ban_matcher is None or source != _ban_matcher_source:
+        _ban_matcher = BanMatcher(ban_words, ban_regex)
+        _ban_matcher_source = source
+        logger.debug(f"过滤匹配器已构建: {len(ban_words)} 个过滤词, {len(ban_regex)} 个过滤正则")
+    return _ban_matcher
+
+
 def _check_ban_words(text: str, chat: ChatStream, userinfo: UserInfo) -> bool:
     """检查消息是否包含过滤词
 
@@ -38,12 +55,11 @@ def _check_ban_words(text: str, chat: ChatStream, userinfo: UserInfo) -> bool:
     Returns:
         bool: 是否包含过滤词
     """
-    for word in global_config.message_receive.ban_words:
-        if word in text:
-            chat_name = chat.group_info.group_name if chat.group_info else "私聊"
-            logger.info(f"[{chat_name}]{userinfo.user_nickname}:{text}")
-            logger.info(f"[过滤词识别]消息中含有{word}，filtered")
-            return True
+    if word := get_ban_matcher().match_word(text):
+        chat_name = chat.group_info.group_name if chat.group_info else "私聊"
+        logger.info(f"[{chat_name}]{userinfo.user_nickname}:{text}")
+        logger.info(f"[过滤词识别]消息中含有{word}，filtered")
+        return True
     return False
 
 
@@ -58,12 +74,11 @@ def _check_ban_regex(text: str, chat: ChatStream, userinfo: UserInfo) -> bool:
     Returns:
         bool: 是否匹配过滤正则
     """
-    for pattern in global_config.message_receive.ban_msgs_regex:
-        if re.search(pattern, text):
-            chat_name = chat.group_info.group_name if chat.group_info else "私聊"
-            logger.info(f"[{chat_name}]{userinfo.user_nickname}:{text}")
-            logger.info(f"[正则表达式过滤]消息匹配到{pattern}，filtered")
-            return True
+    if pattern := get_ban_matcher().match_regex(text):
+        chat_name = chat.group_info.group_name if chat.group_info else "私聊"
+        logger.info(f"[{chat_name}]{userinfo.user_nickname}:{text}")
+        logger.info(f"[正则表达式过滤]消息匹配到{pattern}，filtered")
+        return True
     return False
 
 
@@ -76,6 +91,8 @@ class ChatBot:
 
         self.s4u_message_processor = S4UMessageProcessor()
 
+        get_ban_matcher()  # 启动时预编译过滤词与过滤正则
+
     async def _ensure_started(self):
         """确保所有任务已启动"""
         if not self._started:
@@ -28,18 +28,14 @@ install(extra_lines=3)
 
 
 def init_prompt():
+    # 不随聊天内容变化的部分作为system消息放在最前面，便于服务商缓存提示词前缀
     Prompt(
         """
-{time_block}
 {identity_block}
 你现在需要根据聊天内容，选择的合适的action来参与聊天。
-{chat_context_description}，以下是具体的聊天内容
-{chat_content_block}
-
 {moderation_prompt}
 
-现在请你根据聊天内容和用户的最新消息选择合适的action和触发action的消息:
-{actions_before_now_block}
+你必须从列出的可用action中选择一个，并说明触发action的消息id（不是消息原文）和选择该action的原因。消息id格式:m+数字
 
 {no_action_block}
 
@@ -54,10 +50,20 @@ def init_prompt():
     "target_message_id":"想要回复的消息id",
     "reason":"回复的原因"
 }}
+""",
+        "planner_system_prompt",
+    )
 
-{action_options_text}
+    Prompt(
+        """
+{time_block}
+{chat_context_description}，以下是具体的聊天内容
+{chat_content_block}
 
-你必须从上面列出的可用action中选择一个，并说明触发action的消息id（不是消息原文）和选择该action的原因。消息id格式:m+数字
+现在请你根据聊天内容和用户的最新消息选择合适的action和触发action的消息:
+{actions_before_now_block}
+
+{action_options_text}
 
 请根据动作示例，以严格的 JSON 格式输出，且仅包含 JSON 内容：
 """,
@@ -141,13 +147,14 @@ class ActionPlanner:
         current_available_actions: Dict[str, ActionInfo] = {}
         target_message: Optional[Dict[str, Any]] = None  # 初始化target_message变量
         prompt: str = ""
+        system_prompt: str = ""
         message_id_list: list = []
 
         try:
             is_group_chat, chat_target_info, current_available_actions = self.get_necessary_info()
 
             # --- 构建提示词 (调用修改后的 PromptBuilder 方法) ---
-            prompt, message_id_list = await self.build_planner_prompt(
+            prompt, message_id_list, system_prompt = await self.build_planner_prompt(
                 is_group_chat=is_group_chat,  # <-- Pass HFC state
                 chat_target_info=chat_target_info,  # <-- 传递获取到的聊天目标信息
                 current_available_actions=current_available_actions,  # <-- Pass determined actions
@@ -158,15 +165,17 @@ class ActionPlanner:
             # --- 调用 LLM (普通文本生成) ---
             llm_content = None
             try:
-                llm_content, (reasoning_content, _, _) = await self.planner_llm.generate_response_async(prompt=prompt)
+                llm_content, (reasoning_content, _, _) = await self.planner_llm.generate_response_async(
+                    prompt=prompt, system_prompt=system_prompt
+                )
 
                 if global_config.debug.show_prompt:
-                    logger.info(f"{self.log_prefix}规划器原始提示词: {prompt}")
+                    logger.info(f"{self.log_prefix}规划器原始提示词: {system_prompt}\n{prompt}")
                     logger.info(f"{self.log_prefix}规划器原始响应: {llm_content}")
                     if reasoning_content:
                         logger.info(f"{self.log_prefix}规划器推理: {reasoning_content}")
                 else:
-                    logger.debug(f"{self.log_prefix}规划器原始提示词: {prompt}")
+                    logger.debug(f"{self.log_prefix}规划器原始提示词: {system_prompt}\n{prompt}")
                     logger.debug(f"{self.log_prefix}规划器原始响应: {llm_content}")
                     if reasoning_content:
                         logger.debug(f"{self.log_prefix}规划器推理: {reasoning_content}")
@@ -280,8 +289,8 @@ class ActionPlanner:
         current_available_actions: Dict[str, ActionInfo],
         refresh_time :bool = False,
         mode: ChatMode = ChatMode.FOCUS,
-    ) -> tuple[str, list]:  # sourcery skip: use-join
-        """构建 Planner LLM 的提示词 (获取模板并填充数据)"""
+    ) -> tuple[str, list, str]:  # sourcery skip: use-join
+        """构建 Planner LLM 的提示词 (获取模板并填充数据)，返回 (提示词, 消息id列表, 不变的前缀)"""
         try:
             message_list_before_now = get_raw_msg_before_timestamp_with_chat(
                 chat_id=self.chat_id,
@@ -371,6 +380,11 @@ class ActionPlanner:
 
                 action_options_block += using_action_prompt
 
+            if action_options_block:
+                # reply 和 no_action（仅专注模式）的说明在system部分，这里只列出其余可选的action
+                offered_actions = "reply和no_action" if mode == ChatMode.FOCUS else "reply"
+                action_options_block = f"除了{offered_actions}，当前还可以选择的action：\n{action_options_block}"
+
             moderation_prompt_block = "请不要输出违法违规内容，不要输出色情，暴力，政治相关内容，如有敏感内容，请规避。"
 
             time_block = f"当前时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
@@ -383,23 +397,26 @@ class ActionPlanner:
             bot_core_personality = global_config.personality.personality_core
             identity_block = f"你的名字是{bot_name}{bot_nickname}，你{bot_core_personality}："
 
+            planner_system_prompt_template = await global_prompt_manager.get_prompt_async("planner_system_prompt")
+            system_prompt = planner_system_prompt_template.format(
+                identity_block=identity_block,
+                moderation_prompt=moderation_prompt_block,
+                no_action_block=no_action_block,
+                mentioned_bonus=mentioned_bonus,
+            )
             planner_prompt_template = await global_prompt_manager.get_prompt_async("planner_prompt")
             prompt = planner_prompt_template.format(
                 time_block=time_block,
                 chat_context_description=chat_context_description,
                 chat_content_block=chat_content_block,
                 actions_before_now_block=actions_before_now_block,
-                no_action_block=no_action_block,
-                mentioned_bonus=mentioned_bonus,
                 action_options_text=action_options_block,
-                moderation_prompt=moderation_prompt_block,
-                identity_block=identity_block,
             )
-            return prompt, message_id_list
+            return prompt, message_id_list, system_prompt
         except Exception as e:
             logger.error(f"构建 Planner 提示词时出错: {e}")
             logger.error(traceback.format_exc())
-            return "构建 Planner Prompt 时出错", []
+            return "构建 Planner Prompt 时出错", [], ""
 
     def get_necessary_info(self) -> Tuple[bool, Optional[dict], Dict[str, ActionInfo]]:
         """
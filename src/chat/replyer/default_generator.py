@@ -16,6 +16,7 @@ from src.chat.message_receive.chat_stream import ChatStream
 from src.chat.message_receive.uni_message_sender import HeartFCSender
 from src.chat.utils.timer_calculator import Timer  # <--- Import Timer
 from src.chat.utils.utils import get_chat_type_and_target_info
+from src.chat.utils.utils_image import get_image_manager
 from src.chat.utils.prompt_builder import Prompt, global_prompt_manager
 from src.chat.utils.chat_message_builder import (
     build_readable_messages,
@@ -40,6 +41,17 @@ def init_prompt():
     Prompt("在群里聊天", "chat_target_group2")
     Prompt("和{sender_name}聊天", "chat_target_private2")
 
+    # 提示词分为不变的前缀（system消息）和随对话变化的部分（user消息），前缀在前，便于服务商缓存
+    Prompt(
+        """{identity}
+你需要使用合适的语法和句法，参考聊天内容，组织一条日常且口语化的回复。请你修改你想表达的原句，符合你的表达风格和语言习惯
+{reply_style}，你可以完全重组回复，保留最基本的表达含义就好，但重组后保持语意通顺。
+{moderation_prompt}
+不要输出多余内容(包括前后缀，冒号和引号，括号，表情包，emoji,at或 @等 )，只输出一条回复就好。
+""",
+        "default_expressor_system_prompt",
+    )
+
     Prompt(
         """
 {expression_habits_block}
@@ -48,28 +60,33 @@ def init_prompt():
 {chat_target}
 {time_block}
 {chat_info}
-{identity}
 
 你正在{chat_target_2},{reply_target_block}
 对这句话，你想表达，原句：{raw_reply},原因是：{reason}。你现在要思考怎么组织回复
 你现在的心情是：{mood_state}
-你需要使用合适的语法和句法，参考聊天内容，组织一条日常且口语化的回复。请你修改你想表达的原句，符合你的表达风格和语言习惯
-{reply_style}，你可以完全重组回复，保留最基本的表达含义就好，但重组后保持语意通顺。
 {keywords_reaction_prompt}
-{moderation_prompt}
-不要输出多余内容(包括前后缀，冒号和引号，括号，表情包，emoji,at或 @等 )，只输出一条回复就好。
 现在，你说：
 """,
         "default_expressor_prompt",
     )
 
-    # s4u 风格的 prompt 模板
+    # s4u 风格的 prompt 模板，replyer_prompt 和 replyer_self_prompt 共用同一个前缀
+    Prompt(
+        """{identity}
+{reply_style}
+注意不要复读你说过的话
+请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
+{moderation_prompt}
+不要输出多余内容(包括前后缀，冒号和引号，括号()，表情包，emoji,at或 @等 )。只输出一条回复就好
+""",
+        "replyer_system_prompt",
+    )
+
     Prompt(
         """
 {expression_habits_block}{tool_info_block}
 {knowledge_prompt}{memory_block}{relation_info_block}
 {extra_info_block}
-{identity}
 {action_descriptions}
 {time_block}
 你现在的主要任务是和 {sender_name} 聊天。同时，也有其他用户会参与聊天，你可以参考他们的回复内容，但是你现在想回复{sender_name}的发言。
@@ -81,12 +98,7 @@ def init_prompt():
 
 
 你现在的心情是：{mood_state}
-{reply_style}
-注意不要复读你说过的话
 {keywords_reaction_prompt}
-请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
-{moderation_prompt}
-不要输出多余内容(包括前后缀，冒号和引号，括号()，表情包，emoji,at或 @等 )。只输出一条回复就好
 现在，你说：
 """,
         "replyer_prompt",
@@ -97,7 +109,6 @@ def init_prompt():
 {expression_habits_block}{tool_info_block}
 {knowledge_prompt}{memory_block}{relation_info_block}
 {extra_info_block}
-{identity}
 {action_descriptions}
 {time_block}
 你现在正在一个QQ群里聊天，以下是正在进行的聊天内容：
@@ -107,11 +118,7 @@ def init_prompt():
 请你根据聊天内容，组织一条新回复。注意，{target} 是刚刚你自己的发言，你要在这基础上进一步发言，请按照你自己的角度来继续进行回复。
 注意保持上下文的连贯性。
 你现在的心情是：{mood_state}
-{reply_style}
 {keywords_reaction_prompt}
-请注意不要输出多余内容(包括前后缀，冒号和引号，at或 @等 )。只输出回复内容。
-{moderation_prompt}
-不要输出多余内容(包括前后缀，冒号和引号，括号()，表情包，emoji,at或 @等 )。只输出一条回复就好
 现在，你说：
 """,
         "replyer_self_prompt",
@@ -187,7 +194,7 @@ class DefaultReplyer:
         try:
             # 3. 构建 Prompt
             with Timer("构建Prompt", {}):  # 内部计时器，可选保留
-                prompt,selected_expressions = await self.build_prompt_reply_context(
+                system_prompt, user_prompt, selected_expressions = await self.build_prompt_reply_context(
                     extra_info=extra_info,
                     available_actions=available_actions,
                     choosen_actions=choosen_actions,
@@ -196,9 +203,11 @@ class DefaultReplyer:
                     reply_reason=reply_reason,
                 )
 
-            if not prompt:
+            if not user_prompt:
                 logger.warning("构建prompt失败，跳过回复生成")
                 return False, None, None, []
+            # 插件事件和返回值仍使用完整的提示词
+            prompt = f"{system_prompt}\n{user_prompt}"
             from src.plugin_system.core.events_manager import events_manager
 
             if not from_plugin:
@@ -213,7 +222,9 @@ class DefaultReplyer:
             model_name = "unknown_model"
 
             try:
-                content, reasoning_content, model_name, tool_call = await self.llm_generate_content(prompt)
+                content, reasoning_content, model_name, tool_call = await self.llm_generate_content(
+                    user_prompt, system_prompt=system_prompt
+                )
                 logger.debug(f"replyer生成内容: {content}")
                 llm_response = {
                     "content": content,
@@ -262,7 +273,7 @@ class DefaultReplyer:
         """
         try:
             with Timer("构建Prompt", {}):  # 内部计时器，可选保留
-                prompt = await self.build_prompt_rewrite_context(
+                system_prompt, user_prompt = await self.build_prompt_rewrite_context(
                     raw_reply=raw_reply,
                     reason=reason,
                     reply_to=reply_to,
@@ -271,12 +282,15 @@ class DefaultReplyer:
             content = None
             reasoning_content = None
             model_name = "unknown_model"
-            if not prompt:
+            if not user_prompt:
                 logger.error("Prompt 构建失败，无法生成回复。")
                 return False, None, None
+            prompt = f"{system_prompt}\n{user_prompt}"
 
             try:
-                content, reasoning_content, model_name, _ = await self.llm_generate_content(prompt)
+                content, reasoning_content, model_name, _ = await self.llm_generate_content(
+                    user_prompt, system_prompt=system_prompt
+                )
                 logger.info(f"想要表达：{raw_reply}||理由：{reason}||生成回复: {content}\n")
 
             except Exception as llm_e:
@@ -673,7 +687,7 @@ class DefaultReplyer:
         choosen_actions: Optional[List[Dict[str, Any]]] = None,
         enable_tool: bool = True,
         reply_message: Optional[Dict[str, Any]] = None,
-    ) -> Tuple[str, List[int]]:
+    ) -> Tuple[str, str, List[int]]:
         """
         构建回复器上下文
 
@@ -686,7 +700,7 @@ class DefaultReplyer:
             enable_tool: 是否启用工具调用
             reply_message: 回复的原始消息
         Returns:
-            str: 构建好的上下文
+            Tuple[str, str, List[int]]: (不变的前缀, 随对话变化的提示词, 选中的表达方式id)
         """
         if available_actions is None:
             available_actions = {}
@@ -705,6 +719,10 @@ class DefaultReplyer:
             person_name = "用户"
             sender = "用户"
             target = "消息"
+
+        # 回复对象中尚未识别的图片优先识别
+        for pic_id in re.findall(r"\[picid:([^\]]+)\]", target or ""):
+            await get_image_manager().prioritize_image(pic_id)
         
 
         if global_config.mood.enable_mood:
@@ -830,8 +848,14 @@ class DefaultReplyer:
             message_list_before_now_long, user_id, sender
         )
 
+        system_prompt = await global_prompt_manager.format_prompt(
+            "replyer_system_prompt",
+            identity=identity_block,
+            reply_style=global_config.personality.reply_style,
+            moderation_prompt=moderation_prompt_block,
+        )
         if global_config.bot.qq_account == user_id and platform == global_config.bot.platform:
-            return await global_prompt_manager.format_prompt(
+            return system_prompt, await global_prompt_manager.format_prompt(
                 "replyer_self_prompt",
                 expression_habits_block=expression_habits_block,
                 tool_info_block=tool_info,
@@ -839,19 +863,16 @@ class DefaultReplyer:
                 memory_block=memory_block,
                 relation_info_block=relation_info,
                 extra_info_block=extra_info_block,
-                identity=identity_block,
                 action_descriptions=actions_info,
                 mood_state=mood_prompt,
                 background_dialogue_prompt=background_dialogue_prompt,
                 time_block=time_block,
                 target=target,
                 reason=reply_reason,
-                reply_style=global_config.personality.reply_style,
                 keywords_reaction_prompt=keywords_reaction_prompt,
-                moderation_prompt=moderation_prompt_block,
             ),selected_expressions
         else:
-            return await global_prompt_manager.format_prompt(
+            return system_prompt, await global_prompt_manager.format_prompt(
                 "replyer_prompt",
                 expression_habits_block=expression_habits_block,
                 tool_info_block=tool_info,
@@ -859,7 +880,6 @@ class DefaultReplyer:
                 memory_block=memory_block,
                 relation_info_block=relation_info,
                 extra_info_block=extra_info_block,
-                identity=identity_block,
                 action_descriptions=actions_info,
                 sender_name=sender,
                 mood_state=mood_prompt,
@@ -867,9 +887,7 @@ class DefaultReplyer:
                 time_block=time_block,
                 core_dialogue_prompt=core_dialogue_prompt,
                 reply_target_block=reply_target_block,
-                reply_style=global_config.personality.reply_style,
                 keywords_reaction_prompt=keywords_reaction_prompt,
-                moderation_prompt=moderation_prompt_block,
             ),selected_expressions
 
     async def build_prompt_rewrite_context(
@@ -878,7 +896,8 @@ class DefaultReplyer:
         reason: str,
         reply_to: str,
         reply_message: Optional[Dict[str, Any]] = None,
-    ) -> Tuple[str, List[int]]:  # sourcery skip: merge-else-if-into-elif, remove-redundant-if
+    ) -> Tuple[str, str]:  # sourcery skip: merge-else-if-into-elif, remove-redundant-if
+        """返回 (不变的前缀, 随对话变化的提示词)"""
         chat_stream = self.chat_stream
         chat_id = chat_stream.stream_id
         is_group_chat = bool(chat_stream.group_info)
@@ -963,24 +982,25 @@ class DefaultReplyer:
                 "chat_target_private2", sender_name=chat_target_name
             )
 
-        template_name = "default_expressor_prompt"
-
-        return await global_prompt_manager.format_prompt(
-            template_name,
+        system_prompt = await global_prompt_manager.format_prompt(
+            "default_expressor_system_prompt",
+            identity=identity_block,
+            reply_style=global_config.personality.reply_style,
+            moderation_prompt=moderation_prompt_block,
+        )
+        return system_prompt, await global_prompt_manager.format_prompt(
+            "default_expressor_prompt",
             expression_habits_block=expression_habits_block,
             relation_info_block=relation_info,
             chat_target=chat_target_1,
             time_block=time_block,
             chat_info=chat_talking_prompt_half,
-            identity=identity_block,
             chat_target_2=chat_target_2,
             reply_target_block=reply_target_block,
             raw_reply=raw_reply,
             reason=reason,
             mood_state=mood_prompt,  # 添加情绪状态参数
-            reply_style=global_config.personality.reply_style,
             keywords_reaction_prompt=keywords_reaction_prompt,
-            moderation_prompt=moderation_prompt_block,
         )
 
     async def _build_single_sending_message(
@@ -1017,17 +1037,20 @@ class DefaultReplyer:
             display_message=display_message,
         )
 
-    async def llm_generate_content(self, prompt: str):
+    async def llm_generate_content(self, prompt: str, system_prompt: Optional[str] = None):
         with Timer("LLM生成", {}):  # 内部计时器，可选保留
             # 直接使用已初始化的模型实例
             logger.info(f"使用模型集生成回复: {self.express_model.model_for_task}")
 
+            full_prompt = f"{system_prompt}\n{prompt}" if system_prompt else prompt
             if global_config.debug.show_prompt:
-                logger.info(f"\n{prompt}\n")
+                logger.info(f"\n{full_prompt}\n")
             else:
-                logger.debug(f"\n{prompt}\n")
+                logger.debug(f"\n{full_prompt}\n")
 
-            content, (reasoning_content, model_name, tool_calls) = await self.express_model.generate_response_async(prompt)
+            content, (reasoning_content, model_name, tool_calls) = await self.express_model.generate_response_async(
+                prompt, system_prompt=system_prompt
+            )
 
             logger.debug(f"replyer生成内容: {content}")
         return content, reasoning_content, model_name, tool_calls
@@ -1036,6 +1059,7 @@ class DefaultReplyer:
         related_info = ""
         start_time = time.time()
         from src.plugins.built_in.knowledge.lpmm_get_knowledge import SearchKnowledgeFromLPMMTool
+        from src.chat.knowledge.knowledge_lib import knowledge_loader
 
 
         logger.debug(f"获取知识库内容，元消息：{message[:30]}...，消息长度: {len(message)}")
@@ -1045,6 +1069,10 @@ class DefaultReplyer:
             if not global_config.lpmm_knowledge.enable:
                 logger.debug("LPMM知识库未启用，跳过获取知识库内容")
                 return ""
+            if not knowledge_loader.is_ready():
+                # 知识库加载完成前不调用工具模型，省去一次无意义的请求
+                logger.debug("LPMM知识库仍在加载中，跳过获取知识库内容")
+                return ""
             time_now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
             bot_name = global_config.bot.nickname
@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+
+from typing import List, Optional
+from PIL import Image, ImageSequence
+
+HASH_SIZE = 8
+"""感知哈希边长，哈希共 HASH_SIZE * HASH_SIZE 位"""
+
+
+def dhash(frame: Image.Image, hash_size: int = HASH_SIZE) -> np.ndarray:
+    """计算帧的差值感知哈希 (dHash)
+
+    先把帧缩小为 (hash_size + 1) x hash_size 的灰度图，再比较相邻像素的明暗，
+    得到 hash_size * hash_size 位的布尔数组。缩小后再比较，计算量与原图尺寸无关。
+    """
+    small = frame.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    return (pixels[:, 1:] > pixels[:, :-1]).ravel()
+
+
+def sample_gif_frames(
+    gif_data: bytes,
+    max_frames: int = 15,
+    hash_distance_threshold: int = 6,
+    target_height: int = 200,
+) -> Optional[Image.Image]:
+    """流式抽取GIF中互不相似的帧，并水平拼接为一张静态图
+
+    逐帧惰性解码，每帧只计算缩小后的感知哈希；与已选中帧的汉明距离都大于阈值时才选中，
+    选中的帧立即缩放并贴到输出画布上，选够 max_frames 帧后停止解码。
+    任意时刻只持有当前帧与输出画布，不会保留所有帧的副本。
+
+    Args:
+        gif_data: GIF文件的二进制数据
+        max_frames: 最多抽取的帧数
+        hash_distance_threshold: 判定两帧相似的最大汉明距离（0~64），越大去重越激进
+        target_height: 输出图像的高度，宽度按第一帧的宽高比计算
+
+    Returns:
+        Optional[Image.Image]: 拼接后的RGB图像，GIF中没有帧时返回None
+    """
+    with Image.open(io.BytesIO(gif_data)) as gif:
+        frame_width, frame_height = gif.size
+        if frame_height == 0:
+            raise ValueError("帧高度为0，无法计算缩放尺寸")
+        target_width = max(int((target_height / frame_height) * frame_width), 1)
+
+        canvas: Optional[Image.Image] = None
+        selected_hashes: List[np.ndarray] = []
+
+        for frame in ImageSequence.Iterator(gif):
+            frame_hash = dhash(frame)
+            if any(np.count_nonzero(frame_hash != selected) <= hash_distance_threshold for selected in selected_hashes):
+                continue
+
+            if canvas is None:
+                canvas = Image.new("RGB", (target_width * max_frames, target_height))
+            resized = frame.convert("RGB").resize((target_width, target_height), Image.Resampling.LANCZOS)
+            canvas.paste(resized, (len(selected_hashes) * target_width, 0))
+            selected_hashes.append(frame_hash)
+
+            if len(selected_hashes) >= max_frames:
+                break
+
+    if canvas is None:
+        return None
+    return canvas.crop((0, 0, target_width * len(selected_hashes), target_height))
@@ -10,6 +10,7 @@ from src.common.database.database import db
 from src.common.database.database_model import OnlineTime, LLMUsage, Messages
 from src.manager.async_task_manager import AsyncTask
 from src.manager.local_store_manager import local_storage
+from src.llm_models.utils import llm_usage_recorder
 
 logger = get_logger("maibot_statistic")
 
@@ -321,6 +322,9 @@ class StatisticOutputTask(AsyncTask):
             for period_key, _ in collect_period
         }
 
+        # 先写入后台队列中尚未落盘的用量记录，保证统计包含最近的请求
+        llm_usage_recorder.flush()
+
         # 以最早的时间戳为起始时间获取记录
         # Assuming LLMUsage.timestamp is a DateTimeField
         query_start_time = collect_period[-1][1]
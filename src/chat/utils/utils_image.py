@@ -5,9 +5,10 @@ import hashlib
 import uuid
 import io
 import asyncio
-import numpy as np
 
-from typing import Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
 from PIL import Image
 from rich.traceback import install
 
@@ -16,15 +17,35 @@ from src.common.database.database import db
 from src.common.database.database_model import Images, ImageDescriptions
 from src.config.config import global_config, model_config
 from src.llm_models.utils_model import LLMRequest
+from src.chat.utils.gif_sampler import sample_gif_frames
 
 install(extra_lines=3)
 
 logger = get_logger("chat_image")
 
+VLM_PRIORITY_REPLY = 0
+"""当前回复正在引用的图片，优先识别"""
+VLM_PRIORITY_NORMAL = 1
+"""普通新图片"""
+
+
+@dataclass
+class _VLMJob:
+    """待识别的图片任务，相同哈希的图片合并为一个任务"""
+
+    image_hash: str
+    image_base64: str
+    priority: int
+    enqueue_time: float
+    image_ids: List[str] = field(default_factory=list)
+
 
 class ImageManager:
     _instance = None
     IMAGE_DIR = "data"  # 图像存储根目录
+    VLM_WORKERS = 3  # 同时进行的VLM识别数量
+    VLM_QUEUE_LIMIT = 256  # 等待识别的图片上限，超出后新图片不再排队识别
+    HASH_CACHE_SIZE = 10000  # 内存中 哈希 -> 图片ID 缓存的容量
 
     def __new__(cls):
         if cls._instance is None:
@@ -39,6 +60,28 @@ class ImageManager:
             self._initialized = True
             self.vlm = LLMRequest(model_set=model_config.model_task_config.vlm, request_type="image")
 
+            # 哈希 -> 图片ID 缓存，命中时无需查询数据库
+            self._hash_to_id: OrderedDict[str, str] = OrderedDict()
+            # 正在入库的图片哈希，相同图片并发到达时等待首个入库完成
+            self._ingesting: Dict[str, asyncio.Future] = {}
+
+            # VLM识别队列：(优先级, 序号, 哈希)，任务本体保存在 _vlm_jobs 中
+            self._vlm_queue: Optional[asyncio.PriorityQueue] = None
+            self._vlm_jobs: Dict[str, _VLMJob] = {}
+            self._vlm_id_to_hash: Dict[str, str] = {}
+            self._vlm_running: Set[str] = set()
+            self._vlm_workers: List[asyncio.Task] = []
+            self._vlm_seq = 0
+            self._vlm_stats = {
+                "enqueued": 0,
+                "coalesced": 0,
+                "prioritized": 0,
+                "dropped": 0,
+                "processed": 0,
+                "failed": 0,
+                "total_wait_time": 0.0,
+            }
+
             try:
                 db.connect(reuse_if_open=True)
                 db.create_tables([Images, ImageDescriptions], safe=True)
@@ -327,13 +370,15 @@ class ImageManager:
             return "[图片(处理失败)]"
 
     @staticmethod
-    def transform_gif(gif_base64: str, similarity_threshold: float = 1000.0, max_frames: int = 15) -> Optional[str]:
+    def transform_gif(gif_base64: str, similarity_threshold: int = 6, max_frames: int = 15) -> Optional[str]:
         # sourcery skip: use-contextlib-suppress
         """将GIF转换为水平拼接的静态图像, 跳过相似的帧
 
+        逐帧流式解码并以感知哈希去重，不会一次性持有所有帧
+
         Args:
             gif_base64: GIF的base64编码字符串
-            similarity_threshold: 判定帧相似的阈值 (MSE)，越小表示要求差异越大才算不同帧，默认1000.0
+            similarity_threshold: 判定帧相似的感知哈希汉明距离阈值 (0~64)，越大去重越激进，默认6
             max_frames: 最大抽取的帧数，默认15
 
         Returns:
@@ -345,97 +390,14 @@ class ImageManager:
                 gif_base64 = gif_base64.encode("ascii", errors="ignore").decode("ascii")
             # 解码base64
             gif_data = base64.b64decode(gif_base64)
-            gif = Image.open(io.BytesIO(gif_data))
 
-            # 收集所有帧
-            all_frames = []
-            try:
-                while True:
-                    gif.seek(len(all_frames))
-                    # 确保是RGB格式方便比较
-                    frame = gif.convert("RGB")
-                    all_frames.append(frame.copy())
-            except EOFError:
-                pass  # 读完啦
-
-            if not all_frames:
+            combined_image = sample_gif_frames(
+                gif_data, max_frames=max_frames, hash_distance_threshold=similarity_threshold
+            )
+            if combined_image is None:
                 logger.warning("GIF中没有找到任何帧")
                 return None  # 空的GIF直接返回None
 
-            # --- 新的帧选择逻辑 ---
-            selected_frames = []
-            last_selected_frame_np = None
-
-            for i, current_frame in enumerate(all_frames):
-                current_frame_np = np.array(current_frame)
-
-                # 第一帧总是要选的
-                if i == 0:
-                    selected_frames.append(current_frame)
-                    last_selected_frame_np = current_frame_np
-                    continue
-
-                # 计算和上一张选中帧的差异（均方误差 MSE）
-                if last_selected_frame_np is not None:
-                    mse = np.mean((current_frame_np - last_selected_frame_np) ** 2)
-                    # logger.debug(f"帧 {i} 与上一选中帧的 MSE: {mse}") # 可以取消注释来看差异值
-
-                    # 如果差异够大，就选它！
-                    if mse > similarity_threshold:
-                        selected_frames.append(current_frame)
-                        last_selected_frame_np = current_frame_np
-                        # 检查是不是选够了
-                        if len(selected_frames) >= max_frames:
-                            # logger.debug(f"已选够 {max_frames} 帧，停止选择。")
-                            break
-                # 如果差异不大就跳过这一帧啦
-
-            # --- 帧选择逻辑结束 ---
-
-            # 如果选择后连一帧都没有（比如GIF只有一帧且后续处理失败？）或者原始GIF就没帧，也返回None
-            if not selected_frames:
-                logger.warning("处理后没有选中任何帧")
-                return None
-
-            # logger.debug(f"总帧数: {len(all_frames)}, 选中帧数: {len(selected_frames)}")
-
-            # 获取选中的第一帧的尺寸（假设所有帧尺寸一致）
-            frame_width, frame_height = selected_frames[0].size
-
-            # 计算目标尺寸，保持宽高比
-            target_height = 200  # 固定高度
-            # 防止除以零
-            if frame_height == 0:
-                logger.error("帧高度为0，无法计算缩放尺寸")
-                return None
-            target_width = int((target_height / frame_height) * frame_width)
-            # 宽度也不能是0
-            if target_width == 0:
-                logger.warning(f"计算出的目标宽度为0 (原始尺寸 {frame_width}x{frame_height})，调整为1")
-                target_width = 1
-
-            # 调整所有选中帧的大小
-            resized_frames = [
-                frame.resize((target_width, target_height), Image.Resampling.LANCZOS) for frame in selected_frames
-            ]
-
-            # 创建拼接图像
-            total_width = target_width * len(resized_frames)
-            # 防止总宽度为0
-            if total_width == 0 and resized_frames:
-                logger.warning("计算出的总宽度为0，但有选中帧，可能目标宽度太小")
-                # 至少给点宽度吧
-                total_width = len(resized_frames)
-            elif total_width == 0:
-                logger.error("计算出的总宽度为0且无选中帧")
-                return None
-
-            combined_image = Image.new("RGB", (total_width, target_height))
-
-            # 水平拼接图像
-            for idx, frame in enumerate(resized_frames):
-                combined_image.paste(frame, (idx * target_width, 0))
-
             # 转换为base64
             buffer = io.BytesIO()
             combined_image.save(buffer, format="JPEG", quality=85)  # 保存为JPEG
@@ -451,6 +413,8 @@ class ImageManager:
         # sourcery skip: hoist-if-from-if
         """处理图片并返回图片ID和描述
 
+        新图片的文件写入在线程中完成，VLM识别交给有界的识别队列异步处理
+
         Args:
             image_base64: 图片的base64编码
 
@@ -466,6 +430,16 @@ class ImageManager:
             image_bytes = base64.b64decode(image_base64)
             image_hash = hashlib.md5(image_bytes).hexdigest()
 
+            # 相同图片正在入库，等待其完成后按已存在处理
+            if ingesting := self._ingesting.get(image_hash):
+                await asyncio.shield(ingesting)
+
+            if image_id := self._get_cached_image_id(image_hash):
+                if Images.update(count=Images.count + 1).where(Images.image_id == image_id).execute():
+                    return image_id, f"[picid:{image_id}]"
+                # 记录已被删除，缓存失效后按新图片处理
+                self._hash_to_id.pop(image_hash, None)
+
             if existing_image := Images.get_or_none(Images.emoji_hash == image_hash):
                 # 检查是否缺少必要字段，如果缺少则创建新记录
                 if (
@@ -486,35 +460,41 @@ class ImageManager:
 
                 existing_image.count += 1
                 existing_image.save()
+                self._cache_image_id(image_hash, existing_image.image_id)
                 return existing_image.image_id, f"[picid:{existing_image.image_id}]"
             else:
                 # print(f"图片不存在: {image_hash}")
                 image_id = str(uuid.uuid4())
 
-            # 保存新图片
-            current_timestamp = time.time()
-            image_dir = os.path.join(self.IMAGE_DIR, "images")
-            os.makedirs(image_dir, exist_ok=True)
-            filename = f"{image_id}.png"
-            file_path = os.path.join(image_dir, filename)
-
-            # 保存文件
-            with open(file_path, "wb") as f:
-                f.write(image_bytes)
-
-            # 保存到数据库
-            Images.create(
-                image_id=image_id,
-                emoji_hash=image_hash,
-                path=file_path,
-                type="image",
-                timestamp=current_timestamp,
-                vlm_processed=False,
-                count=1,
-            )
+            ingesting = asyncio.get_running_loop().create_future()
+            self._ingesting[image_hash] = ingesting
+            try:
+                # 保存新图片
+                current_timestamp = time.time()
+                image_dir = os.path.join(self.IMAGE_DIR, "images")
+                filename = f"{image_id}.png"
+                file_path = os.path.join(image_dir, filename)
+
+                # 在线程中保存文件，避免阻塞事件循环
+                await asyncio.to_thread(self._write_image_file, image_dir, file_path, image_bytes)
+
+                # 保存到数据库
+                Images.create(
+                    image_id=image_id,
+                    emoji_hash=image_hash,
+                    path=file_path,
+                    type="image",
+                    timestamp=current_timestamp,
+                    vlm_processed=False,
+                    count=1,
+                )
+                self._cache_image_id(image_hash, image_id)
+            finally:
+                self._ingesting.pop(image_hash, None)
+                ingesting.set_result(None)
 
-            # 启动异步VLM处理
-            asyncio.create_task(self._process_image_with_vlm(image_id, image_base64))
+            # 交给VLM识别队列异步处理
+            self._enqueue_vlm(image_hash, image_id, image_base64)
 
             return image_id, f"[picid:{image_id}]"
 
@@ -522,6 +502,160 @@ class ImageManager:
             logger.error(f"处理图片失败: {str(e)}")
             return "", "[图片]"
 
+    @staticmethod
+    def _write_image_file(image_dir: str, file_path: str, image_bytes: bytes) -> None:
+        """写入图片文件（在线程中执行）"""
+        os.makedirs(image_dir, exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(image_bytes)
+
+    def _get_cached_image_id(self, image_hash: str) -> Optional[str]:
+        if (image_id := self._hash_to_id.get(image_hash)) is not None:
+            self._hash_to_id.move_to_end(image_hash)
+        return image_id
+
+    def _cache_image_id(self, image_hash: str, image_id: str) -> None:
+        self._hash_to_id[image_hash] = image_id
+        self._hash_to_id.move_to_end(image_hash)
+        while len(self._hash_to_id) > self.HASH_CACHE_SIZE:
+            self._hash_to_id.popitem(last=False)
+
+    # === VLM识别队列 ===
+
+    def _ensure_vlm_workers(self) -> None:
+        """在当前事件循环中按需启动识别队列与工作协程"""
+        if self._vlm_queue is None:
+            self._vlm_queue = asyncio.PriorityQueue()
+        self._vlm_workers = [task for task in self._vlm_workers if not task.done()]
+        for i in range(len(self._vlm_workers), self.VLM_WORKERS):
+            worker = asyncio.create_task(self._vlm_worker())
+            worker.set_name(f"image-vlm-worker-{i}")
+            self._vlm_workers.append(worker)
+
+    def _push_vlm_job(self, job: _VLMJob) -> None:
+        self._vlm_seq += 1
+        self._vlm_queue.put_nowait((job.priority, self._vlm_seq, job.image_hash))  # type: ignore
+
+    def _enqueue_vlm(
+        self, image_hash: str, image_id: str, image_base64: str, priority: int = VLM_PRIORITY_NORMAL
+    ) -> bool:
+        """将图片加入VLM识别队列，相同哈希的图片合并为一个任务
+
+        Returns:
+            bool: 是否成功入队（或合并到已有任务）
+        """
+        if job := self._vlm_jobs.get(image_hash):
+            if image_id not in job.image_ids:
+                job.image_ids.append(image_id)
+                self._vlm_id_to_hash[image_id] = image_hash
+            self._vlm_stats["coalesced"] += 1
+            if priority < job.priority:
+                job.priority = priority
+                self._push_vlm_job(job)
+            return True
+
+        # 回复引用的图片数量很少，不受队列上限限制
+        if len(self._vlm_jobs) >= self.VLM_QUEUE_LIMIT and priority != VLM_PRIORITY_REPLY:
+            self._vlm_stats["dropped"] += 1
+            logger.warning(f"VLM识别队列已满 ({self.VLM_QUEUE_LIMIT})，图片 {image_id} 暂不识别，被回复引用时再识别")
+            return False
+
+        self._ensure_vlm_workers()
+        job = _VLMJob(
+            image_hash=image_hash,
+            image_base64=image_base64,
+            priority=priority,
+            enqueue_time=time.time(),
+            image_ids=[image_id],
+        )
+        self._vlm_jobs[image_hash] = job
+        self._vlm_id_to_hash[image_id] = image_hash
+        self._vlm_stats["enqueued"] += 1
+        self._push_vlm_job(job)
+        return True
+
+    async def prioritize_image(self, image_id: str) -> bool:
+        """提高图片的识别优先级，用于当前回复正在引用但尚未识别的图片
+
+        图片因队列已满未能排队时，从图片存储中重新读取并以回复优先级加入队列
+
+        Returns:
+            bool: 图片是否在队列中等待识别
+        """
+        image_hash = self._vlm_id_to_hash.get(image_id)
+        if image_hash:
+            if image_hash in self._vlm_running:
+                return False
+            if (job := self._vlm_jobs.get(image_hash)) is None:
+                return False
+            if job.priority > VLM_PRIORITY_REPLY:
+                job.priority = VLM_PRIORITY_REPLY
+                self._vlm_stats["prioritized"] += 1
+                self._push_vlm_job(job)
+            return True
+
+        try:
+            stored = await asyncio.to_thread(self._load_undescribed_image, image_id)
+        except Exception as e:
+            logger.warning(f"读取待识别图片 {image_id} 失败: {e}")
+            return False
+        if stored is None:
+            return False
+        image_hash, image_base64 = stored
+        if self._enqueue_vlm(image_hash, image_id, image_base64, VLM_PRIORITY_REPLY):
+            self._vlm_stats["prioritized"] += 1
+            return True
+        return False
+
+    @staticmethod
+    def _load_undescribed_image(image_id: str) -> Optional[Tuple[str, str]]:
+        """读取尚未识别的图片（在线程中执行）
+
+        Returns:
+            Optional[Tuple[str, str]]: (图片哈希, base64编码)，图片不存在或已有描述时返回None
+        """
+        image = Images.get_or_none(Images.image_id == image_id)
+        if not image or image.description or image.vlm_processed or not image.path:
+            return None
+        return image.emoji_hash, image_path_to_base64(image.path)
+
+    async def _vlm_worker(self) -> None:
+        """VLM识别工作协程，按优先级依次处理队列中的任务"""
+        assert self._vlm_queue is not None
+        while True:
+            priority, _, image_hash = await self._vlm_queue.get()
+            try:
+                job = self._vlm_jobs.get(image_hash)
+                # 已处理的任务或被提高优先级后留下的旧条目直接跳过
+                if job is None or image_hash in self._vlm_running or priority != job.priority:
+                    continue
+                self._vlm_running.add(image_hash)
+                self._vlm_stats["total_wait_time"] += time.time() - job.enqueue_time
+                try:
+                    for image_id in job.image_ids:
+                        await self._process_image_with_vlm(image_id, job.image_base64)
+                    self._vlm_stats["processed"] += 1
+                except Exception as e:
+                    self._vlm_stats["failed"] += 1
+                    logger.error(f"VLM识别任务失败: {e}")
+                finally:
+                    self._vlm_running.discard(image_hash)
+                    self._vlm_jobs.pop(image_hash, None)
+                    for image_id in job.image_ids:
+                        self._vlm_id_to_hash.pop(image_id, None)
+            finally:
+                self._vlm_queue.task_done()
+
+    def get_vlm_queue_stats(self) -> Dict[str, float]:
+        """获取VLM识别队列的深度与处理统计"""
+        stats = dict(self._vlm_stats)
+        processed = stats["processed"] + stats["failed"]
+        stats["queued"] = len(self._vlm_jobs) - len(self._vlm_running)
+        stats["running"] = len(self._vlm_running)
+        stats["avg_wait_time"] = stats["total_wait_time"] / processed if processed else 0.0
+        stats["hash_cache_size"] = len(self._hash_to_id)
+        return stats
+
     async def _process_image_with_vlm(self, image_id: str, image_base64: str) -> None:
         """使用VLM处理图片并更新数据库
 
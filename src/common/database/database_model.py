@@ -87,6 +87,7 @@ class LLMUsage(BaseModel):
     prompt_tokens = IntegerField()
     completion_tokens = IntegerField()
     total_tokens = IntegerField()
+    cached_tokens = IntegerField(default=0)  # 命中服务商提示词缓存的输入token数
     cost = DoubleField()
     time_cost = DoubleField(null=True)
     status = TextField()
@@ -319,6 +320,52 @@ class Memory(BaseModel):
 
     class Meta:
         table_name = "memory"
+        indexes = ((("chat_id", "create_time"), False),)
+
+
+class MemoryKeyword(BaseModel):
+    """
+    即时记忆的关键词倒排索引，每个(记忆, 关键词)一行。
+    """
+
+    keyword = TextField()
+    chat_id = TextField(null=True)
+    memory_id = TextField(index=True)
+    create_time = FloatField(null=True)  # 冗余记忆的创建时间，便于按时间范围检索
+
+    class Meta:
+        table_name = "memory_keyword"
+        indexes = ((("chat_id", "keyword", "create_time"), False),)
+
+
+class RelationshipSegment(BaseModel):
+    """
+    关系构建器跟踪的用户消息段，每行是某用户在某聊天中的一段活跃时间。
+    """
+
+    person_id = TextField()
+    chat_id = TextField()
+    start_time = FloatField()
+    end_time = FloatField()
+    last_msg_time = FloatField()
+    message_count = IntegerField(default=0)  # 段内消息数，随消息增量累加
+
+    class Meta:
+        table_name = "relationship_segment"
+        indexes = ((("chat_id", "person_id"), False),)
+
+
+class RelationshipBuilderState(BaseModel):
+    """
+    每个聊天的关系构建器处理进度。
+    """
+
+    chat_id = TextField(unique=True)
+    last_processed_message_time = FloatField(default=0.0)
+    last_cleanup_time = FloatField(default=0.0)
+
+    class Meta:
+        table_name = "relationship_builder_state"
 
 
 class Expression(BaseModel):
@@ -388,6 +435,9 @@ def create_tables():
                 GraphNodes,  # 添加图节点表
                 GraphEdges,  # 添加图边表
                 Memory,
+                MemoryKeyword,
+                RelationshipSegment,
+                RelationshipBuilderState,
                 ActionRecords,  # 添加 ActionRecords 到初始化列表
             ]
         )
@@ -414,6 +464,9 @@ def initialize_database(sync_constraints=False):
         PersonInfo,
         Expression,
         Memory,
+        MemoryKeyword,
+        RelationshipSegment,
+        RelationshipBuilderState,
         GraphNodes,
         GraphEdges,
         ActionRecords,  # 添加 ActionRecords 到初始化列表
@@ -429,6 +482,9 @@ def initialize_database(sync_constraints=False):
                     logger.info(f"表 '{table_name}' 创建成功")
                     continue
 
+                # 补建模型中新定义的索引（IF NOT EXISTS，已存在的不受影响）
+                model._schema.create_indexes(safe=True)
+
                 # 检查字段
                 cursor = db.execute_sql(f"PRAGMA table_info('{table_name}')")
                 existing_columns = {row[1] for row in cursor.fetchall()}
@@ -512,6 +568,9 @@ def sync_field_constraints():
         PersonInfo,
         Expression,
         Memory,
+        MemoryKeyword,
+        RelationshipSegment,
+        RelationshipBuilderState,
         GraphNodes,
         GraphEdges,
         ActionRecords,
@@ -691,6 +750,9 @@ def check_field_constraints():
         PersonInfo,
         Expression,
         Memory,
+        MemoryKeyword,
+        RelationshipSegment,
+        RelationshipBuilderState,
         GraphNodes,
         GraphEdges,
         ActionRecords,
@@ -0,0 +1,82 @@
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_IMPORTS_ENV = "MAIBOT_PROFILE_IMPORTS"
+"""环境变量设为1时在启动期间统计各模块的导入耗时"""
+
+
+class ImportProfiler:
+    """
+    启动阶段的导入耗时统计
+
+    替换 builtins.__import__，只对首次导入（尚未在 sys.modules 中）的模块计时，
+    自身耗时 = 导入总耗时 - 其中导入其他模块的耗时，按线程分别维护导入栈。
+    """
+
+    def __init__(self) -> None:
+        self.self_times: Dict[str, float] = {}
+        self.total_times: Dict[str, float] = {}
+        self._original_import = None
+        self._local = threading.local()
+
+    @property
+    def active(self) -> bool:
+        return self._original_import is not None
+
+    def install(self) -> None:
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original_import = self._original_import or builtins.__import__
+        module_name = name
+        if level > 0:
+            try:
+                package = (globals or {}).get("__package__") or ""
+                module_name = importlib.util.resolve_name("." * level + name, package)
+            except (ImportError, ValueError):
+                module_name = name
+        if not module_name or module_name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+
+        stack: List[float] = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            child_time = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.total_times[module_name] = self.total_times.get(module_name, 0.0) + elapsed
+            self.self_times[module_name] = self.self_times.get(module_name, 0.0) + elapsed - child_time
+
+    def top(self, limit: int = 30) -> List[Tuple[str, float, float]]:
+        """按自身耗时排序的 (模块名, 自身耗时, 总耗时)"""
+        ordered = sorted(self.self_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(name, self_time, self.total_times[name]) for name, self_time in ordered]
+
+    def format_report(self, limit: int = 30) -> Optional[str]:
+        if not self.self_times:
+            return None
+        lines = [f"导入耗时最多的{limit}个模块（自身耗时 / 含子模块总耗时）："]
+        lines.extend(
+            f"  {name:<60} {self_time * 1000:>9.1f}ms / {total_time * 1000:>9.1f}ms"
+            for name, self_time, total_time in self.top(limit)
+        )
+        return "\n".join(lines)
+
+
+import_profiler = ImportProfiler()
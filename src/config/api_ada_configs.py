@@ -28,6 +28,15 @@ class APIProvider(ConfigBase):
     retry_interval: int = 10
     """重试间隔（如果API调用失败，重试的间隔时间，单位：秒）"""
 
+    max_concurrency: int = 0
+    """同时进行的最大请求数（0表示不限制）"""
+
+    requests_per_minute: int = 0
+    """每分钟最大请求数（0表示不限制）"""
+
+    tokens_per_minute: int = 0
+    """每分钟最大token数（按输入长度和max_tokens估算，请求完成后以实际用量修正，0表示不限制）"""
+
     def get_api_key(self) -> str:
         return self.api_key
 
@@ -88,6 +97,15 @@ class TaskConfig(ConfigBase):
     temperature: float = 0.3
     """模型温度"""
 
+    hedge_latency_percentile: float = 0.0
+    """对冲请求的延迟分位数（如0.9）：请求耗时超过当前模型该分位数的历史耗时仍未返回时，向列表中的下一个模型发出对冲请求，0为不启用"""
+
+    response_cache_ttl: int = 0
+    """响应缓存有效期（单位：秒）：相同模型、提示词、温度和工具的请求在有效期内直接返回缓存结果，0为不启用"""
+
+    response_cache_size: int = 512
+    """响应缓存的最大条目数（每种请求类型分别计算）"""
+
 
 @dataclass
 class ModelTaskConfig(ConfigBase):
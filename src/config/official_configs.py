@@ -353,6 +353,9 @@ class MemoryConfig(ConfigBase):
     enable_instant_memory: bool = True
     """是否启用即时记忆"""
 
+    enable_memory_snapshot: bool = False
+    """是否启用记忆图快照，启用后启动时优先从快照加载记忆图"""
+
 
 @dataclass
 class MoodConfig(ConfigBase):
@@ -1,13 +1,17 @@
 import asyncio
+import weakref
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
-from typing import Callable, Any, Optional
+from typing import AsyncIterator, Callable, Any, Optional
 
+from src.common.logger import get_logger
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from ..payload_content.message import Message
 from ..payload_content.resp_format import RespFormat
 from ..payload_content.tool_option import ToolOption, ToolCall
 
+logger = get_logger("model_client")
+
 
 @dataclass
 class UsageRecord:
@@ -30,6 +34,9 @@ class UsageRecord:
     total_tokens: int
     """总token数"""
 
+    cached_tokens: int = 0
+    """输入中命中服务商提示词缓存的token数"""
+
 
 @dataclass
 class APIResponse:
@@ -56,6 +63,49 @@ class APIResponse:
     """响应原始数据"""
 
 
+@dataclass
+class StreamChunk:
+    """
+    流式响应的增量块
+    """
+
+    content: str = ""
+    """正式内容增量"""
+
+    reasoning_content: str = ""
+    """推理内容增量"""
+
+    usage: UsageRecord | None = None
+    """使用情况（通常只在最后一个块中出现）"""
+
+    model_name: str = ""
+    """产出该增量的模型名称，由LLMRequest填写"""
+
+
+@dataclass
+class ConnectionStats:
+    """
+    连接复用统计（按APIProvider汇总）
+    """
+
+    clients_created: int = 0
+    """创建的客户端数"""
+
+    requests: int = 0
+    """发出的HTTP请求数"""
+
+    connections_opened: int = 0
+    """新建的TCP连接数"""
+
+    tls_handshakes: int = 0
+    """TLS握手次数"""
+
+    @property
+    def reused_requests(self) -> int:
+        """复用已有连接的请求数"""
+        return max(0, self.requests - self.connections_opened)
+
+
 class BaseClient(ABC):
     """
     基础客户端
@@ -65,6 +115,15 @@ class BaseClient(ABC):
 
     def __init__(self, api_provider: APIProvider):
         self.api_provider = api_provider
+        self.connection_stats = ConnectionStats()
+        """连接复用统计，由ClientRegistry替换为同一APIProvider共用的统计对象"""
+
+    async def aclose(self) -> None:  # noqa: B027 有意提供默认的空实现，子类按需重写
+        """
+        释放客户端持有的连接池等资源
+        默认无需处理，持有连接池的子类需要重写
+        """
+        return None
 
     @abstractmethod
     async def get_response(
@@ -97,6 +156,34 @@ class BaseClient(ABC):
         """
         raise NotImplementedError("'get_response' method should be overridden in subclasses")
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamChunk]:
+        """
+        以异步迭代器的形式获取对话响应，增量到达时立即产出
+        迭代器被关闭或所在任务被取消时，应当同时关闭底层的HTTP流
+        默认实现等待完整响应后一次性产出，支持流式的客户端应当重写此方法
+        :param model_info: 模型信息
+        :param message_list: 对话体
+        :param max_tokens: 最大token数（可选，默认为1024）
+        :param temperature: 温度（可选，默认为0.7）
+        :param extra_params: 附加的请求参数
+        :return: 响应增量块的异步迭代器
+        """
+        resp = await self.get_response(
+            model_info=model_info,
+            message_list=message_list,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_params=extra_params,
+        )
+        yield StreamChunk(content=resp.content or "", reasoning_content=resp.reasoning_content or "", usage=resp.usage)
+
     @abstractmethod
     async def get_embedding(
         self,
@@ -141,8 +228,14 @@ class ClientRegistry:
     def __init__(self) -> None:
         self.client_registry: dict[str, type[BaseClient]] = {}
         """APIProvider.type -> BaseClient的映射表"""
-        self.client_instance_cache: dict[str, BaseClient] = {}
-        """APIProvider.name -> BaseClient的映射表"""
+        self.client_instance_cache: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, BaseClient]] = (
+            weakref.WeakKeyDictionary()
+        )
+        """事件循环 -> (APIProvider.name -> BaseClient) 的映射表
+        客户端的连接池绑定在创建时的事件循环上，因此每个事件循环各自持有一组长期复用的客户端，
+        事件循环被回收后对应的客户端随之释放"""
+        self.connection_stats: dict[str, ConnectionStats] = {}
+        """APIProvider.name -> 连接复用统计"""
 
     def register_client_class(self, client_type: str):
         """
@@ -159,29 +252,63 @@ class ClientRegistry:
 
         return decorator
 
+    def _create_client(self, api_provider: APIProvider) -> BaseClient:
+        if not (client_class := self.client_registry.get(api_provider.client_type)):
+            raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
+        client = client_class(api_provider)
+        stats = self.connection_stats.setdefault(api_provider.name, ConnectionStats())
+        stats.clients_created += 1
+        client.connection_stats = stats
+        return client
+
     def get_client_class_instance(self, api_provider: APIProvider, force_new=False) -> BaseClient:
         """
-        获取注册的API客户端实例
+        获取注册的API客户端实例，同一事件循环中的同一APIProvider共用一个客户端
         Args:
             api_provider: APIProvider实例
-            force_new: 是否强制创建新实例（用于解决事件循环问题）
+            force_new: 是否强制创建新实例（不缓存，调用方需自行调用 aclose 释放）
         Returns:
             BaseClient: 注册的API客户端实例
         """
-        # 如果强制创建新实例，直接创建不使用缓存
         if force_new:
-            if client_class := self.client_registry.get(api_provider.client_type):
-                return client_class(api_provider)
-            else:
-                raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
-        
-        # 正常的缓存逻辑
-        if api_provider.name not in self.client_instance_cache:
-            if client_class := self.client_registry.get(api_provider.client_type):
-                self.client_instance_cache[api_provider.name] = client_class(api_provider)
+            return self._create_client(api_provider)
+
+        loop = asyncio.get_running_loop()
+        loop_clients = self.client_instance_cache.setdefault(loop, {})
+        if api_provider.name not in loop_clients:
+            loop_clients[api_provider.name] = self._create_client(api_provider)
+        return loop_clients[api_provider.name]
+
+    async def close_loop_clients(self) -> None:
+        """关闭当前事件循环上缓存的所有客户端"""
+        clients = self.client_instance_cache.pop(asyncio.get_running_loop(), {})
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭API客户端 '{name}' 时出错: {e}")
+
+    async def close_all(self, timeout: float = 5.0) -> None:
+        """
+        关闭所有事件循环上缓存的客户端（程序退出时调用）
+        其他线程中仍在运行的事件循环会在各自的循环中关闭，已关闭的事件循环只丢弃缓存
+        """
+        current_loop = asyncio.get_running_loop()
+        for loop in list(self.client_instance_cache.keys()):
+            if loop is current_loop:
+                await self.close_loop_clients()
+            elif loop.is_running() and not loop.is_closed():
+                future = asyncio.run_coroutine_threadsafe(self.close_loop_clients(), loop)
+                try:
+                    await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+                except Exception as e:
+                    logger.warning(f"关闭其他事件循环上的API客户端时出错: {e}")
             else:
-                raise KeyError(f"'{api_provider.client_type}' 类型的 Client 未注册")
-        return self.client_instance_cache[api_provider.name]
+                self.client_instance_cache.pop(loop, None)
+
+    def get_connection_stats(self) -> dict[str, ConnectionStats]:
+        """获取各APIProvider的连接复用统计"""
+        return self.connection_stats
 
 
 client_registry = ClientRegistry()
@@ -1,7 +1,9 @@
 import asyncio
+import hashlib
 import io
 import base64
-from typing import Callable, AsyncIterator, Optional, Coroutine, Any, List
+import time
+from typing import Callable, AsyncIterator, Optional, Coroutine, Any, Dict, List, Tuple
 
 from google import genai
 from google.genai.types import (
@@ -14,6 +16,7 @@ from google.genai.types import (
     ThinkingConfig,
     Tool,
     GenerateContentConfig,
+    CreateCachedContentConfig,
     EmbedContentResponse,
     EmbedContentConfig,
     SafetySetting,
@@ -221,7 +224,7 @@ def _build_stream_api_resp(
 async def _default_stream_response_handler(
     resp_stream: AsyncIterator[GenerateContentResponse],
     interrupt_flag: asyncio.Event | None,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, ...]]]:
     """
     流式响应处理函数 - 处理Gemini API的流式响应
     :param resp_stream: 流式响应对象,是一个神秘的iterator，我完全不知道这个玩意能不能跑，不过遍历一遍之后它就空了，如果跑不了一点的话可以考虑改成别的东西
@@ -253,6 +256,7 @@ async def _default_stream_response_handler(
                 chunk.usage_metadata.prompt_token_count or 0,
                 (chunk.usage_metadata.candidates_token_count or 0) + (chunk.usage_metadata.thoughts_token_count or 0),
                 chunk.usage_metadata.total_token_count or 0,
+                chunk.usage_metadata.cached_content_token_count or 0,
             )
     try:
         return _build_stream_api_resp(
@@ -267,7 +271,7 @@ async def _default_stream_response_handler(
 
 def _default_normal_response_parser(
     resp: GenerateContentResponse,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, ...]]]:
     """
     解析对话补全响应 - 将Gemini API响应解析为APIResponse对象
     :param resp: 响应对象
@@ -309,6 +313,7 @@ def _default_normal_response_parser(
             resp.usage_metadata.prompt_token_count or 0,
             (resp.usage_metadata.candidates_token_count or 0) + (resp.usage_metadata.thoughts_token_count or 0),
             resp.usage_metadata.total_token_count or 0,
+            resp.usage_metadata.cached_content_token_count or 0,
         )
     else:
         _usage_record = None
@@ -327,6 +332,34 @@ class GeminiClient(BaseClient):
         self.client = genai.Client(
             api_key=api_provider.api_key,
         )  # 这里和openai不一样，gemini会自己决定自己是否需要retry
+        self._cached_contents: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+        """(模型标识符, system指令哈希) -> (显式缓存名称, 失效时间)，名称为None表示创建失败、暂不重试"""
+        self._cache_lock = asyncio.Lock()
+
+    async def _get_cached_content(self, model_info: ModelInfo, system_instructions: list[str], ttl: int) -> Optional[str]:
+        """
+        获取（必要时创建）保存了system指令的显式上下文缓存，返回缓存名称
+        system指令过短等原因创建失败时返回None，并在一段时间内不再尝试
+        """
+        system_text = "\n".join(system_instructions)
+        key = (model_info.model_identifier, hashlib.sha256(system_text.encode("utf-8")).hexdigest())
+        async with self._cache_lock:
+            name, expires_at = self._cached_contents.get(key, (None, 0.0))
+            if time.time() < expires_at:
+                return name
+            try:
+                cached_content = await self.client.aio.caches.create(
+                    model=model_info.model_identifier,
+                    config=CreateCachedContentConfig(system_instruction=system_text, ttl=f"{ttl}s"),
+                )
+                name = cached_content.name
+                logger.debug(f"已为模型 '{model_info.name}' 创建上下文缓存 {name}")
+            except Exception as e:
+                logger.info(f"为模型 '{model_info.name}' 创建上下文缓存失败，改为直接发送system指令: {e}")
+                name = None
+            # 提前一分钟视为失效，避免使用即将过期的缓存
+            self._cached_contents[key] = (name, time.time() + max(ttl - 60, 60))
+            return name
 
     async def get_response(
         self,
@@ -339,11 +372,11 @@ class GeminiClient(BaseClient):
         stream_response_handler: Optional[
             Callable[
                 [AsyncIterator[GenerateContentResponse], asyncio.Event | None],
-                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int]]]],
+                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, ...]]]],
             ]
         ] = None,
         async_response_parser: Optional[
-            Callable[[GenerateContentResponse], tuple[APIResponse, Optional[tuple[int, int, int]]]]
+            Callable[[GenerateContentResponse], tuple[APIResponse, Optional[tuple[int, ...]]]]
         ] = None,
         interrupt_flag: asyncio.Event | None = None,
         extra_params: dict[str, Any] | None = None,
@@ -392,7 +425,15 @@ class GeminiClient(BaseClient):
             generation_config_dict["tools"] = Tool(function_declarations=tools)
         if messages[1]:
             # 如果有system消息，则将其添加到配置中
-            generation_config_dict["system_instructions"] = messages[1]
+            # 配置了 cached_content_ttl 且没有工具时，把不变的system指令放入显式上下文缓存，请求只引用缓存名称
+            cache_ttl = int(extra_params.get("cached_content_ttl", 0)) if extra_params else 0
+            cached_content = (
+                await self._get_cached_content(model_info, messages[1], cache_ttl) if cache_ttl > 0 and not tools else None
+            )
+            if cached_content:
+                generation_config_dict["cached_content"] = cached_content
+            else:
+                generation_config_dict["system_instruction"] = messages[1]
         if response_format and response_format.format_type == RespFormatType.TEXT:
             generation_config_dict["response_mime_type"] = "text/plain"
         elif response_format and response_format.format_type in (RespFormatType.JSON_OBJ, RespFormatType.JSON_SCHEMA):
@@ -452,6 +493,7 @@ class GeminiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3] if len(usage_record) > 3 else 0,
             )
 
         return resp
@@ -549,6 +591,7 @@ class GeminiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3] if len(usage_record) > 3 else 0,
             )
 
         return resp
@@ -3,12 +3,15 @@ import io
 import json
 import re
 import base64
-from collections.abc import Iterable
+import importlib.util
+from collections.abc import AsyncIterator, Iterable
 from typing import Callable, Any, Coroutine, Optional
 from json_repair import repair_json
 
+import httpx
 from openai import (
     AsyncOpenAI,
+    DefaultAsyncHttpxClient,
     APIConnectionError,
     APIStatusError,
     NOT_GIVEN,
@@ -24,7 +27,7 @@ from openai.types.chat.chat_completion_chunk import ChoiceDelta
 
 from src.config.api_ada_configs import ModelInfo, APIProvider
 from src.common.logger import get_logger
-from .base_client import APIResponse, UsageRecord, BaseClient, client_registry
+from .base_client import APIResponse, StreamChunk, UsageRecord, BaseClient, client_registry
 from ..exceptions import (
     RespParseException,
     NetworkConnectionError,
@@ -37,6 +40,26 @@ from ..payload_content.tool_option import ToolOption, ToolParam, ToolCall
 
 logger = get_logger("OpenAI客户端")
 
+# 连接池配置：同一事件循环中的同一APIProvider长期复用一个连接池
+POOL_MAX_CONNECTIONS = 100
+POOL_MAX_KEEPALIVE_CONNECTIONS = 20
+POOL_KEEPALIVE_EXPIRY = 60.0
+"""空闲连接保持时间（秒）"""
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+"""安装了 h2 时启用HTTP/2，多个请求可复用同一连接"""
+
+
+def _cached_tokens(usage: Any) -> int:
+    """
+    提取命中提示词前缀缓存的输入token数
+    OpenAI及多数兼容服务商使用 prompt_tokens_details.cached_tokens，DeepSeek使用 prompt_cache_hit_tokens
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details else None
+    if cached is None:
+        cached = (getattr(usage, "model_extra", None) or {}).get("prompt_cache_hit_tokens")
+    return int(cached or 0)
+
 
 def _convert_messages(messages: list[Message]) -> list[ChatCompletionMessageParam]:
     """
@@ -241,7 +264,7 @@ def _build_stream_api_resp(
 async def _default_stream_response_handler(
     resp_stream: AsyncStream[ChatCompletionChunk],
     interrupt_flag: asyncio.Event | None,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, ...]]]:
     """
     流式响应处理函数 - 处理OpenAI API的流式响应
     :param resp_stream: 流式响应对象
@@ -277,6 +300,7 @@ async def _default_stream_response_handler(
                     event.usage.prompt_tokens or 0,
                     event.usage.completion_tokens or 0,
                     event.usage.total_tokens or 0,
+                    _cached_tokens(event.usage),
                 )
             continue  # 跳过本帧，避免访问 choices[0]
         delta = event.choices[0].delta  # 获取当前块的delta内容
@@ -300,6 +324,7 @@ async def _default_stream_response_handler(
                 event.usage.prompt_tokens or 0,
                 event.usage.completion_tokens or 0,
                 event.usage.total_tokens or 0,
+                _cached_tokens(event.usage),
             )
 
     try:
@@ -323,7 +348,7 @@ pattern = re.compile(
 
 def _default_normal_response_parser(
     resp: ChatCompletion,
-) -> tuple[APIResponse, Optional[tuple[int, int, int]]]:
+) -> tuple[APIResponse, Optional[tuple[int, ...]]]:
     """
     解析对话补全响应 - 将OpenAI API响应解析为APIResponse对象
     :param resp: 响应对象
@@ -370,6 +395,7 @@ def _default_normal_response_parser(
             resp.usage.prompt_tokens or 0,
             resp.usage.completion_tokens or 0,
             resp.usage.total_tokens or 0,
+            _cached_tokens(resp.usage),
         )
     else:
         _usage_record = None
@@ -384,13 +410,38 @@ def _default_normal_response_parser(
 class OpenaiClient(BaseClient):
     def __init__(self, api_provider: APIProvider):
         super().__init__(api_provider)
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            http2=HTTP2_AVAILABLE,
+            event_hooks={"request": [self._on_request]},
+        )
         self.client: AsyncOpenAI = AsyncOpenAI(
             base_url=api_provider.base_url,
             api_key=api_provider.api_key,
             max_retries=0,
             timeout=api_provider.timeout,
+            http_client=self.http_client,
         )
 
+    async def _on_request(self, request: httpx.Request) -> None:
+        """记录请求数，并通过trace扩展统计新建连接与TLS握手"""
+        self.connection_stats.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connection_stats.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            self.connection_stats.tls_handshakes += 1
+
+    async def aclose(self) -> None:
+        """关闭连接池"""
+        await self.client.close()
+
     async def get_response(
         self,
         model_info: ModelInfo,
@@ -402,11 +453,11 @@ class OpenaiClient(BaseClient):
         stream_response_handler: Optional[
             Callable[
                 [AsyncStream[ChatCompletionChunk], asyncio.Event | None],
-                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, int, int]]]],
+                Coroutine[Any, Any, tuple[APIResponse, Optional[tuple[int, ...]]]],
             ]
         ] = None,
         async_response_parser: Optional[
-            Callable[[ChatCompletion], tuple[APIResponse, Optional[tuple[int, int, int]]]]
+            Callable[[ChatCompletion], tuple[APIResponse, Optional[tuple[int, ...]]]]
         ] = None,
         interrupt_flag: asyncio.Event | None = None,
         extra_params: dict[str, Any] | None = None,
@@ -498,10 +549,92 @@ class OpenaiClient(BaseClient):
                 prompt_tokens=usage_record[0],
                 completion_tokens=usage_record[1],
                 total_tokens=usage_record[2],
+                cached_tokens=usage_record[3] if len(usage_record) > 3 else 0,
             )
 
         return resp
 
+    async def get_response_stream(
+        self,
+        model_info: ModelInfo,
+        message_list: list[Message],
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        extra_params: dict[str, Any] | None = None,
+    ) -> AsyncIterator[StreamChunk]:
+        """
+        以异步迭代器的形式获取对话响应，每收到一个SSE增量就产出一次
+        迭代器被关闭或所在任务被取消时关闭HTTP流
+        Args:
+            model_info: 模型信息
+            message_list: 对话体
+            max_tokens: 最大token数（可选，默认为1024）
+            temperature: 温度（可选，默认为0.7）
+            extra_params: 附加的请求参数
+        Returns:
+            响应增量块的异步迭代器
+        """
+        try:
+            resp_stream: AsyncStream[ChatCompletionChunk] = await self.client.chat.completions.create(
+                model=model_info.model_identifier,
+                messages=_convert_messages(message_list),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                # OpenAI兼容接口默认不在流式响应中返回使用情况，需要显式请求
+                stream_options={"include_usage": True},
+                response_format=NOT_GIVEN,
+                extra_body=extra_params,
+            )
+        except APIConnectionError as e:
+            raise NetworkConnectionError() from e
+        except APIStatusError as e:
+            raise RespNotOkException(e.status_code, e.message) from e
+
+        in_rc_flag = False  # 标记是否在<think>推理内容块中
+        has_content = False  # 标记是否已经收到正式内容
+        try:
+            async for event in resp_stream:
+                chunk = StreamChunk()
+                if hasattr(event, "usage") and event.usage:
+                    chunk.usage = UsageRecord(
+                        model_name=model_info.name,
+                        provider_name=model_info.api_provider,
+                        prompt_tokens=event.usage.prompt_tokens or 0,
+                        completion_tokens=event.usage.completion_tokens or 0,
+                        total_tokens=event.usage.total_tokens or 0,
+                        cached_tokens=_cached_tokens(event.usage),
+                    )
+
+                # 空 choices / usage-only 帧的防御
+                if hasattr(event, "choices") and event.choices:
+                    delta = event.choices[0].delta
+                    if hasattr(delta, "reasoning_content") and delta.reasoning_content:  # type: ignore
+                        # 有独立的推理内容块
+                        chunk.reasoning_content = delta.reasoning_content  # type: ignore
+                    elif delta.content:
+                        if in_rc_flag:
+                            if delta.content == "</think>":
+                                in_rc_flag = False
+                            else:
+                                chunk.reasoning_content = delta.content
+                        elif delta.content == "<think>" and not has_content:
+                            # <think>为输出的首个token时，视为推理内容的开始标记
+                            in_rc_flag = True
+                        else:
+                            chunk.content = delta.content
+                            has_content = True
+
+                if chunk.content or chunk.reasoning_content or chunk.usage:
+                    yield chunk
+        except APIConnectionError as e:
+            raise NetworkConnectionError() from e
+        except APIStatusError as e:
+            raise RespNotOkException(e.status_code, e.message) from e
+        finally:
+            # 正常结束、被中断或被取消时都关闭HTTP流，释放连接
+            await resp_stream.close()
+
     async def get_embedding(
         self,
         model_info: ModelInfo,
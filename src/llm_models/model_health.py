@@ -0,0 +1,132 @@
+import time
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional
+
+from src.common.logger import get_logger
+
+logger = get_logger("model_health")
+
+FAILURE_THRESHOLD = 3
+"""连续失败多少次后熔断"""
+RATE_LIMIT_THRESHOLD = 2
+"""连续被限流（429）多少次后熔断"""
+OPEN_BASE_SECONDS = 30.0
+"""首次熔断的时长，之后探测失败时翻倍"""
+OPEN_MAX_SECONDS = 300.0
+"""熔断时长上限"""
+PROBE_TIMEOUT_SECONDS = 120.0
+"""半开状态下探测请求的最长占用时间，超时未回报结果则允许新的探测"""
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    单个模型的熔断器
+
+    连续失败或连续被限流达到阈值后熔断，熔断期间不再向该模型发送请求；
+    熔断时长结束后进入半开状态，只放行一个探测请求，成功则恢复，失败则以更长的时长再次熔断。
+    """
+
+    model_name: str
+    state: CircuitState = CircuitState.CLOSED
+    consecutive_failures: int = 0
+    consecutive_rate_limits: int = 0
+    open_until: float = 0.0
+    open_seconds: float = OPEN_BASE_SECONDS
+    probe_started_at: Optional[float] = None
+    total_requests: int = 0
+    total_failures: int = 0
+    times_opened: int = 0
+
+    def is_available(self, now: Optional[float] = None) -> bool:
+        """是否可以向该模型发送请求（不占用半开探测名额）"""
+        now = time.time() if now is None else now
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            return now >= self.open_until
+        return self.probe_started_at is None or now - self.probe_started_at > PROBE_TIMEOUT_SECONDS
+
+    def acquire(self) -> bool:
+        """请求发出前调用，返回是否放行；熔断结束后的第一个请求作为半开探测"""
+        now = time.time()
+        if not self.is_available(now):
+            return False
+        if self.state != CircuitState.CLOSED:
+            if self.state == CircuitState.OPEN:
+                logger.info(f"模型 '{self.model_name}' 熔断结束，发送探测请求")
+            self.state = CircuitState.HALF_OPEN
+            self.probe_started_at = now
+        self.total_requests += 1
+        return True
+
+    def release(self) -> None:
+        """请求被取消、未能得出结果时调用，归还半开探测名额"""
+        self.probe_started_at = None
+
+    def record_success(self) -> None:
+        if self.state != CircuitState.CLOSED:
+            logger.info(f"模型 '{self.model_name}' 探测成功，恢复正常")
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.consecutive_rate_limits = 0
+        self.open_seconds = OPEN_BASE_SECONDS
+        self.probe_started_at = None
+
+    def record_failure(self, rate_limited: bool = False) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self.consecutive_rate_limits = self.consecutive_rate_limits + 1 if rate_limited else 0
+        if self.state == CircuitState.HALF_OPEN:
+            # 探测失败，延长熔断时长
+            self.open_seconds = min(self.open_seconds * 2, OPEN_MAX_SECONDS)
+            self._open()
+        elif self.consecutive_failures >= FAILURE_THRESHOLD or self.consecutive_rate_limits >= RATE_LIMIT_THRESHOLD:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = CircuitState.OPEN
+        self.open_until = time.time() + self.open_seconds
+        self.probe_started_at = None
+        self.times_opened += 1
+        logger.warning(
+            f"模型 '{self.model_name}' 连续失败 {self.consecutive_failures} 次"
+            f"（其中连续限流 {self.consecutive_rate_limits} 次），熔断 {self.open_seconds:.0f} 秒"
+        )
+
+
+class ModelHealthRegistry:
+    """所有模型的熔断器，按模型名称在各个LLMRequest之间共享"""
+
+    def __init__(self) -> None:
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, model_name: str) -> CircuitBreaker:
+        if model_name not in self.breakers:
+            self.breakers[model_name] = CircuitBreaker(model_name)
+        return self.breakers[model_name]
+
+    def get_stats(self) -> Dict[str, dict]:
+        """各模型的熔断状态与失败次数"""
+        return {
+            name: {
+                "state": breaker.state.value,
+                "total_requests": breaker.total_requests,
+                "total_failures": breaker.total_failures,
+                "times_opened": breaker.times_opened,
+            }
+            for name, breaker in self.breakers.items()
+        }
+
+
+model_health = ModelHealthRegistry()
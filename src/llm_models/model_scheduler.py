@@ -0,0 +1,167 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+from .model_client.base_client import UsageRecord
+from .model_health import model_health
+
+EWMA_ALPHA = 0.2
+"""耗时、错误率、吞吐量的指数滑动平均系数，越大越偏重最近的请求"""
+LATENCY_WINDOW = 100
+"""统计耗时分位数时保留的最近成功请求数"""
+MIN_LATENCY_SAMPLES = 10
+"""样本数少于该值时不提供耗时分位数"""
+IN_FLIGHT_PENALTY = 0.5
+"""每个在途请求使预计完成时间增加的比例"""
+MAX_ERROR_RATE = 0.9
+"""计算预计完成时间时错误率的上限，避免除零"""
+DEFAULT_LATENCY = 5.0
+"""候选模型都还没有耗时样本时使用的预计耗时（秒）"""
+
+
+@dataclass
+class ModelStats:
+    """单个模型在整个进程中的请求统计"""
+
+    model_name: str
+    provider_name: str = ""
+    in_flight: int = 0
+    requests: int = 0
+    failures: int = 0
+    ewma_latency: Optional[float] = None
+    """成功请求耗时的滑动平均（秒），还没有成功请求时为None"""
+    ewma_error_rate: float = 0.0
+    ewma_tokens_per_second: float = 0.0
+    """输出token吞吐量的滑动平均"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """最近成功请求耗时的分位数，样本不足时返回None"""
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * percentile)))]
+
+
+class ModelScheduler:
+    """
+    进程内共享的模型调度器
+
+    所有LLMRequest实例的请求都在这里登记在途数量、耗时、错误率和token吞吐量，
+    在任务的模型列表中按预计完成时间选择模型：
+    预计完成时间 = 滑动平均耗时 × (1 + 在途请求数 × IN_FLIGHT_PENALTY) / (1 - 错误率)，
+    处于熔断状态的模型不参与选择。
+    """
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, ModelStats] = {}
+
+    def get(self, model_name: str) -> ModelStats:
+        if model_name not in self.stats:
+            self.stats[model_name] = ModelStats(model_name)
+        return self.stats[model_name]
+
+    def expected_time(self, model_name: str, default_latency: float = DEFAULT_LATENCY) -> float:
+        """预计完成时间（秒），没有耗时样本的模型使用 default_latency"""
+        stats = self.get(model_name)
+        latency = stats.ewma_latency if stats.ewma_latency is not None else default_latency
+        load_factor = 1 + stats.in_flight * IN_FLIGHT_PENALTY
+        return latency * load_factor / (1 - min(stats.ewma_error_rate, MAX_ERROR_RATE))
+
+    def rank(self, model_names: List[str]) -> List[str]:
+        """
+        按预计完成时间对模型排序，只返回未熔断的模型；全部熔断时按熔断结束时间返回所有模型
+        没有耗时样本的模型按候选模型的平均耗时估计，使新模型也能被分配到请求
+        """
+        available = [name for name in model_names if model_health.get(name).is_available()]
+        if not available:
+            return sorted(model_names, key=lambda name: model_health.get(name).open_until)
+
+        known = [self.get(name).ewma_latency for name in available if self.get(name).ewma_latency is not None]
+        default_latency = sum(known) / len(known) if known else DEFAULT_LATENCY  # type: ignore
+        return sorted(
+            available,
+            key=lambda name: (self.expected_time(name, default_latency), self.get(name).requests),
+        )
+
+    def choose(self, model_names: List[str]) -> str:
+        """选择预计完成时间最短的模型"""
+        return self.rank(model_names)[0]
+
+    def request_started(self, model_name: str, provider_name: str) -> None:
+        stats = self.get(model_name)
+        stats.provider_name = provider_name
+        stats.in_flight += 1
+        stats.requests += 1
+
+    def request_finished(
+        self, model_name: str, latency: float, success: bool, usage: Optional[UsageRecord] = None
+    ) -> None:
+        stats = self.get(model_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+        stats.ewma_error_rate += EWMA_ALPHA * ((0.0 if success else 1.0) - stats.ewma_error_rate)
+        if not success:
+            stats.failures += 1
+            return
+
+        stats.latencies.append(latency)
+        if stats.ewma_latency is None:
+            stats.ewma_latency = latency
+        else:
+            stats.ewma_latency += EWMA_ALPHA * (latency - stats.ewma_latency)
+        if usage:
+            stats.prompt_tokens += usage.prompt_tokens or 0
+            stats.completion_tokens += usage.completion_tokens or 0
+            if latency > 0:
+                tokens_per_second = (usage.completion_tokens or 0) / latency
+                stats.ewma_tokens_per_second += EWMA_ALPHA * (tokens_per_second - stats.ewma_tokens_per_second)
+
+    def request_cancelled(self, model_name: str) -> None:
+        """请求被取消，只减少在途数量，不影响耗时和错误率"""
+        stats = self.get(model_name)
+        stats.in_flight = max(0, stats.in_flight - 1)
+
+    def latency_percentile(self, model_name: str, percentile: float) -> Optional[float]:
+        return self.get(model_name).latency_percentile(percentile)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """各模型的调度状态，用于监控"""
+        return {
+            name: {
+                "provider": stats.provider_name,
+                "circuit_state": model_health.get(name).state.value,
+                "in_flight": stats.in_flight,
+                "requests": stats.requests,
+                "failures": stats.failures,
+                "ewma_latency": stats.ewma_latency,
+                "latency_p95": stats.latency_percentile(0.95),
+                "ewma_error_rate": round(stats.ewma_error_rate, 4),
+                "ewma_tokens_per_second": round(stats.ewma_tokens_per_second, 2),
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+                "expected_time": self.expected_time(name),
+            }
+            for name, stats in self.stats.items()
+        }
+
+    def get_provider_stats(self) -> Dict[str, dict]:
+        """按APIProvider汇总在途请求、请求数、失败数和token用量"""
+        providers: Dict[str, dict] = {}
+        for stats in self.stats.values():
+            if not stats.provider_name:
+                continue  # 还没有发出过请求
+            provider = providers.setdefault(
+                stats.provider_name,
+                {"in_flight": 0, "requests": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0},
+            )
+            provider["in_flight"] += stats.in_flight
+            provider["requests"] += stats.requests
+            provider["failures"] += stats.failures
+            provider["prompt_tokens"] += stats.prompt_tokens
+            provider["completion_tokens"] += stats.completion_tokens
+        return providers
+
+
+model_scheduler = ModelScheduler()
@@ -0,0 +1,320 @@
+import asyncio
+import heapq
+import itertools
+import time
+import weakref
+
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Deque, Dict, List, Optional
+
+from src.common.logger import get_logger
+from src.config.api_ada_configs import APIProvider
+from .payload_content.message import Message
+
+logger = get_logger("rate_limiter")
+
+INTERACTIVE_REQUEST_TYPES = ("replyer", "planner", "action.judge", "tool_executor", "thinking")
+"""请求类型中包含这些关键字时视为交互请求（回复、决策），直接影响回复速度"""
+BACKGROUND_REQUEST_PREFIXES = (
+    "memory.modify",
+    "memory.summary",
+    "expression.learner",
+    "relation",
+    "individuality",
+    "lpmm",
+    "emoji",
+    "mood",
+)
+"""以这些前缀开头的请求类型视为后台请求（记忆整理、表达学习、关系构建、LPMM等）"""
+BACKGROUND_CONCURRENCY_RATIO = 0.75
+"""设置了最大并发数时，后台请求最多占用的并发比例，剩余名额留给交互请求"""
+RATE_LIMITED_PAUSE_SECONDS = 5.0
+"""收到429后暂停向该服务商发出新请求的时长"""
+CHARS_PER_TOKEN = 1.5
+"""估算token数时每个token对应的字符数（中英文混合的粗略估计）"""
+IMAGE_TOKENS = 1000
+"""估算token数时每张图片计入的token数"""
+WAIT_TIME_WINDOW = 200
+"""统计排队时间时保留的最近样本数"""
+
+
+class RequestPriority(IntEnum):
+    """请求优先级，数值越小越优先"""
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+def get_request_priority(request_type: str) -> RequestPriority:
+    """根据LLMRequest的请求类型确定优先级"""
+    if any(keyword in request_type for keyword in INTERACTIVE_REQUEST_TYPES):
+        return RequestPriority.INTERACTIVE
+    if request_type.startswith(BACKGROUND_REQUEST_PREFIXES):
+        return RequestPriority.BACKGROUND
+    return RequestPriority.NORMAL
+
+
+def estimate_tokens(message_list: Optional[List[Message]] = None, text: str = "", max_tokens: int = 0) -> int:
+    """粗略估算一次请求消耗的token数（输入 + 最大输出），请求完成后以实际用量修正"""
+    chars = len(text)
+    images = 0
+    for message in message_list or []:
+        if isinstance(message.content, str):
+            chars += len(message.content)
+            continue
+        for item in message.content:
+            if isinstance(item, str):
+                chars += len(item)
+            else:
+                images += 1
+    return int(chars / CHARS_PER_TOKEN) + images * IMAGE_TOKENS + max(max_tokens, 0)
+
+
+@dataclass
+class PriorityQueueStats:
+    """单个优先级的排队统计"""
+
+    waiting: int = 0
+    max_waiting: int = 0
+    granted: int = 0
+    queued: int = 0
+    """需要排队（没有立即获得名额）的请求数"""
+    cancelled: int = 0
+    """排队期间被取消的请求数"""
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=WAIT_TIME_WINDOW))
+
+    def to_dict(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "granted": self.granted,
+            "queued": self.queued,
+            "cancelled": self.cancelled,
+            "avg_wait_seconds": sum(self.wait_times) / len(self.wait_times) if self.wait_times else 0.0,
+            "max_wait_seconds": max(self.wait_times) if self.wait_times else 0.0,
+        }
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    counter: int
+    future: asyncio.Future = field(compare=False)
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class TokenBucket:
+    """按分钟配额匀速补充的令牌桶，容量为一分钟的配额"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """补充到 amount 还需要的秒数；超过容量的请求只需要桶满即可放行"""
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """归还（正数）或追加扣除（负数）令牌，允许透支，透支部分由之后的请求等待补回"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class ProviderRateLimiter:
+    """
+    单个APIProvider的请求限流器
+
+    限制在途请求数、每分钟请求数和每分钟token数（均可选，0表示不限制）。
+    没有名额时请求按 (优先级, 到达顺序) 排队，名额释放或令牌补充后优先放行交互请求；
+    后台请求最多占用 BACKGROUND_CONCURRENCY_RATIO 的并发名额，保证交互请求到来时不必等待后台请求完成。
+    """
+
+    def __init__(self, api_provider: APIProvider):
+        self.provider_name = api_provider.name
+        self.max_concurrency = max(api_provider.max_concurrency, 0)
+        self.background_concurrency = (
+            max(1, int(self.max_concurrency * BACKGROUND_CONCURRENCY_RATIO)) if self.max_concurrency else 0
+        )
+        self.request_bucket = (
+            TokenBucket(api_provider.requests_per_minute) if api_provider.requests_per_minute > 0 else None
+        )
+        self.token_bucket = TokenBucket(api_provider.tokens_per_minute) if api_provider.tokens_per_minute > 0 else None
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        """收到429的次数"""
+        self._waiters: List[_Waiter] = []
+        self._counter = itertools.count()
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+        self.stats: Dict[RequestPriority, PriorityQueueStats] = {
+            priority: PriorityQueueStats() for priority in RequestPriority
+        }
+
+    async def acquire(self, priority: RequestPriority, tokens: int = 0) -> "RateLimitPermit":
+        """获取一个请求名额，没有名额时排队等待；等待期间被取消不会占用名额"""
+        stats = self.stats[priority]
+        if not self._waiters and self._can_grant(priority, tokens, time.monotonic()) == 0:
+            self._grant(priority, tokens)
+            stats.wait_times.append(0.0)
+            return RateLimitPermit(self, tokens)
+
+        waiter = _Waiter(
+            priority,
+            next(self._counter),
+            asyncio.get_running_loop().create_future(),
+            tokens,
+            time.monotonic(),
+        )
+        heapq.heappush(self._waiters, waiter)
+        stats.queued += 1
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已经分配到名额但任务在恢复执行前被取消
+                RateLimitPermit(self, tokens).release()
+            else:
+                waiter.future.cancel()
+                stats.waiting -= 1
+                stats.cancelled += 1
+                self._dispatch()  # 队首被取消时后面的请求可能可以放行
+            raise
+        return RateLimitPermit(self, tokens)
+
+    def _can_grant(self, priority: RequestPriority, tokens: int, now: float) -> Optional[float]:
+        """返回还需要等待的秒数；0表示可以立即放行，None表示需要等待其他请求完成"""
+        if self.max_concurrency:
+            limit = self.background_concurrency if priority == RequestPriority.BACKGROUND else self.max_concurrency
+            if self.in_flight >= limit:
+                return None
+        wait = max(self.paused_until - now, 0.0)
+        if self.request_bucket:
+            self.request_bucket.refill(now)
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket and tokens:
+            self.token_bucket.refill(now)
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _grant(self, priority: RequestPriority, tokens: int) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self.request_bucket:
+            self.request_bucket.adjust(-1)
+        if self.token_bucket:
+            self.token_bucket.adjust(-tokens)
+        self.stats[priority].granted += 1
+
+    def _dispatch(self) -> None:
+        """按优先级放行排队的请求，队首因速率限制无法放行时定时重试"""
+        if self._wakeup_handle:
+            self._wakeup_handle.cancel()
+            self._wakeup_handle = None
+        now = time.monotonic()
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)  # 已取消的等待者
+                continue
+            wait = self._can_grant(RequestPriority(waiter.priority), waiter.tokens, now)
+            if wait is None:
+                return  # 等待在途请求完成后由release再次调度
+            if wait > 0:
+                self._wakeup_handle = waiter.future.get_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            priority = RequestPriority(waiter.priority)
+            self._grant(priority, waiter.tokens)
+            stats = self.stats[priority]
+            stats.waiting -= 1
+            stats.wait_times.append(now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int] = None, rate_limited: bool = False) -> None:
+        """请求结束后归还并发名额，并以实际token用量修正预估值"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if self.token_bucket and used_tokens is not None:
+            self.token_bucket.adjust(reserved_tokens - used_tokens)
+        if rate_limited:
+            self.rate_limited += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + RATE_LIMITED_PAUSE_SECONDS)
+            if self.request_bucket:
+                # 服务商的实际配额比配置的更紧，清空本分钟剩余的请求配额
+                self.request_bucket.level = min(self.request_bucket.level, 0.0)
+            logger.info(f"服务商 '{self.provider_name}' 返回429，暂停放行新请求 {RATE_LIMITED_PAUSE_SECONDS:.0f} 秒")
+        self._dispatch()
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rate_limited": self.rate_limited,
+            "request_tokens_left": self.request_bucket.level if self.request_bucket else None,
+            "tokens_left": self.token_bucket.level if self.token_bucket else None,
+            "queues": {priority.name.lower(): stats.to_dict() for priority, stats in self.stats.items()},
+        }
+
+
+class RateLimitPermit:
+    """一次请求占用的名额，请求结束时必须调用release（可重复调用）"""
+
+    def __init__(self, limiter: ProviderRateLimiter, reserved_tokens: int):
+        self.limiter = limiter
+        self.reserved_tokens = reserved_tokens
+        self.released = False
+
+    def release(self, used_tokens: Optional[int] = None, rate_limited: bool = False) -> None:
+        if self.released:
+            return
+        self.released = True
+        self.limiter.release(self.reserved_tokens, used_tokens, rate_limited)
+
+
+class RateLimiterRegistry:
+    """
+    按APIProvider共享的限流器
+
+    限流器中的排队依赖事件循环，与客户端缓存一样按事件循环分别维护；
+    聊天相关的请求都在主事件循环中，限制对它们整体生效
+    """
+
+    def __init__(self) -> None:
+        self._limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, ProviderRateLimiter]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get(self, api_provider: APIProvider) -> ProviderRateLimiter:
+        limiters = self._limiters.setdefault(asyncio.get_running_loop(), {})
+        if api_provider.name not in limiters:
+            limiters[api_provider.name] = ProviderRateLimiter(api_provider)
+        return limiters[api_provider.name]
+
+    async def acquire(self, api_provider: APIProvider, request_type: str, tokens: int = 0) -> RateLimitPermit:
+        return await self.get(api_provider).acquire(get_request_priority(request_type), tokens)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """各服务商的在途请求数与各优先级的排队统计（多个事件循环的限流器分别列出）"""
+        stats: Dict[str, dict] = {}
+        for index, limiters in enumerate(list(self._limiters.values())):
+            for name, limiter in limiters.items():
+                stats[name if index == 0 else f"{name}#{index}"] = limiter.get_stats()
+        return stats
+
+
+rate_limiter = RateLimiterRegistry()
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from src.common.database.database import ROOT_PATH
+from src.common.logger import get_logger
+from .payload_content.tool_option import ToolCall
+
+logger = get_logger("response_cache")
+
+CACHE_DIR = os.path.join(ROOT_PATH, "data", "llm_cache")
+CACHE_FILE_VERSION = 1
+SAVE_INTERVAL_SECONDS = 60.0
+"""缓存有变化时距离上次写盘至少间隔的时长（秒）"""
+
+
+@dataclass
+class CachedResponse:
+    content: str
+    reasoning_content: str
+    model_name: str
+    tool_calls: Optional[List[ToolCall]]
+    created_at: float
+    latency: float
+    """生成该响应实际花费的时间（秒），命中时计入节省的时间"""
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    evicted: int = 0
+    latency_saved: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ResponseCache:
+    """
+    单个请求类型的LLM响应缓存
+
+    以 (模型列表, 提示词, 温度, 最大token数, 工具) 的哈希为键，按TTL过期，按LRU淘汰超出容量的条目；
+    有变化时定期写入 data/llm_cache 下的文件，启动后首次使用时读回未过期的条目。
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self.path = os.path.join(CACHE_DIR, f"{re.sub(r'[^0-9A-Za-z_.-]', '_', namespace)}.pkl")
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.stats = ResponseCacheStats()
+        self._dirty = False
+        self._last_save = time.time()
+        self._load()
+
+    @staticmethod
+    def make_key(
+        model_list: List[str],
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> str:
+        raw = json.dumps(
+            [model_list, prompt, temperature, max_tokens, tools or []], ensure_ascii=False, sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if time.time() - entry.created_at > self.ttl:
+            del self.entries[key]
+            self._dirty = True
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats.hits += 1
+        self.stats.latency_saved += entry.latency
+        return entry
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        self.entries[key] = response
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats.evicted += 1
+        self._dirty = True
+        if time.time() - self._last_save >= SAVE_INTERVAL_SECONDS:
+            self.save()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"读取响应缓存 {self.namespace} 失败，忽略: {e}")
+            return
+        if payload.get("version") != CACHE_FILE_VERSION:
+            return
+        now = time.time()
+        for key, entry in payload["entries"]:
+            if now - entry.created_at <= self.ttl:
+                self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        logger.debug(f"响应缓存 {self.namespace} 载入 {len(self.entries)} 条")
+
+    def save(self) -> None:
+        """把未过期的条目原子地写入磁盘"""
+        if not self._dirty:
+            return
+        now = time.time()
+        payload = {
+            "version": CACHE_FILE_VERSION,
+            "entries": [(key, entry) for key, entry in self.entries.items() if now - entry.created_at <= self.ttl],
+        }
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"保存响应缓存 {self.namespace} 失败: {e}")
+            return
+        self._dirty = False
+        self._last_save = now
+
+    def get_stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "hit_rate": round(self.stats.hit_rate, 4),
+            "expired": self.stats.expired,
+            "evicted": self.stats.evicted,
+            "latency_saved_seconds": round(self.stats.latency_saved, 3),
+        }
+
+
+class ResponseCacheRegistry:
+    """按请求类型共享的响应缓存，TTL和容量取自任务配置"""
+
+    def __init__(self) -> None:
+        self.caches: Dict[str, ResponseCache] = {}
+
+    def get(self, namespace: str, ttl: float, max_entries: int) -> ResponseCache:
+        cache = self.caches.get(namespace)
+        if cache is None:
+            cache = self.caches[namespace] = ResponseCache(namespace, ttl, max_entries)
+        return cache
+
+    def save_all(self) -> None:
+        for cache in self.caches.values():
+            cache.save()
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {namespace: cache.get_stats() for namespace, cache in self.caches.items()}
+
+
+response_cache = ResponseCacheRegistry()
@@ -1,5 +1,12 @@
+import asyncio
+import atexit
 import base64
 import io
+import threading
+
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Tuple
 
 from PIL import Image
 from datetime import datetime
@@ -141,9 +148,44 @@ def compress_messages(messages: list[Message], img_target_size: int = 1 * 1024 *
     return compressed_messages
 
 
+FLUSH_INTERVAL_SECONDS = 2.0
+"""后台写入任务两次写库之间的最长间隔（秒）"""
+FLUSH_BATCH_SIZE = 200
+"""待写入记录达到该数量时立即写库"""
+INSERT_CHUNK_SIZE = 50
+"""单条 INSERT 语句包含的记录数，避免超出SQLite的参数数量限制"""
+MAX_PENDING_RECORDS = 20000
+"""数据库持续写入失败时最多保留的待写入记录数，超出时丢弃最早的记录"""
+
+
+@dataclass
+class UsageAggregate:
+    """某一维度（模型/模块/用户/请求类型）下自进程启动以来的累计用量"""
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+    time_cost: float = 0.0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.requests += 1
+        self.prompt_tokens += row["prompt_tokens"]
+        self.completion_tokens += row["completion_tokens"]
+        self.cached_tokens += row["cached_tokens"]
+        self.cost += row["cost"]
+        self.time_cost += row["time_cost"]
+
+
 class LLMUsageRecorder:
     """
     LLM使用情况记录器
+
+    记录先放入内存队列，由事件循环中的后台任务定期（或积累到 FLUSH_BATCH_SIZE 条时）在线程中批量写库，
+    请求路径上不再执行同步的数据库写入；同时维护按模型、模块、用户、请求类型划分的累计用量，
+    统计和监控可以直接读取而无需查询 LLMUsage 表。
+    没有运行中的事件循环时（如同步脚本中）直接写库。
     """
 
     def __init__(self):
@@ -154,36 +196,156 @@ class LLMUsageRecorder:
         except Exception as e:
             logger.error(f"创建 LLMUsage 表失败: {str(e)}")
 
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._lock = threading.Lock()
+        """保护待写入队列和累计用量，统计任务会在线程池中读取"""
+        self._flush_lock = threading.Lock()
+        """保证同一时间只有一个线程在写库，使记录按顺序落盘"""
+        self._writers: Dict[asyncio.AbstractEventLoop, Tuple[asyncio.Task, asyncio.Event]] = {}
+        """每个事件循环一个后台写入任务及其唤醒事件（主循环和嵌入请求的共享循环会同时记录用量），由 _lock 保护"""
+
+        self.started_at = datetime.now()
+        self.aggregates: Dict[str, Dict[str, UsageAggregate]] = {
+            "model": defaultdict(UsageAggregate),
+            "module": defaultdict(UsageAggregate),
+            "user": defaultdict(UsageAggregate),
+            "type": defaultdict(UsageAggregate),
+        }
+        self.flushed_records = 0
+        self.dropped_records = 0
+        self.failed_flushes = 0
+
+        # 进程退出前写入剩余记录（例如导入脚本的事件循环已经结束）
+        atexit.register(self.flush)
+
     def record_usage_to_database(
         self, model_info: ModelInfo, model_usage: UsageRecord, user_id: str, request_type: str, endpoint: str, time_cost: float = 0.0
     ):
         input_cost = (model_usage.prompt_tokens / 1000000) * model_info.price_in
         output_cost = (model_usage.completion_tokens / 1000000) * model_info.price_out
         total_cost = round(input_cost + output_cost, 6)
+        row = {
+            "model_name": model_info.model_identifier,
+            "model_assign_name": model_info.name,
+            "model_api_provider": model_info.api_provider,
+            "user_id": user_id,
+            "request_type": request_type,
+            "endpoint": endpoint,
+            "prompt_tokens": model_usage.prompt_tokens or 0,
+            "completion_tokens": model_usage.completion_tokens or 0,
+            "total_tokens": model_usage.total_tokens or 0,
+            "cached_tokens": model_usage.cached_tokens or 0,
+            "cost": total_cost or 0.0,
+            "time_cost": round(time_cost or 0.0, 3),
+            "status": "success",
+            "timestamp": datetime.now(),
+        }
+        logger.debug(
+            f"Token使用情况 - 模型: {model_usage.model_name}, "
+            f"用户: {user_id}, 类型: {request_type}, "
+            f"提示词: {model_usage.prompt_tokens}, 完成: {model_usage.completion_tokens}, "
+            f"总计: {model_usage.total_tokens}, 缓存命中: {model_usage.cached_tokens}"
+        )
+
+        # 与统计模块一致：模块名取请求类型第一个"."之前的部分
+        module_name = request_type.split(".")[0] if request_type else "unknown"
+        with self._lock:
+            self.aggregates["model"][row["model_name"] or "unknown"].add(row)
+            self.aggregates["module"][module_name or "unknown"].add(row)
+            self.aggregates["user"][user_id or "unknown"].add(row)
+            self.aggregates["type"][request_type or "unknown"].add(row)
+            self._pending.append(row)
+            pending_count = len(self._pending)
+
         try:
-            # 使用 Peewee 模型创建记录
-            LLMUsage.create(
-                model_name=model_info.model_identifier,
-                model_assign_name=model_info.name,
-                model_api_provider=model_info.api_provider,
-                user_id=user_id,
-                request_type=request_type,
-                endpoint=endpoint,
-                prompt_tokens=model_usage.prompt_tokens or 0,
-                completion_tokens=model_usage.completion_tokens or 0,
-                total_tokens=model_usage.total_tokens or 0,
-                cost=total_cost or 0.0,
-                time_cost = round(time_cost or 0.0, 3),
-                status="success",
-                timestamp=datetime.now(),  # Peewee 会处理 DateTimeField
-            )
-            logger.debug(
-                f"Token使用情况 - 模型: {model_usage.model_name}, "
-                f"用户: {user_id}, 类型: {request_type}, "
-                f"提示词: {model_usage.prompt_tokens}, 完成: {model_usage.completion_tokens}, "
-                f"总计: {model_usage.total_tokens}"
-            )
-        except Exception as e:
-            logger.error(f"记录token使用情况失败: {str(e)}")
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        wakeup = self._ensure_writer(loop)
+        if pending_count >= FLUSH_BATCH_SIZE:
+            wakeup.set()
+
+    def _ensure_writer(self, loop: asyncio.AbstractEventLoop) -> asyncio.Event:
+        """确保当前事件循环中有后台写入任务（任务结束后重新启动），返回其唤醒事件"""
+        with self._lock:
+            writer = self._writers.get(loop)
+            if writer is not None and not writer[0].done():
+                return writer[1]
+            # 清理已关闭的事件循环留下的记录
+            for stale_loop in [other for other in self._writers if other.is_closed()]:
+                del self._writers[stale_loop]
+            wakeup = asyncio.Event()
+            self._writers[loop] = (loop.create_task(self._writer(wakeup)), wakeup)
+            return wakeup
+
+    async def _writer(self, wakeup: asyncio.Event) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            if self._pending:
+                await asyncio.to_thread(self.flush)
+
+    def flush(self) -> int:
+        """
+        把待写入的记录在一个事务中批量写入数据库，可在任意线程中调用
+        :return: 写入的记录数
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = list(self._pending)
+                self._pending.clear()
+            try:
+                with db.atomic():
+                    for i in range(0, len(batch), INSERT_CHUNK_SIZE):
+                        LLMUsage.insert_many(batch[i : i + INSERT_CHUNK_SIZE]).execute()
+            except Exception as e:
+                logger.error(f"记录token使用情况失败: {str(e)}")
+                with self._lock:
+                    self.failed_flushes += 1
+                    # 放回队首，下次重试
+                    self._pending.extendleft(reversed(batch))
+                    while len(self._pending) > MAX_PENDING_RECORDS:
+                        self._pending.popleft()
+                        self.dropped_records += 1
+                return 0
+            with self._lock:
+                self.flushed_records += len(batch)
+            return len(batch)
+
+    def get_aggregates(self) -> Dict[str, Dict[str, dict]]:
+        """自进程启动以来按维度（model/module/user/type）划分的累计用量快照"""
+        with self._lock:
+            return {
+                dimension: {
+                    name: {
+                        "requests": agg.requests,
+                        "prompt_tokens": agg.prompt_tokens,
+                        "completion_tokens": agg.completion_tokens,
+                        "cached_tokens": agg.cached_tokens,
+                        "cost": round(agg.cost, 6),
+                        "avg_time_cost": round(agg.time_cost / agg.requests, 3) if agg.requests else 0.0,
+                    }
+                    for name, agg in entries.items()
+                }
+                for dimension, entries in self.aggregates.items()
+            }
+
+    def get_stats(self) -> dict:
+        """后台写入的状态，用于监控"""
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "pending": len(self._pending),
+                "flushed": self.flushed_records,
+                "dropped": self.dropped_records,
+                "failed_flushes": self.failed_flushes,
+            }
+
 
-llm_usage_recorder = LLMUsageRecorder()
\ No newline at end of file
+llm_usage_recorder = LLMUsageRecorder()
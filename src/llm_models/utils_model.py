@@ -2,18 +2,23 @@ import re
 import asyncio
 import time
 
+from contextlib import aclosing
 from enum import Enum
 from rich.traceback import install
-from typing import Tuple, List, Dict, Optional, Callable, Any
+from typing import AsyncIterator, Tuple, List, Dict, Optional, Callable, Any
 
 from src.common.logger import get_logger
 from src.config.config import model_config
 from src.config.api_ada_configs import APIProvider, ModelInfo, TaskConfig
-from .payload_content.message import MessageBuilder, Message
+from .payload_content.message import MessageBuilder, Message, RoleType
 from .payload_content.resp_format import RespFormat
 from .payload_content.tool_option import ToolOption, ToolCall, ToolOptionBuilder, ToolParamType
-from .model_client.base_client import BaseClient, APIResponse, client_registry
+from .model_client.base_client import BaseClient, APIResponse, StreamChunk, UsageRecord, client_registry
 from .utils import compress_messages, llm_usage_recorder
+from .model_health import model_health
+from .model_scheduler import model_scheduler
+from .rate_limiter import estimate_tokens, rate_limiter
+from .response_cache import CachedResponse, response_cache
 from .exceptions import NetworkConnectionError, ReqAbortException, RespNotOkException, RespParseException
 
 install(extra_lines=3)
@@ -48,10 +53,6 @@ class LLMRequest:
         self.task_name = request_type
         self.model_for_task = model_set
         self.request_type = request_type
-        self.model_usage: Dict[str, Tuple[int, int, int]] = {
-            model: (0, 0, 0) for model in self.model_for_task.model_list
-        }
-        """模型使用量记录，用于进行负载均衡，对应为(total_tokens, penalty, usage_penalty)，惩罚值是为了能在某个模型请求不给力或正在被使用的时候进行调整"""
 
     async def generate_response_for_image(
         self,
@@ -83,7 +84,7 @@ class LLMRequest:
         messages = [message_builder.build()]
 
         # 请求并处理返回值
-        response = await self._execute_request(
+        response, model_info = await self._execute_request(
             api_provider=api_provider,
             client=client,
             request_type=RequestType.RESPONSE,
@@ -122,7 +123,7 @@ class LLMRequest:
         model_info, api_provider, client = self._select_model()
 
         # 请求并处理返回值
-        response = await self._execute_request(
+        response, _ = await self._execute_request(
             api_provider=api_provider,
             client=client,
             request_type=RequestType.AUDIO,
@@ -138,6 +139,7 @@ class LLMRequest:
         max_tokens: Optional[int] = None,
         tools: Optional[List[Dict[str, Any]]] = None,
         raise_when_empty: bool = True,
+        system_prompt: Optional[str] = None,
     ) -> Tuple[str, Tuple[str, str, Optional[List[ToolCall]]]]:
         """
         异步生成响应
@@ -145,15 +147,37 @@ class LLMRequest:
             prompt (str): 提示词
             temperature (float, optional): 温度参数
             max_tokens (int, optional): 最大token数
+            system_prompt (str, optional): 不随对话变化的提示词前缀，作为system消息放在最前面，便于服务商缓存前缀
         Returns:
             (Tuple[str, str, str, Optional[List[ToolCall]]]): 响应内容、推理内容、模型名称、工具调用列表
         """
         # 请求体构建
         start_time = time.time()
-        
+
+        cache = None
+        if self.model_for_task.response_cache_ttl > 0:
+            cache = response_cache.get(
+                self.request_type or "default",
+                self.model_for_task.response_cache_ttl,
+                self.model_for_task.response_cache_size,
+            )
+            cache_key = cache.make_key(
+                self.model_for_task.model_list,
+                f"{system_prompt}\n{prompt}" if system_prompt else prompt,
+                self.model_for_task.temperature if temperature is None else temperature,
+                self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+                tools,
+            )
+            if cached := cache.get(cache_key):
+                logger.debug(f"命中响应缓存: {self.request_type}")
+                return cached.content, (cached.reasoning_content, cached.model_name, cached.tool_calls)
+
+        messages = []
+        if system_prompt:
+            messages.append(MessageBuilder().set_role(RoleType.System).add_text_content(system_prompt).build())
         message_builder = MessageBuilder()
         message_builder.add_text_content(prompt)
-        messages = [message_builder.build()]
+        messages.append(message_builder.build())
         
         tool_built = self._build_tool_options(tools)
         
@@ -163,7 +187,7 @@ class LLMRequest:
         # 请求并处理返回值
         logger.debug(f"LLM选择耗时: {model_info.name} {time.time() - start_time}")
         
-        response = await self._execute_request(
+        response, model_info = await self._execute_request(
             api_provider=api_provider,
             client=client,
             request_type=RequestType.RESPONSE,
@@ -198,9 +222,93 @@ class LLMRequest:
                 logger.warning("生成的响应为空")
                 raise RuntimeError("生成的响应为空")
             content = "生成的响应为空，请检查模型配置或输入内容是否正确"
+        elif cache:
+            cache.put(
+                cache_key,
+                CachedResponse(
+                    content=content,
+                    reasoning_content=reasoning_content,
+                    model_name=model_info.name,
+                    tool_calls=tool_calls,
+                    created_at=time.time(),
+                    latency=time.time() - start_time,
+                ),
+            )
 
         return content, (reasoning_content, model_info.name, tool_calls)
 
+    async def generate_response_stream(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        流式生成响应，正式内容的增量到达时立即产出
+        迭代器被关闭或所在任务被取消时，底层HTTP流随之关闭
+        Args:
+            prompt (str): 提示词
+            temperature (float, optional): 温度参数
+            max_tokens (int, optional): 最大token数
+        Returns:
+            (AsyncIterator[str]): 正式内容增量的异步迭代器
+        """
+        async with aclosing(self.generate_response_stream_chunks(prompt, temperature, max_tokens)) as stream:
+            async for chunk in stream:
+                if chunk.content:
+                    yield chunk.content
+
+    async def generate_response_stream_chunks(
+        self,
+        prompt: str,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        """
+        流式生成响应，产出包含正式内容、推理内容增量和模型名称的增量块
+        流正常结束后记录使用情况
+        Args:
+            prompt (str): 提示词
+            temperature (float, optional): 温度参数
+            max_tokens (int, optional): 最大token数
+        Returns:
+            (AsyncIterator[StreamChunk]): 增量块的异步迭代器
+        """
+        start_time = time.time()
+
+        message_builder = MessageBuilder()
+        message_builder.add_text_content(prompt)
+        messages = [message_builder.build()]
+
+        model_info, api_provider, client = self._select_model()
+
+        usage = None
+        async with aclosing(
+            self._execute_stream_request(
+                api_provider=api_provider,
+                client=client,
+                model_info=model_info,
+                message_list=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+        ) as stream:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                chunk.model_name = model_info.name
+                yield chunk
+
+        if usage:
+            llm_usage_recorder.record_usage_to_database(
+                model_info=model_info,
+                model_usage=usage,
+                user_id="system",
+                request_type=self.request_type,
+                endpoint="/chat/completions",
+                time_cost=time.time() - start_time,
+            )
+
     async def get_embedding(self, embedding_input: str) -> Tuple[List[float], str]:
         """获取嵌入向量
         Args:
@@ -213,7 +321,7 @@ class LLMRequest:
         model_info, api_provider, client = self._select_model()
 
         # 请求并处理返回值
-        response = await self._execute_request(
+        response, model_info = await self._execute_request(
             api_provider=api_provider,
             client=client,
             request_type=RequestType.EMBEDDING,
@@ -240,30 +348,121 @@ class LLMRequest:
 
     def _select_model(self) -> Tuple[ModelInfo, APIProvider, BaseClient]:
         """
-        根据总tokens和惩罚值选择的模型
+        由全局模型调度器在任务的模型列表中选择预计完成时间最短的模型
         """
-        least_used_model_name = min(
-            self.model_usage,
-            key=lambda k: self.model_usage[k][0] + self.model_usage[k][1] * 300 + self.model_usage[k][2] * 1000,
-        )
-        model_info = model_config.get_model_info(least_used_model_name)
+        model_info = model_config.get_model_info(model_scheduler.choose(self.model_for_task.model_list))
         api_provider = model_config.get_provider(model_info.api_provider)
         
-        # 对于嵌入任务，强制创建新的客户端实例以避免事件循环问题
-        force_new_client = (self.request_type == "embedding")
-        client = client_registry.get_client_class_instance(api_provider, force_new=force_new_client)
+        client = client_registry.get_client_class_instance(api_provider)
         
         logger.debug(f"选择请求模型: {model_info.name}")
-        total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-        self.model_usage[model_info.name] = (total_tokens, penalty, usage_penalty + 1)  # 增加使用惩罚值防止连续使用
         return model_info, api_provider, client
 
+    def _failover_candidates(
+        self, api_provider: APIProvider, client: BaseClient, model_info: ModelInfo, request_type: RequestType
+    ) -> List[Tuple[ModelInfo, APIProvider, BaseClient]]:
+        """
+        按尝试顺序列出请求可以使用的模型：先是选中的模型，然后是任务模型列表中其余未熔断的模型（按预计完成时间排序）
+        """
+        candidates = [(model_info, api_provider, client)]
+        if request_type == RequestType.EMBEDDING:
+            # 不同嵌入模型的向量空间不兼容，不做跨模型切换
+            return candidates
+        other_models = [
+            name
+            for name in model_scheduler.rank(self.model_for_task.model_list)
+            if name != model_info.name and model_health.get(name).is_available()
+        ]
+        for name in other_models:
+            other_model_info = model_config.get_model_info(name)
+            other_provider = model_config.get_provider(other_model_info.api_provider)
+            candidates.append(
+                (other_model_info, other_provider, client_registry.get_client_class_instance(other_provider))
+            )
+        return candidates
+
     async def _execute_request(
         self,
         api_provider: APIProvider,
         client: BaseClient,
         request_type: RequestType,
         model_info: ModelInfo,
+        **request_kwargs,
+    ) -> Tuple[APIResponse, ModelInfo]:
+        """
+        实际执行请求的方法
+
+        选中的模型失败时依次切换到任务模型列表中其余未熔断的模型，只有最后一个模型会按间隔等待重试。
+        任务配置了 hedge_latency_percentile 时，若当前模型的耗时超过其历史耗时的该分位数仍未返回，
+        会向下一个模型发出对冲请求，采用先成功的结果并取消另一个请求。
+        Returns:
+            (Tuple[APIResponse, ModelInfo]): (响应, 实际完成请求的模型)
+        """
+        candidates = self._failover_candidates(api_provider, client, model_info, request_type)
+        hedge_percentile = self.model_for_task.hedge_latency_percentile
+        hedge_enabled = request_type == RequestType.RESPONSE and hedge_percentile > 0
+        hedged = False
+        pending: Dict[asyncio.Task, ModelInfo] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> ModelInfo:
+            next_model, next_provider, next_client = candidates.pop(0)
+            task = asyncio.create_task(
+                self._request_with_retry(
+                    api_provider=next_provider,
+                    client=next_client,
+                    request_type=request_type,
+                    model_info=next_model,
+                    allow_wait=not candidates,
+                    **request_kwargs,
+                )
+            )
+            pending[task] = next_model
+            return next_model
+
+        running_model = launch()
+        try:
+            while pending:
+                hedge_delay = None
+                if hedge_enabled and not hedged and candidates and len(pending) == 1:
+                    hedge_delay = model_scheduler.latency_percentile(running_model.name, hedge_percentile)
+
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    logger.info(
+                        f"模型 '{running_model.name}' 超过 {hedge_delay:.1f} 秒（{hedge_percentile:.0%} 分位耗时）仍未返回，"
+                        f"向模型 '{candidates[0][0].name}' 发出对冲请求"
+                    )
+                    launch()
+                    continue
+
+                result: Optional[Tuple[APIResponse, ModelInfo]] = None
+                for task in done:
+                    finished_model = pending.pop(task)
+                    if (error := task.exception()) is not None:
+                        last_error = error
+                    elif result is None:
+                        result = (task.result(), finished_model)
+                if result is not None:
+                    return result
+
+                if not pending and candidates:
+                    logger.warning(f"模型 '{finished_model.name}' 请求失败，切换到模型 '{candidates[0][0].name}'")
+                    running_model = launch()
+        finally:
+            # 对冲请求中未完成的一方（或调用方取消时所有请求）直接取消
+            for task in pending:
+                task.cancel()
+        raise RuntimeError("请求失败，已达到最大重试次数") from last_error
+
+    async def _request_with_retry(
+        self,
+        api_provider: APIProvider,
+        client: BaseClient,
+        request_type: RequestType,
+        model_info: ModelInfo,
+        allow_wait: bool = True,
         message_list: List[Message] | None = None,
         tool_options: list[ToolOption] | None = None,
         response_format: RespFormat | None = None,
@@ -275,17 +474,42 @@ class LLMRequest:
         audio_base64: str = "",
     ) -> APIResponse:
         """
-        实际执行请求的方法
+        向单个模型发送请求
 
-        包含了重试和异常处理逻辑
+        包含了重试和异常处理逻辑，并向该模型的熔断器报告结果；
+        allow_wait 为 False（还有其他模型可以切换）时，需要等待的错误不再重试，直接交给调用方切换模型
         """
+        breaker = model_health.get(model_info.name)
         retry_remain = api_provider.max_retry
         compressed_messages: Optional[List[Message]] = None
+        first_attempt = True
         while retry_remain > 0:
+            if not breaker.acquire() and first_attempt and not allow_wait:
+                raise RuntimeError(f"模型 '{model_info.name}' 处于熔断状态")
+            first_attempt = False
+            try:
+                permit = await rate_limiter.acquire(
+                    api_provider,
+                    self.request_type,
+                    estimate_tokens(
+                        compressed_messages or message_list,
+                        text=embedding_input,
+                        max_tokens=(self.model_for_task.max_tokens if max_tokens is None else max_tokens)
+                        if request_type == RequestType.RESPONSE
+                        else 0,
+                    ),
+                )
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            used_tokens: Optional[int] = None
+            rate_limited = False
+            model_scheduler.request_started(model_info.name, api_provider.name)
+            start_time = time.time()
             try:
                 if request_type == RequestType.RESPONSE:
                     assert message_list is not None, "message_list cannot be None for response requests"
-                    return await client.get_response(
+                    response = await client.get_response(
                         model_info=model_info,
                         message_list=(compressed_messages or message_list),
                         tool_options=tool_options,
@@ -298,23 +522,40 @@ class LLMRequest:
                     )
                 elif request_type == RequestType.EMBEDDING:
                     assert embedding_input, "embedding_input cannot be empty for embedding requests"
-                    return await client.get_embedding(
+                    response = await client.get_embedding(
                         model_info=model_info,
                         embedding_input=embedding_input,
                         extra_params=model_info.extra_params,
                     )
-                elif request_type == RequestType.AUDIO:
+                else:
                     assert audio_base64 is not None, "audio_base64 cannot be None for audio requests"
-                    return await client.get_audio_transcriptions(
+                    response = await client.get_audio_transcriptions(
                         model_info=model_info,
                         audio_base64=audio_base64,
                         extra_params=model_info.extra_params,
                     )
+                breaker.record_success()
+                model_scheduler.request_finished(model_info.name, time.time() - start_time, True, response.usage)
+                if response.usage:
+                    used_tokens = response.usage.total_tokens
+                return response
+            except asyncio.CancelledError:
+                # 被中断或作为对冲请求的落后方被取消，不计入失败
+                breaker.release()
+                model_scheduler.request_cancelled(model_info.name)
+                raise
             except Exception as e:
                 logger.debug(f"请求失败: {str(e)}")
                 # 处理异常
-                total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-                self.model_usage[model_info.name] = (total_tokens, penalty + 1, usage_penalty)
+                rate_limited = isinstance(e, RespNotOkException) and e.status_code == 429
+                if self._is_model_failure(e):
+                    breaker.record_failure(rate_limited=rate_limited)
+                    model_scheduler.request_finished(model_info.name, time.time() - start_time, False)
+                else:
+                    breaker.release()
+                    model_scheduler.request_cancelled(model_info.name)
+                # 等待重试前先归还名额
+                permit.release(rate_limited=rate_limited)
 
                 wait_interval, compressed_messages = self._default_exception_handler(
                     e,
@@ -325,16 +566,112 @@ class LLMRequest:
                     messages=(message_list, compressed_messages is not None) if message_list else None,
                 )
 
+                if wait_interval == -1:
+                    retry_remain = 0  # 不再重试
+                elif wait_interval > 0:
+                    if not allow_wait:
+                        raise  # 还有其他模型可用，直接切换而不是等待
+                    else:
+                        logger.info(f"等待 {wait_interval} 秒后重试...")
+                        await asyncio.sleep(wait_interval)
+            finally:
+                permit.release(used_tokens, rate_limited)
+                # 放在finally防止死循环
+                retry_remain -= 1
+        logger.error(f"模型 '{model_info.name}' 请求失败，达到最大重试次数 {api_provider.max_retry} 次")
+        raise RuntimeError("请求失败，已达到最大重试次数")
+
+    @staticmethod
+    def _is_model_failure(e: Exception) -> bool:
+        """判断异常是否反映模型/服务商本身的问题（计入熔断），请求被中断或请求参数问题不计入"""
+        if isinstance(e, ReqAbortException):
+            return False
+        if isinstance(e, RespNotOkException) and e.status_code in (400, 413):
+            return False
+        return True
+
+    async def _execute_stream_request(
+        self,
+        api_provider: APIProvider,
+        client: BaseClient,
+        model_info: ModelInfo,
+        message_list: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[StreamChunk]:
+        """
+        实际执行流式请求的方法
+
+        重试和异常处理逻辑与 _execute_request 相同，但只在尚未产出任何内容时重试；
+        已经产出部分内容后出错则直接抛出，由调用方决定如何处理已输出的内容
+        """
+        retry_remain = api_provider.max_retry
+        compressed_messages: Optional[List[Message]] = None
+        while retry_remain > 0:
+            emitted = False
+            recorded = False
+            usage: Optional[UsageRecord] = None
+            rate_limited = False
+            permit = await rate_limiter.acquire(
+                api_provider,
+                self.request_type,
+                estimate_tokens(
+                    compressed_messages or message_list,
+                    max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+                ),
+            )
+            model_scheduler.request_started(model_info.name, api_provider.name)
+            start_time = time.time()
+            try:
+                async with aclosing(
+                    client.get_response_stream(
+                        model_info=model_info,
+                        message_list=(compressed_messages or message_list),
+                        max_tokens=self.model_for_task.max_tokens if max_tokens is None else max_tokens,
+                        temperature=self.model_for_task.temperature if temperature is None else temperature,
+                        extra_params=model_info.extra_params,
+                    )
+                ) as stream:
+                    async for chunk in stream:
+                        usage = chunk.usage or usage
+                        emitted = emitted or bool(chunk.content or chunk.reasoning_content)
+                        yield chunk
+                model_scheduler.request_finished(model_info.name, time.time() - start_time, True, usage)
+                recorded = True
+                return
+            except Exception as e:
+                rate_limited = isinstance(e, RespNotOkException) and e.status_code == 429
+                if self._is_model_failure(e):
+                    model_scheduler.request_finished(model_info.name, time.time() - start_time, False)
+                else:
+                    model_scheduler.request_cancelled(model_info.name)
+                recorded = True
+                permit.release(rate_limited=rate_limited)
+                if emitted:
+                    raise
+                logger.debug(f"流式请求失败: {str(e)}")
+
+                wait_interval, compressed_messages = self._default_exception_handler(
+                    e,
+                    self.task_name,
+                    model_name=model_info.name,
+                    remain_try=retry_remain,
+                    retry_interval=api_provider.retry_interval,
+                    messages=(message_list, compressed_messages is not None),
+                )
+
                 if wait_interval == -1:
                     retry_remain = 0  # 不再重试
                 elif wait_interval > 0:
                     logger.info(f"等待 {wait_interval} 秒后重试...")
                     await asyncio.sleep(wait_interval)
             finally:
+                if not recorded:
+                    # 调用方关闭了迭代器或任务被取消
+                    model_scheduler.request_cancelled(model_info.name)
+                permit.release(usage.total_tokens if usage else None, rate_limited)
                 # 放在finally防止死循环
                 retry_remain -= 1
-        total_tokens, penalty, usage_penalty = self.model_usage[model_info.name]
-        self.model_usage[model_info.name] = (total_tokens, penalty, usage_penalty - 1)  # 使用结束，减少使用惩罚值
         logger.error(f"模型 '{model_info.name}' 请求失败，达到最大重试次数 {api_provider.max_retry} 次")
         raise RuntimeError("请求失败，已达到最大重试次数")
 
@@ -1,15 +1,20 @@
 import asyncio
 import time
+from typing import Optional
 from maim_message import MessageServer
 
 from src.common.remote import TelemetryHeartBeatTask
 from src.manager.async_task_manager import async_task_manager
+from src.manager.startup_graph import StartupGraph
+from src.manager.background_job_scheduler import BackgroundJobDispatchTask, router as background_job_router
+from src.chat.knowledge.knowledge_lib import knowledge_loader, router as knowledge_router
 from src.chat.utils.statistic import OnlineTimeRecordTask, StatisticOutputTask
 from src.chat.emoji_system.emoji_manager import get_emoji_manager
 from src.chat.message_receive.chat_stream import get_chat_manager
 from src.config.config import global_config
 from src.chat.message_receive.bot import chat_bot
 from src.common.logger import get_logger
+from src.common.import_profiler import import_profiler
 from src.individuality.individuality import get_individuality, Individuality
 from src.common.server import get_global_server, Server
 from src.mood.mood_manager import mood_manager
@@ -48,6 +53,9 @@ class MainSystem:
         self.app: MessageServer = get_global_api()
         self.server: Server = get_global_server()
 
+        self.startup_graph: Optional[StartupGraph] = None
+        """最近一次启动的依赖图，包含各子系统的启动耗时"""
+
     async def initialize(self):
         """初始化系统组件"""
         logger.info(f"正在唤醒{global_config.bot.nickname}......")
@@ -68,9 +76,52 @@ class MainSystem:
 """)
 
     async def _init_components(self):
-        """初始化其他组件"""
+        """按依赖关系并发初始化各子系统"""
         init_start_time = time.time()
 
+        graph = StartupGraph()
+        graph.add("background_tasks", self._init_background_tasks)
+        # 加载所有actions，包括默认的和插件的
+        graph.add("plugins", plugin_manager.load_all_plugins, blocking=True)
+        graph.add("emoji_manager", self._init_emoji_manager)
+        graph.add("mood_manager", self._init_mood_manager)
+        graph.add("chat_manager", self._init_chat_manager)
+        handler_dependencies = ["plugins", "emoji_manager", "chat_manager"]
+        migration_dependencies = []
+        # 根据配置条件性地初始化记忆系统
+        if global_config.memory.enable_memory and self.hippocampus_manager:
+            graph.add("memory", self._init_memory, blocking=True)
+            handler_dependencies.append("memory")
+            # 迁移会修改记忆节点，保持在记忆图加载之后执行
+            migration_dependencies.append("memory")
+        else:
+            logger.info("记忆系统已禁用，跳过初始化")
+        # 将bot.py中的chat_bot.message_process消息处理函数注册到api.py的消息处理基类中
+        graph.add(
+            "message_handler",
+            lambda: self.app.register_message_handler(chat_bot.message_process),
+            depends_on=handler_dependencies,
+        )
+        # 初始化个体特征
+        graph.add("individuality", self.individuality.initialize)
+        graph.add("migrations", check_and_run_migrations, depends_on=migration_dependencies)
+
+        self.startup_graph = graph
+        await graph.run()
+
+        try:
+            init_time = int(1000 * (time.time() - init_start_time))
+            logger.info(f"初始化完成，神经元放电{init_time}次")
+        except Exception as e:
+            logger.error(f"启动大脑和外部世界失败: {e}")
+            raise
+
+        if import_profiler.active:
+            import_profiler.uninstall()
+            if report := import_profiler.format_report():
+                logger.info(report)
+
+    async def _init_background_tasks(self):
         # 添加在线时间统计任务
         await async_task_manager.add_task(OnlineTimeRecordTask())
 
@@ -80,53 +131,37 @@ class MainSystem:
         # 添加遥测心跳任务
         await async_task_manager.add_task(TelemetryHeartBeatTask())
 
+        # 启动后台任务调度器（记忆构建、表达学习、关系构建等）
+        await async_task_manager.add_task(BackgroundJobDispatchTask())
+        self.server.register_router(background_job_router, prefix="/api")
+
+        # LPMM知识库在后台线程中加载，加载完成前知识查询返回空结果
+        knowledge_loader.start()
+        self.server.register_router(knowledge_router, prefix="/api")
+
         # 启动API服务器
         # start_api_server()
         # logger.info("API服务器启动成功")
 
-        # 加载所有actions，包括默认的和插件的
-        plugin_manager.load_all_plugins()
-
+    def _init_emoji_manager(self):
         # 初始化表情管理器
         get_emoji_manager().initialize()
         logger.info("表情包管理器初始化成功")
 
+    async def _init_mood_manager(self):
         # 启动情绪管理器
         await mood_manager.start()
         logger.info("情绪管理器初始化成功")
 
+    async def _init_chat_manager(self):
         # 初始化聊天管理器
-
         await get_chat_manager()._initialize()
         asyncio.create_task(get_chat_manager()._auto_save_task())
-
         logger.info("聊天管理器初始化成功")
 
-        # 根据配置条件性地初始化记忆系统
-        if global_config.memory.enable_memory:
-            if self.hippocampus_manager:
-                self.hippocampus_manager.initialize()
-                logger.info("记忆系统初始化成功")
-        else:
-            logger.info("记忆系统已禁用，跳过初始化")
-
-        # await asyncio.sleep(0.5) #防止logger输出飞了
-
-        # 将bot.py中的chat_bot.message_process消息处理函数注册到api.py的消息处理基类中
-        self.app.register_message_handler(chat_bot.message_process)
-
-        # 初始化个体特征
-        await self.individuality.initialize()
-        
-        await check_and_run_migrations()
-        
-
-        try:
-            init_time = int(1000 * (time.time() - init_start_time))
-            logger.info(f"初始化完成，神经元放电{init_time}次")
-        except Exception as e:
-            logger.error(f"启动大脑和外部世界失败: {e}")
-            raise
+    def _init_memory(self):
+        self.hippocampus_manager.initialize()  # type: ignore
+        logger.info("记忆系统初始化成功")
 
     async def schedule_tasks(self):
         """调度定时任务"""
@@ -1,9 +1,10 @@
 import asyncio
 import json
+import time
 from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
-from aiohttp import web, WSMsgType
+from typing import Deque, Dict, List, Optional, Tuple
+from aiohttp import web, WSCloseCode, WSMsgType
 import aiohttp_cors
 
 from src.chat.message_receive.message import MessageRecv
@@ -11,11 +12,21 @@ from src.common.logger import get_logger
 
 logger = get_logger("context_web")
 
+BROADCAST_TICK = 0.1
+"""广播合并周期（秒），同一周期内到达的消息合并为一帧发送"""
+CLIENT_QUEUE_SIZE = 32
+"""每个连接待发送帧的上限，积压超过上限的慢客户端会被断开"""
+SEND_TIMEOUT = 5.0
+"""单帧发送超时（秒），超时视为慢客户端"""
+LATENCY_WINDOW = 500
+"""统计扇出延迟时保留的最近样本数"""
+
 
 class ContextMessage:
     """上下文消息类"""
     
-    def __init__(self, message: MessageRecv):
+    def __init__(self, message: MessageRecv, seq: int = 0):
+        self.seq = seq
         self.user_name = message.message_info.user_info.user_nickname
         self.user_id = message.message_info.user_info.user_id
         self.content = message.processed_plain_text
@@ -41,6 +52,7 @@ class ContextMessage:
         
     def to_dict(self):
         return {
+            "seq": self.seq,
             "user_name": self.user_name,
             "user_id": self.user_id,
             "content": self.content,
@@ -51,18 +63,48 @@ class ContextMessage:
         }
 
 
+class ContextClient:
+    """单个WebSocket连接，持有独立的发送队列和发送任务"""
+
+    def __init__(self, ws: web.WebSocketResponse):
+        self.ws = ws
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        """待发送的 (帧内容, 入队时间)"""
+        self.sender_task: Optional[asyncio.Task] = None
+        self.evicted = False
+
+
 class ContextWebManager:
-    """上下文网页管理器"""
+    """上下文网页管理器
+
+    新消息按序号增量广播：连接建立或客户端请求重新同步时发送完整快照，
+    之后只发送带序号的增量帧；同一合并周期内的突发消息合并为一帧。
+    每个连接有独立的有界发送队列，广播只负责入队，积压或发送超时的慢客户端会被断开，
+    不会拖慢其他连接。
+    """
     
     def __init__(self, max_messages: int = 10, port: int = 8765):
         self.max_messages = max_messages
         self.port = port
         self.contexts: Dict[str, deque] = {}  # chat_id -> deque of ContextMessage
-        self.websockets: List[web.WebSocketResponse] = []
+        self.clients: Dict[web.WebSocketResponse, ContextClient] = {}
         self.app = None
         self.runner = None
         self.site = None
         self._server_starting = False  # 添加启动标志防止并发
+
+        self._seq = 0  # 最后分配的消息序号
+        self._broadcast_seq = 0  # 最后一次广播覆盖到的消息序号
+        self._pending: List[ContextMessage] = []  # 尚未广播的新消息
+        self._pending_event = asyncio.Event()
+        self._broadcast_task: Optional[asyncio.Task] = None
+
+        # 广播统计
+        self._fanout_latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._frames_broadcast = 0
+        self._frames_sent = 0
+        self._snapshots_sent = 0
+        self._clients_evicted = 0
         
     async def start_server(self):
         """启动web服务器"""
@@ -108,6 +150,7 @@ class ContextWebManager:
             self.site = web.TCPSite(self.runner, 'localhost', self.port)
             await self.site.start()
             
+            self._ensure_broadcast_task()
             logger.info(f"🌐 上下文网页服务器启动成功在 http://localhost:{self.port}")
             
         except Exception as e:
@@ -124,6 +167,12 @@ class ContextWebManager:
         
     async def stop_server(self):
         """停止web服务器"""
+        if self._broadcast_task:
+            self._broadcast_task.cancel()
+            self._broadcast_task = None
+        for client in list(self.clients.values()):
+            self._remove_client(client)
+            await client.ws.close(code=WSCloseCode.GOING_AWAY)
         if self.site:
             await self.site.stop()
         if self.runner:
@@ -283,6 +332,9 @@ class ContextWebManager:
         let ws;
         let reconnectInterval;
         let currentMessages = []; // 存储当前显示的消息
+        let lastSeq = -1; // 已应用的最后一个消息序号
+        let maxMessages = 10;
+        let resyncPending = false;
         
                  function connectWebSocket() {
              console.log('正在连接WebSocket...');
@@ -290,6 +342,9 @@ class ContextWebManager:
              
              ws.onopen = function() {
                  console.log('WebSocket连接已建立');
+                 // 服务器会在连接建立后推送完整快照
+                 lastSeq = -1;
+                 resyncPending = true;
                  if (reconnectInterval) {
                      clearInterval(reconnectInterval);
                      reconnectInterval = null;
@@ -297,12 +352,28 @@ class ContextWebManager:
              };
              
              ws.onmessage = function(event) {
-                 console.log('收到WebSocket消息:', event.data);
+                 let data;
                  try {
-                     const data = JSON.parse(event.data);
-                     updateMessages(data.contexts);
+                     data = JSON.parse(event.data);
                  } catch (e) {
                      console.error('解析消息失败:', e, event.data);
+                     return;
+                 }
+                 
+                 if (data.type === 'snapshot') {
+                     lastSeq = data.seq;
+                     maxMessages = data.max_messages || maxMessages;
+                     resyncPending = false;
+                     renderSnapshot(data.contexts);
+                 } else if (data.type === 'delta') {
+                     if (lastSeq < 0 || data.base_seq > lastSeq) {
+                         // 中间缺失了增量帧，请求完整快照
+                         requestResync();
+                         return;
+                     }
+                     const newMessages = data.messages.filter(msg => msg.seq > lastSeq);
+                     lastSeq = Math.max(lastSeq, data.seq);
+                     appendMessages(newMessages);
                  }
              };
              
@@ -318,8 +389,17 @@ class ContextWebManager:
                  console.error('WebSocket错误:', error);
              };
          }
+         
+         function requestResync() {
+             if (resyncPending || !ws || ws.readyState !== WebSocket.OPEN) {
+                 return;
+             }
+             console.log('请求重新同步上下文');
+             resyncPending = true;
+             ws.send(JSON.stringify({type: 'resync'}));
+         }
         
-                 function updateMessages(contexts) {
+                 function renderSnapshot(contexts) {
              const messagesDiv = document.getElementById('messages');
              
              if (!contexts || contexts.length === 0) {
@@ -328,102 +408,73 @@ class ContextWebManager:
                  return;
              }
              
-             // 如果是第一次加载或者消息完全不同，进行完全重新渲染
+             console.log('加载完整快照，数量:', contexts.length);
+             messagesDiv.innerHTML = '';
+             
+             contexts.forEach(function(msg) {
+                 const messageDiv = createMessageElement(msg);
+                 messagesDiv.appendChild(messageDiv);
+             });
+             
+             currentMessages = [...contexts];
+             window.scrollTo(0, document.body.scrollHeight);
+         }
+         
+         function appendMessages(newMessages) {
+             if (newMessages.length === 0) {
+                 return;
+             }
+             
+             const messagesDiv = document.getElementById('messages');
              if (currentMessages.length === 0) {
-                 console.log('首次加载消息，数量:', contexts.length);
                  messagesDiv.innerHTML = '';
-                 
-                 contexts.forEach(function(msg) {
-                     const messageDiv = createMessageElement(msg);
-                     messagesDiv.appendChild(messageDiv);
-                 });
-                 
-                 currentMessages = [...contexts];
-                 window.scrollTo(0, document.body.scrollHeight);
-                 return;
              }
+             console.log('添加新消息，数量:', newMessages.length);
              
-             // 检测新消息 - 使用更可靠的方法
-             const newMessages = findNewMessages(contexts, currentMessages);
+             // 先检查是否需要移除老消息（保持DOM清洁）
+             const maxDisplayMessages = 15; // 比服务器端稍多一些，确保流畅性
+             const currentMessageElements = messagesDiv.querySelectorAll('.message');
+             const willExceedLimit = currentMessageElements.length + newMessages.length > maxDisplayMessages;
              
-             if (newMessages.length > 0) {
-                 console.log('添加新消息，数量:', newMessages.length);
-                 
-                 // 先检查是否需要移除老消息（保持DOM清洁）
-                 const maxDisplayMessages = 15; // 比服务器端稍多一些，确保流畅性
-                 const currentMessageElements = messagesDiv.querySelectorAll('.message');
-                 const willExceedLimit = currentMessageElements.length + newMessages.length > maxDisplayMessages;
-                 
-                 if (willExceedLimit) {
-                     const removeCount = (currentMessageElements.length + newMessages.length) - maxDisplayMessages;
-                     console.log('需要移除老消息数量:', removeCount);
-                     
-                     for (let i = 0; i < removeCount && i < currentMessageElements.length; i++) {
-                         const oldMessage = currentMessageElements[i];
-                         oldMessage.style.transition = 'opacity 0.3s ease, transform 0.3s ease';
-                         oldMessage.style.opacity = '0';
-                         oldMessage.style.transform = 'translateY(-20px)';
-                         
-                         setTimeout(() => {
-                             if (oldMessage.parentNode) {
-                                 oldMessage.parentNode.removeChild(oldMessage);
-                             }
-                         }, 300);
-                     }
-                 }
+             if (willExceedLimit) {
+                 const removeCount = (currentMessageElements.length + newMessages.length) - maxDisplayMessages;
+                 console.log('需要移除老消息数量:', removeCount);
                  
-                 // 添加新消息
-                 newMessages.forEach(function(msg) {
-                     const messageDiv = createMessageElement(msg, true); // true表示是新消息
-                     messagesDiv.appendChild(messageDiv);
+                 for (let i = 0; i < removeCount && i < currentMessageElements.length; i++) {
+                     const oldMessage = currentMessageElements[i];
+                     oldMessage.style.transition = 'opacity 0.3s ease, transform 0.3s ease';
+                     oldMessage.style.opacity = '0';
+                     oldMessage.style.transform = 'translateY(-20px)';
                      
-                     // 移除动画类，避免重复动画
                      setTimeout(() => {
-                         messageDiv.classList.remove('new-message');
-                     }, 600);
-                 });
-                 
-                 // 更新当前消息列表
-                 currentMessages = [...contexts];
-                 
-                 // 平滑滚动到底部
-                 setTimeout(() => {
-                     window.scrollTo({
-                         top: document.body.scrollHeight,
-                         behavior: 'smooth'
-                     });
-                 }, 100);
-             }
-         }
-         
-         function findNewMessages(contexts, currentMessages) {
-             // 如果当前消息为空，所有消息都是新的
-             if (currentMessages.length === 0) {
-                 return contexts;
+                         if (oldMessage.parentNode) {
+                             oldMessage.parentNode.removeChild(oldMessage);
+                         }
+                     }, 300);
+                 }
              }
              
-             // 找到最后一条当前消息在新消息列表中的位置
-             const lastCurrentMsg = currentMessages[currentMessages.length - 1];
-             let lastIndex = -1;
+             // 添加新消息
+             newMessages.forEach(function(msg) {
+                 const messageDiv = createMessageElement(msg, true); // true表示是新消息
+                 messagesDiv.appendChild(messageDiv);
+                 
+                 // 移除动画类，避免重复动画
+                 setTimeout(() => {
+                     messageDiv.classList.remove('new-message');
+                 }, 600);
+             });
              
-             // 从后往前找，因为新消息通常在末尾
-             for (let i = contexts.length - 1; i >= 0; i--) {
-                 const msg = contexts[i];
-                 if (msg.user_id === lastCurrentMsg.user_id && 
-                     msg.content === lastCurrentMsg.content && 
-                     msg.timestamp === lastCurrentMsg.timestamp) {
-                     lastIndex = i;
-                     break;
-                 }
-             }
+             // 更新当前消息列表
+             currentMessages = currentMessages.concat(newMessages).slice(-maxMessages);
              
-             // 如果找到了，返回之后的消息；否则返回所有消息（可能是完全刷新）
-             if (lastIndex >= 0) {
-                 return contexts.slice(lastIndex + 1);
-             } else {
-                 console.log('未找到匹配的最后消息，可能需要完全刷新');
-                 return contexts.slice(Math.max(0, contexts.length - (currentMessages.length + 1)));
-             }
+             // 平滑滚动到底部
+             setTimeout(() => {
+                 window.scrollTo({
+                     top: document.body.scrollHeight,
+                     behavior: 'smooth'
+                 });
+             }, 100);
          }
          
          function createMessageElement(msg, isNew = false) {
@@ -456,15 +507,6 @@ class ContextWebManager:
              return div.innerHTML;
          }
         
-        // 初始加载数据
-        fetch('/api/contexts')
-            .then(response => response.json())
-            .then(data => {
-                console.log('初始数据加载成功:', data);
-                updateMessages(data.contexts);
-            })
-            .catch(err => console.error('加载初始数据失败:', err));
-        
         // 连接WebSocket
         connectWebSocket();
     </script>
@@ -478,47 +520,56 @@ class ContextWebManager:
         ws = web.WebSocketResponse()
         await ws.prepare(request)
         
-        self.websockets.append(ws)
-        logger.debug(f"WebSocket连接建立，当前连接数: {len(self.websockets)}")
+        client = ContextClient(ws)
+        client.sender_task = asyncio.create_task(self._client_sender(client))
+        self.clients[ws] = client
+        logger.debug(f"WebSocket连接建立，当前连接数: {len(self.clients)}")
         
-        # 发送初始数据
-        await self.send_contexts_to_websocket(ws)
+        # 发送初始快照
+        self._enqueue_snapshot(client)
         
-        async for msg in ws:
-            if msg.type == WSMsgType.ERROR:
-                logger.error(f'WebSocket错误: {ws.exception()}')
-                break
-                
-        # 清理断开的连接
-        if ws in self.websockets:
-            self.websockets.remove(ws)
-        logger.debug(f"WebSocket连接断开，当前连接数: {len(self.websockets)}")
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    self._handle_client_message(client, msg.data)
+                elif msg.type == WSMsgType.ERROR:
+                    logger.error(f'WebSocket错误: {ws.exception()}')
+                    break
+        finally:
+            # 清理断开的连接
+            self._remove_client(client)
+            logger.debug(f"WebSocket连接断开，当前连接数: {len(self.clients)}")
         
         return ws
+
+    def _handle_client_message(self, client: ContextClient, data: str):
+        """处理客户端发来的消息，目前只有重新同步请求"""
+        try:
+            request = json.loads(data)
+        except json.JSONDecodeError:
+            logger.debug(f"忽略无法解析的WebSocket消息: {data[:100]}")
+            return
+        if isinstance(request, dict) and request.get("type") == "resync":
+            logger.debug("客户端请求重新同步上下文")
+            self._enqueue_snapshot(client)
         
     async def get_contexts_handler(self, request):
         """获取上下文API"""
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
-        
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-        
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages:]]
+        contexts_data = [msg.to_dict() for msg in self._recent_messages()]
         
         logger.debug(f"返回上下文数据，共 {len(contexts_data)} 条消息")
-        return web.json_response({"contexts": contexts_data})
+        return web.json_response({"seq": self._seq, "contexts": contexts_data})
         
     async def debug_handler(self, request):
         """调试信息处理器"""
         debug_info = {
             "server_status": "running",
-            "websocket_connections": len(self.websockets),
+            "websocket_connections": len(self.clients),
             "total_chats": len(self.contexts),
             "total_messages": sum(len(contexts) for contexts in self.contexts.values()),
+            "broadcast": self.get_broadcast_stats(),
         }
+        broadcast_stats = debug_info["broadcast"]
         
         # 构建聊天详情HTML
         chats_html = ""
@@ -560,6 +611,14 @@ class ContextWebManager:
         <p>消息总数: {debug_info["total_messages"]}</p>
     </div>
     
+    <div class="section">
+        <h2>广播统计</h2>
+        <p>当前序号: {broadcast_stats["seq"]}</p>
+        <p>广播帧数: {broadcast_stats["frames_broadcast"]}，已发送帧数: {broadcast_stats["frames_sent"]}，快照数: {broadcast_stats["snapshots_sent"]}</p>
+        <p>扇出延迟: 平均 {broadcast_stats["fanout_latency_avg_ms"]} ms / P95 {broadcast_stats["fanout_latency_p95_ms"]} ms / 最大 {broadcast_stats["fanout_latency_max_ms"]} ms</p>
+        <p>最大发送队列积压: {broadcast_stats["max_queue_depth"]}，断开的慢客户端: {broadcast_stats["clients_evicted"]}</p>
+    </div>
+    
     <div class="section">
         <h2>聊天详情</h2>
         {chats_html}
@@ -583,86 +642,159 @@ class ContextWebManager:
         return web.Response(text=html_content, content_type='text/html')
         
     async def add_message(self, chat_id: str, message: MessageRecv):
-        """添加新消息到上下文"""
+        """添加新消息到上下文，广播由合并任务在下一个周期完成"""
         if chat_id not in self.contexts:
             self.contexts[chat_id] = deque(maxlen=self.max_messages)
             logger.debug(f"为聊天 {chat_id} 创建新的上下文队列")
             
-        context_msg = ContextMessage(message)
+        self._seq += 1
+        context_msg = ContextMessage(message, self._seq)
         self.contexts[chat_id].append(context_msg)
+        self._pending.append(context_msg)
         
-        # 统计当前总消息数
-        total_messages = sum(len(contexts) for contexts in self.contexts.values())
-        
-        logger.info(f"✅ 添加消息到上下文 [总数: {total_messages}]: [{context_msg.group_name}] {context_msg.user_name}: {context_msg.content}")
-        
-        # 调试：打印当前所有消息
-        logger.info("📝 当前上下文中的所有消息：")
-        for cid, contexts in self.contexts.items():
-            logger.info(f"  聊天 {cid}: {len(contexts)} 条消息")
-            for i, msg in enumerate(contexts):
-                logger.info(f"    {i+1}. [{msg.timestamp.strftime('%H:%M:%S')}] {msg.user_name}: {msg.content[:30]}...")
-        
-        # 广播更新给所有WebSocket连接
-        await self.broadcast_contexts()
-        
-    async def send_contexts_to_websocket(self, ws: web.WebSocketResponse):
-        """向单个WebSocket发送上下文数据"""
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
-        
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-        
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages:]]
-        
-        data = {"contexts": contexts_data}
-        await ws.send_str(json.dumps(data, ensure_ascii=False))
+        logger.debug(f"添加消息到上下文 #{context_msg.seq}: [{context_msg.group_name}] {context_msg.user_name}: {context_msg.content[:30]}")
         
+        self._ensure_broadcast_task()
+        self._pending_event.set()
+
+    def _recent_messages(self) -> List[ContextMessage]:
+        """所有聊天中最新的 max_messages 条消息，最新的在最后"""
+        all_context_msgs: List[ContextMessage] = []
+        for contexts in self.contexts.values():
+            all_context_msgs.extend(contexts)
+        # 序号随添加顺序递增，与时间顺序一致
+        all_context_msgs.sort(key=lambda x: x.seq)
+        return all_context_msgs[-self.max_messages:]
+
+    def _ensure_broadcast_task(self):
+        if self._broadcast_task is None or self._broadcast_task.done():
+            self._broadcast_task = asyncio.create_task(self._broadcast_loop())
+
+    async def _broadcast_loop(self):
+        """合并广播任务：有新消息时等待一个周期，把这段时间内的消息合并为一帧"""
+        while True:
+            await self._pending_event.wait()
+            await asyncio.sleep(BROADCAST_TICK)
+            self._pending_event.clear()
+            try:
+                await self.broadcast_contexts()
+            except Exception as e:
+                logger.error(f"广播上下文更新失败: {e}", exc_info=True)
+
     async def broadcast_contexts(self):
-        """向所有WebSocket连接广播上下文更新"""
-        if not self.websockets:
+        """把待广播的新消息作为一帧增量放入所有连接的发送队列"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        base_seq, self._broadcast_seq = self._broadcast_seq, self._seq
+
+        if not self.clients:
             logger.debug("没有WebSocket连接，跳过广播")
             return
-            
-        all_context_msgs = []
-        for _chat_id, contexts in self.contexts.items():
-            all_context_msgs.extend(list(contexts))
-        
-        # 按时间排序，最新的在最后
-        all_context_msgs.sort(key=lambda x: x.timestamp)
-        
-        # 转换为字典格式
-        contexts_data = [msg.to_dict() for msg in all_context_msgs[-self.max_messages:]]
-        
-        data = {"contexts": contexts_data}
-        message = json.dumps(data, ensure_ascii=False)
-        
-        logger.info(f"广播 {len(contexts_data)} 条消息到 {len(self.websockets)} 个WebSocket连接")
-        
-        # 创建WebSocket列表的副本，避免在遍历时修改
-        websockets_copy = self.websockets.copy()
-        removed_count = 0
-        
-        for ws in websockets_copy:
-            if ws.closed:
-                if ws in self.websockets:
-                    self.websockets.remove(ws)
-                    removed_count += 1
-            else:
-                try:
-                    await ws.send_str(message)
-                    logger.debug("消息发送成功")
-                except Exception as e:
-                    logger.error(f"发送WebSocket消息失败: {e}")
-                    if ws in self.websockets:
-                        self.websockets.remove(ws)
-                        removed_count += 1
-        
-        if removed_count > 0:
-            logger.debug(f"清理了 {removed_count} 个断开的WebSocket连接")
+
+        # 突发消息超过显示上限时只需要最后 max_messages 条
+        data = {
+            "type": "delta",
+            "base_seq": base_seq,
+            "seq": self._broadcast_seq,
+            "messages": [msg.to_dict() for msg in pending[-self.max_messages:]],
+        }
+        frame = json.dumps(data, ensure_ascii=False)
+        self._frames_broadcast += 1
+
+        logger.debug(f"广播 {len(pending)} 条新消息到 {len(self.clients)} 个WebSocket连接")
+        for client in list(self.clients.values()):
+            self._enqueue_frame(client, frame)
+
+    def _enqueue_snapshot(self, client: ContextClient):
+        """向单个连接发送完整快照，之后的增量帧以快照序号为基准"""
+        data = {
+            "type": "snapshot",
+            "seq": self._seq,
+            "max_messages": self.max_messages,
+            "contexts": [msg.to_dict() for msg in self._recent_messages()],
+        }
+        if self._enqueue_frame(client, json.dumps(data, ensure_ascii=False)):
+            self._snapshots_sent += 1
+
+    def _enqueue_frame(self, client: ContextClient, frame: str) -> bool:
+        """放入连接的发送队列，队列已满说明客户端跟不上，直接断开"""
+        if client.evicted:
+            return False
+        try:
+            client.queue.put_nowait((frame, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            asyncio.create_task(self._evict_client(client, f"发送队列积压超过 {CLIENT_QUEUE_SIZE} 帧"))
+            return False
+
+    async def _client_sender(self, client: ContextClient):
+        """单个连接的发送任务，逐帧发送并记录从入队到发送完成的扇出延迟"""
+        while True:
+            frame, enqueued_at = await client.queue.get()
+            if client.ws.closed:
+                self._remove_client(client)
+                return
+            try:
+                await asyncio.wait_for(client.ws.send_str(frame), timeout=SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self._evict_client(client, f"发送超时 {SEND_TIMEOUT}s")
+                return
+            except Exception as e:
+                logger.debug(f"发送WebSocket消息失败: {e}")
+                self._remove_client(client)
+                return
+            self._frames_sent += 1
+            self._fanout_latencies.append(time.perf_counter() - enqueued_at)
+
+    def _remove_client(self, client: ContextClient):
+        """从连接表中移除，并停止其发送任务"""
+        if client.evicted:
+            return
+        client.evicted = True
+        self.clients.pop(client.ws, None)
+        if client.sender_task and client.sender_task is not asyncio.current_task():
+            client.sender_task.cancel()
+
+    async def _evict_client(self, client: ContextClient, reason: str):
+        """断开慢客户端，客户端重连后会收到新的完整快照"""
+        if client.evicted:
+            return
+        self._remove_client(client)
+        self._clients_evicted += 1
+        logger.warning(f"断开WebSocket慢客户端: {reason}，当前连接数: {len(self.clients)}")
+        try:
+            await client.ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=reason.encode("utf-8"))
+        except Exception as e:
+            logger.debug(f"关闭WebSocket连接失败: {e}")
+
+    def get_broadcast_stats(self) -> Dict[str, float]:
+        """广播统计，扇出延迟为帧从入队到在某个连接上发送完成的耗时"""
+        latencies = sorted(self._fanout_latencies)
+        avg_ms, p95_ms, max_ms = self._latency_summary(latencies)
+        return {
+            "seq": self._seq,
+            "connections": len(self.clients),
+            "frames_broadcast": self._frames_broadcast,
+            "frames_sent": self._frames_sent,
+            "snapshots_sent": self._snapshots_sent,
+            "clients_evicted": self._clients_evicted,
+            "max_queue_depth": max((client.queue.qsize() for client in self.clients.values()), default=0),
+            "fanout_latency_avg_ms": avg_ms,
+            "fanout_latency_p95_ms": p95_ms,
+            "fanout_latency_max_ms": max_ms,
+        }
+
+    @staticmethod
+    def _latency_summary(latencies: List[float]) -> Tuple[float, float, float]:
+        if not latencies:
+            return 0.0, 0.0, 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return (
+            round(sum(latencies) / len(latencies) * 1000, 2),
+            round(p95 * 1000, 2),
+            round(latencies[-1] * 1000, 2),
+        )
 
 
 # 全局实例
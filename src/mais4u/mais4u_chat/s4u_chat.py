@@ -2,9 +2,10 @@ import asyncio
 import traceback
 import time
 import random
-from typing import Optional, Dict, Tuple, List  # 导入类型提示
+from typing import Optional, Dict, Set, Tuple, List  # 导入类型提示
 from maim_message import UserInfo, Seg
 from src.common.logger import get_logger
+from src.manager.background_job_scheduler import background_job_scheduler
 from src.chat.message_receive.chat_stream import ChatStream, get_chat_manager
 from .s4u_stream_generator import S4UStreamGenerator
 from src.chat.message_receive.message import MessageSending, MessageRecv, MessageRecvS4U
@@ -19,6 +20,7 @@ from src.mais4u.s4u_config import s4u_config
 from src.person_info.person_info import get_person_id
 from .super_chat_manager import get_super_chat_manager
 from .yes_or_no import yes_or_no_head
+from .s4u_message_queue import S4UMessageQueue, S4UQueueStats
 
 logger = get_logger("S4U_chat")
 
@@ -185,12 +187,16 @@ class S4UChat:
         self.relationship_builder = relationship_builder_manager.get_or_create_builder(self.stream_id)
 
         # 两个消息队列
-        self._vip_queue = asyncio.PriorityQueue()
-        self._normal_queue = asyncio.PriorityQueue()
+        self._vip_queue = S4UMessageQueue()
+        self._normal_queue = S4UMessageQueue()
 
         self._entry_counter = 0  # 保证FIFO的全局计数器
         self._new_message_event = asyncio.Event()  # 用于唤醒处理器
 
+        # 后台关系构建请求（immediate_build 参数），入队不等待关系构建完成
+        self._relation_build_requests: Set[str] = set()
+        self._relation_build_task: Optional[asyncio.Task] = None
+
         self._processing_task = asyncio.create_task(self._message_processor())
         self._current_generation_task: Optional[asyncio.Task] = None
         # 当前消息的元数据：(队列类型, 优先级分数, 计数器, 消息对象)
@@ -269,12 +275,12 @@ class S4UChat:
             # print(is_gift)
             # print(is_superchat)
             if is_gift:
-                await self.relationship_builder.build_relation(immediate_build=person_id)
+                self._request_relation_build(immediate_build=person_id)
                 # 安全地增加兴趣分，如果person_id不存在则先初始化为1.0
                 current_score = self.interest_dict.get(person_id, 1.0)
                 self.interest_dict[person_id] = current_score + 0.1 * message.gift_count
             elif is_superchat:
-                await self.relationship_builder.build_relation(immediate_build=person_id)
+                self._request_relation_build(immediate_build=person_id)
                 # 安全地增加兴趣分，如果person_id不存在则先初始化为1.0
                 current_score = self.interest_dict.get(person_id, 1.0)
                 self.interest_dict[person_id] = current_score + 0.1 * float(message.superchat_price)
@@ -283,11 +289,11 @@ class S4UChat:
                 super_chat_manager = get_super_chat_manager()
                 await super_chat_manager.add_superchat(message)
             else:
-                await self.relationship_builder.build_relation(20)
+                self._request_relation_build()
         except Exception:
             traceback.print_exc()
             
-        logger.info(f"[{self.stream_name}] 消息处理完毕，消息内容：{message.processed_plain_text}")
+        logger.debug(f"[{self.stream_name}] 消息处理完毕，消息内容：{message.processed_plain_text}")
         
         priority_info = self._get_priority_info(message)
         is_vip = self._is_vip(priority_info)
@@ -329,56 +335,55 @@ class S4UChat:
                 )
             self._current_generation_task.cancel()
 
-        # asyncio.PriorityQueue 是最小堆，所以我们存入分数的相反数
+        # 队列是最小堆，所以我们存入分数的相反数
         # 这样，原始分数越高的消息，在队列中的优先级数字越小，越靠前
         item = (-new_priority_score, self._entry_counter, time.time(), message)
 
         if is_vip and s4u_config.vip_queue_priority:
-            await self._vip_queue.put(item)
+            self._vip_queue.put(item)
             logger.info(f"[{self.stream_name}] VIP message added to queue.")
         else:
-            await self._normal_queue.put(item)
+            self._normal_queue.put(item)
 
         self._entry_counter += 1
         self._new_message_event.set()  # 唤醒处理器
 
+    def _request_relation_build(self, immediate_build: str = ""):
+        """登记一次关系构建请求，由后台任务依次执行，同一轮中重复的请求会合并"""
+        self._relation_build_requests.add(immediate_build)
+        if self._relation_build_task is None or self._relation_build_task.done():
+            self._relation_build_task = asyncio.create_task(self._relation_build_worker())
+
+    async def _relation_build_worker(self):
+        """后台依次处理关系构建请求，同一时刻只有一个 build_relation 在运行"""
+        while self._relation_build_requests:
+            requests, self._relation_build_requests = self._relation_build_requests, set()
+            for immediate_build in requests:
+                try:
+                    await self.relationship_builder.build_relation(immediate_build=immediate_build)
+                except Exception as e:
+                    logger.error(f"[{self.stream_name}] 后台关系构建失败: {e}", exc_info=True)
+
     def _cleanup_old_normal_messages(self):
-        """清理普通队列中不在最近N条消息范围内的消息"""
-        if not s4u_config.enable_old_message_cleanup or self._normal_queue.empty():
+        """清理普通队列中不在最近N条消息范围内或已等待超时的消息"""
+        if self._normal_queue.empty():
             return
-        
-        # 计算阈值：保留最近 recent_message_keep_count 条消息
-        cutoff_counter = max(0, self._entry_counter - s4u_config.recent_message_keep_count)
-        
-        # 临时存储需要保留的消息
-        temp_messages = []
+
         removed_count = 0
-        
-        # 取出所有普通队列中的消息
-        while not self._normal_queue.empty():
-            try:
-                item = self._normal_queue.get_nowait()
-                neg_priority, entry_count, timestamp, message = item
-                
-                # 如果消息在最近N条消息范围内，保留它
-                logger.info(f"检查消息:{message.processed_plain_text},entry_count:{entry_count} cutoff_counter:{cutoff_counter}")
-                
-                if entry_count >= cutoff_counter:
-                    temp_messages.append(item)
-                else:
-                    removed_count += 1
-                    self._normal_queue.task_done()  # 标记被移除的任务为完成
-                    
-            except asyncio.QueueEmpty:
-                break
-        
-        # 将保留的消息重新放入队列
-        for item in temp_messages:
-            self._normal_queue.put_nowait(item)
-        
-        if removed_count > 0:
-            logger.info(f"消息{message.processed_plain_text}超过{s4u_config.recent_message_keep_count}条，现在counter:{self._entry_counter}被移除")
-            logger.info(f"[{self.stream_name}] Cleaned up {removed_count} old normal messages outside recent {s4u_config.recent_message_keep_count} range.")
+        if s4u_config.enable_old_message_cleanup:
+            # 计算阈值：保留最近 recent_message_keep_count 条消息
+            cutoff_counter = max(0, self._entry_counter - s4u_config.recent_message_keep_count)
+            removed_count = self._normal_queue.drop_before_counter(cutoff_counter)
+            if removed_count > 0:
+                logger.info(f"[{self.stream_name}] Cleaned up {removed_count} old normal messages outside recent {s4u_config.recent_message_keep_count} range.")
+
+        stale_count = self._normal_queue.drop_older_than(time.time() - s4u_config.message_timeout_seconds)
+        if stale_count > 0:
+            logger.info(f"[{self.stream_name}] Discarded {stale_count} stale normal messages.")
+
+    def get_queue_stats(self) -> Dict[str, S4UQueueStats]:
+        """获取VIP队列与普通队列的深度、丢弃数量和等待时间统计"""
+        return {"vip": self._vip_queue.get_stats(), "normal": self._normal_queue.get_stats()}
 
     async def _message_processor(self):
         """调度器：优先处理VIP队列，然后处理普通队列。"""
@@ -393,21 +398,13 @@ class S4UChat:
 
                 # 优先处理VIP队列
                 if not self._vip_queue.empty():
-                    neg_priority, entry_count, _, message = self._vip_queue.get_nowait()
+                    neg_priority, entry_count, _, message = self._vip_queue.pop()
                     priority = -neg_priority
                     queue_name = "vip"
-                # 其次处理普通队列
+                # 其次处理普通队列（超时消息已在清理时丢弃）
                 elif not self._normal_queue.empty():
-
-                    neg_priority, entry_count, timestamp, message = self._normal_queue.get_nowait()
+                    neg_priority, entry_count, _, message = self._normal_queue.pop()
                     priority = -neg_priority
-                    # 检查普通消息是否超时
-                    if time.time() - timestamp > s4u_config.message_timeout_seconds:
-                        logger.info(
-                            f"[{self.stream_name}] Discarding stale normal message: {message.processed_plain_text[:20]}..."
-                        )
-                        self._normal_queue.task_done()
-                        continue  # 处理下一条
                     queue_name = "normal"
                 else:
                     if self.internal_message:
@@ -427,7 +424,8 @@ class S4UChat:
                 self._current_generation_task = asyncio.create_task(self._generate_and_send(message))
 
                 try:
-                    await self._current_generation_task
+                    with background_job_scheduler.track_interactive():
+                        await self._current_generation_task
                 except asyncio.CancelledError:
                     logger.info(
                         f"[{self.stream_name}] Reply generation was interrupted externally for {queue_name} message. The message will be discarded."
@@ -440,14 +438,6 @@ class S4UChat:
                 finally:
                     self._current_generation_task = None
                     self._current_message_being_replied = None
-                    # 标记任务完成
-                    if queue_name == "vip":
-                        self._vip_queue.task_done()
-                    elif queue_name == "internal":
-                        # 如果使用 internal_message 生成回复，则不从 normal 队列中移除
-                        pass
-                    else:
-                        self._normal_queue.task_done()
 
                     # 检查是否还有任务，有则立即再次触发事件
                     if not self._vip_queue.empty() or not self._normal_queue.empty():
@@ -573,6 +563,9 @@ class S4UChat:
         if self._processing_task and not self._processing_task.done():
             self._processing_task.cancel()
 
+        if self._relation_build_task and not self._relation_build_task.done():
+            self._relation_build_task.cancel()
+
         # 等待任务响应取消
         try:
             await self._processing_task
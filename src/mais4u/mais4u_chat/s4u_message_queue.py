@@ -0,0 +1,124 @@
+import heapq
+import time
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+QueueItem = Tuple[float, int, float, Any]
+"""(负优先级分数, 入队计数器, 入队时间戳, 消息)，与原 asyncio.PriorityQueue 中的条目一致"""
+
+WAIT_TIME_WINDOW = 200
+"""统计等待时间时保留的最近样本数"""
+
+
+@dataclass
+class S4UQueueStats:
+    """单个消息队列的累计统计"""
+
+    depth: int = 0
+    max_depth: int = 0
+    enqueued: int = 0
+    dequeued: int = 0
+    dropped_old: int = 0
+    """因不在最近N条消息范围内被丢弃的数量"""
+    dropped_stale: int = 0
+    """因等待超时被丢弃的数量"""
+    avg_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    """最近出队消息从入队到出队的等待时间"""
+
+
+class S4UMessageQueue:
+    """支持惰性删除的消息优先队列
+
+    条目按 (负优先级, 计数器) 存入小顶堆，同时按计数器顺序记录在一个双端队列中。
+    由于计数器与入队时间都随入队顺序递增，按计数器或时间戳淘汰旧消息时只需从双端队列头部弹出，
+    被淘汰条目仍留在堆中，出队时遇到再跳过；堆中作废条目过多时整体重建。
+    所有操作都是同步的，入队不会等待。
+    """
+
+    def __init__(self):
+        self._heap: List[QueueItem] = []
+        self._live: Dict[int, QueueItem] = {}
+        """入队计数器 -> 仍有效的条目"""
+        self._order: Deque[int] = deque()
+        """按入队顺序排列的计数器，可能包含已出队的计数器"""
+        self._wait_times: Deque[float] = deque(maxlen=WAIT_TIME_WINDOW)
+        self.stats = S4UQueueStats()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def empty(self) -> bool:
+        return not self._live
+
+    def put(self, item: QueueItem) -> None:
+        """入队"""
+        entry_count = item[1]
+        self._live[entry_count] = item
+        self._order.append(entry_count)
+        heapq.heappush(self._heap, item)
+        self.stats.enqueued += 1
+        self._update_depth()
+
+    def pop(self) -> Optional[QueueItem]:
+        """弹出优先级最高的有效条目，队列为空时返回None"""
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if self._live.pop(item[1], None) is None:
+                continue  # 已被淘汰的条目
+            wait_time = time.time() - item[2]
+            self._wait_times.append(wait_time)
+            self.stats.dequeued += 1
+            self._update_depth()
+            self._maybe_compact()
+            return item
+        return None
+
+    def drop_before_counter(self, cutoff_counter: int) -> int:
+        """淘汰计数器小于 cutoff_counter 的条目，返回淘汰数量"""
+        removed = self._drop_front(lambda item: item[1] < cutoff_counter)
+        self.stats.dropped_old += removed
+        return removed
+
+    def drop_older_than(self, cutoff_time: float) -> int:
+        """淘汰入队时间早于 cutoff_time 的条目，返回淘汰数量"""
+        removed = self._drop_front(lambda item: item[2] < cutoff_time)
+        self.stats.dropped_stale += removed
+        return removed
+
+    def _drop_front(self, should_drop) -> int:
+        removed = 0
+        while self._order:
+            item = self._live.get(self._order[0])
+            if item is not None and not should_drop(item):
+                break
+            self._order.popleft()
+            if item is not None:
+                del self._live[item[1]]
+                removed += 1
+        if removed:
+            self._update_depth()
+            self._maybe_compact()
+        return removed
+
+    def _maybe_compact(self) -> None:
+        """堆或顺序队列中作废条目超过有效条目一倍时重建"""
+        limit = 2 * len(self._live) + 64
+        if len(self._heap) > limit:
+            self._heap = list(self._live.values())
+            heapq.heapify(self._heap)
+        if len(self._order) > limit:
+            self._order = deque(sorted(self._live))
+
+    def _update_depth(self) -> None:
+        self.stats.depth = len(self._live)
+        self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+
+    def get_stats(self) -> S4UQueueStats:
+        """返回当前统计，等待时间基于最近出队的消息"""
+        if self._wait_times:
+            self.stats.avg_wait_seconds = sum(self._wait_times) / len(self._wait_times)
+            self.stats.max_wait_seconds = max(self._wait_times)
+        return self.stats
@@ -1,6 +1,6 @@
+from contextlib import aclosing
 from typing import AsyncGenerator
-from src.llm_models.utils_model import LLMRequest, RequestType
-from src.llm_models.payload_content.message import MessageBuilder
+from src.llm_models.utils_model import LLMRequest
 from src.config.config import model_config
 from src.chat.message_receive.message import MessageRecvS4U
 from src.mais4u.mais4u_chat.s4u_prompt import prompt_builder
@@ -21,6 +21,8 @@ class S4UStreamGenerator:
         
         self.current_model_name = "unknown model"
         self.partial_response = ""
+        self._stream_buffer = ""
+        self._punctuation_buffer = ""
 
         # 正则表达式用于按句子切分，同时处理各种标点和边缘情况
         # 匹配常见的句子结束符，但会忽略引号内和数字中的标点
@@ -90,74 +92,47 @@ class S4UStreamGenerator:
     async def _generate_response_with_llm_request(self, prompt: str) -> AsyncGenerator[str, None]:
         """使用LLMRequest进行流式响应生成"""
         
-        # 构建消息
-        message_builder = MessageBuilder()
-        message_builder.add_text_content(prompt)
-        messages = [message_builder.build()]
-        
-        # 选择模型
-        model_info, api_provider, client = self.llm_request._select_model()
-        self.current_model_name = model_info.name
-        
-        # 如果模型支持强制流式模式，使用真正的流式处理
-        if model_info.force_stream_mode:
-            # 简化流式处理：直接使用LLMRequest的流式功能
-            try:
-                # 直接调用LLMRequest的流式处理
-                response = await self.llm_request._execute_request(
-                    api_provider=api_provider,
-                    client=client,
-                    request_type=RequestType.RESPONSE,
-                    model_info=model_info,
-                    message_list=messages,
-                )
-                
-                # 处理响应内容
-                content = response.content or ""
-                if content:
-                    # 将内容按句子分割并输出
-                    async for chunk in self._process_content_streaming(content):
-                        yield chunk
-                        
-            except Exception as e:
-                logger.error(f"流式请求执行失败: {e}")
-                # 如果流式请求失败，回退到普通模式
-                response = await self.llm_request._execute_request(
-                    api_provider=api_provider,
-                    client=client,
-                    request_type=RequestType.RESPONSE,
-                    model_info=model_info,
-                    message_list=messages,
-                )
-                content = response.content or ""
-                async for chunk in self._process_content_streaming(content):
-                    yield chunk
-            
-        else:
-            # 如果不支持流式，使用普通方式然后模拟流式输出
-            response = await self.llm_request._execute_request(
-                api_provider=api_provider,
-                client=client,
-                request_type=RequestType.RESPONSE,
-                model_info=model_info,
-                message_list=messages,
-            )
-            
-            content = response.content or ""
-            async for chunk in self._process_content_streaming(content):
-                yield chunk
-
-    async def _process_buffer_streaming(self, buffer: str) -> AsyncGenerator[str, None]:
-        """实时处理缓冲区内容，输出完整句子"""
-        # 使用正则表达式匹配完整句子
-        for match in self.sentence_split_pattern.finditer(buffer):
+        # 增量到达时即切分出完整的句子输出；不支持流式的客户端会一次性产出完整内容
+        self._stream_buffer = ""
+        self._punctuation_buffer = ""
+        # 任务被取消（例如S4UChat打断回复）时，aclosing 会逐层关闭生成器并关闭HTTP流
+        async with aclosing(self.llm_request.generate_response_stream_chunks(prompt)) as stream:
+            async for chunk in stream:
+                self.current_model_name = chunk.model_name or self.current_model_name
+                if not chunk.content:
+                    continue
+                async for sentence in self._process_buffer_streaming(chunk.content):
+                    yield sentence
+
+        # 输出缓冲区中剩余的内容
+        remaining = self._punctuation_buffer + self._stream_buffer
+        self._stream_buffer = ""
+        self._punctuation_buffer = ""
+        async for sentence in self._process_content_streaming(remaining):
+            yield sentence
+
+    async def _process_buffer_streaming(self, delta: str) -> AsyncGenerator[str, None]:
+        """把流式增量追加到缓冲区，实时输出其中已经完整的句子，未完整的部分留在缓冲区"""
+        self._stream_buffer += delta
+        consumed = 0
+        for match in self.sentence_split_pattern.finditer(self._stream_buffer):
+            # 匹配到缓冲区末尾的句子可能还没结束（例如 "3." 之后可能是 "14"），等待后续增量
+            if match.end(0) >= len(self._stream_buffer):
+                break
+            consumed = match.end(0)
             sentence = match.group(0).strip()
-            if sentence and match.end(0) <= len(buffer):
-                # 检查句子是否完整（以标点符号结尾）
-                if sentence.endswith(("。", "！", "？", ".", "!", "?")):
-                    if sentence not in [",", "，", ".", "。", "!", "！", "?", "？"]:
-                        self.partial_response += sentence
-                        yield sentence
+            if not sentence:
+                continue
+            if sentence in [",", "，", ".", "。", "!", "！", "?", "？"]:
+                # 单独的标点并入下一句
+                self._punctuation_buffer += sentence
+                continue
+            to_yield = (self._punctuation_buffer + sentence).rstrip(",，")
+            self._punctuation_buffer = ""
+            if to_yield:
+                self.partial_response += to_yield
+                yield to_yield
+        self._stream_buffer = self._stream_buffer[consumed:]
 
     async def _process_content_streaming(self, content: str) -> AsyncGenerator[str, None]:
         """处理内容进行流式输出（用于非流式模型的模拟流式输出）"""
@@ -0,0 +1,359 @@
+import asyncio
+import contextvars
+import itertools
+import time
+
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from fastapi import APIRouter
+
+from src.common.logger import get_logger
+from src.manager.async_task_manager import AsyncTask, async_task_manager
+
+logger = get_logger("background_job")
+
+
+class JobClass(Enum):
+    """后台任务类别"""
+
+    MOOD = "mood"
+    RELATION = "relation"
+    EXPRESSION = "expression"
+    MEMORY = "memory"
+    EMOJI = "emoji"
+
+
+@dataclass(frozen=True)
+class JobClassPolicy:
+    priority: int
+    """数值越小越优先"""
+    max_concurrency: int
+    """该类别同时运行的最大任务数"""
+    max_defer_seconds: float
+    """回复繁忙时最多推迟的时长，超过后即使繁忙也开始执行"""
+
+
+JOB_CLASS_POLICIES: Dict[JobClass, JobClassPolicy] = {
+    JobClass.MOOD: JobClassPolicy(priority=0, max_concurrency=2, max_defer_seconds=10.0),
+    JobClass.RELATION: JobClassPolicy(priority=1, max_concurrency=1, max_defer_seconds=120.0),
+    JobClass.EXPRESSION: JobClassPolicy(priority=2, max_concurrency=1, max_defer_seconds=300.0),
+    JobClass.MEMORY: JobClassPolicy(priority=2, max_concurrency=1, max_defer_seconds=300.0),
+    JobClass.EMOJI: JobClassPolicy(priority=3, max_concurrency=2, max_defer_seconds=600.0),
+}
+
+MAX_RUNNING_JOBS = 4
+"""所有类别同时运行的最大任务数"""
+MAX_QUEUED_PER_CLASS = 200
+"""每个类别最多排队的任务数，超出时丢弃最早的任务"""
+REPLY_LATENCY_THRESHOLD = 10.0
+"""回复耗时的滑动平均超过该值（秒）时视为繁忙，推迟后台任务"""
+REPLY_LATENCY_STALE_SECONDS = 60.0
+"""超过该时长没有新的回复耗时样本时不再参考滑动平均"""
+REPLY_LATENCY_ALPHA = 0.3
+DEFER_CHECK_INTERVAL = 1.0
+"""有任务被推迟时重新检查的间隔（秒）"""
+WAIT_TIME_WINDOW = 200
+"""统计等待时间时保留的最近样本数"""
+
+
+@dataclass
+class BackgroundJob:
+    job_id: int
+    job_class: JobClass
+    key: Optional[str]
+    func: Callable[[], Awaitable[Any]]
+    context: contextvars.Context
+    """提交时的上下文（例如提示词模板作用域），任务在该上下文的副本中运行"""
+    submitted_at: float
+    deadline: float
+    started_at: Optional[float] = None
+    deferred: bool = False
+    task: Optional[asyncio.Task] = None
+    waiters: List[asyncio.Future] = field(default_factory=list)
+
+    def to_dict(self, now: float) -> dict:
+        info = {
+            "id": self.job_id,
+            "class": self.job_class.value,
+            "key": self.key,
+            "waited_seconds": round((self.started_at or now) - self.submitted_at, 3),
+        }
+        if self.started_at is None:
+            info["deferred"] = self.deferred
+            info["deadline_in_seconds"] = round(self.deadline - now, 3)
+        else:
+            info["running_seconds"] = round(now - self.started_at, 3)
+        return info
+
+
+@dataclass
+class JobClassStats:
+    submitted: int = 0
+    coalesced: int = 0
+    """提交时同键任务仍在排队、被合并的次数"""
+    dropped: int = 0
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    deferred: int = 0
+    """因回复繁忙被推迟过的任务数"""
+    forced: int = 0
+    """推迟到期后在繁忙状态下开始执行的任务数"""
+    wait_times: Deque[float] = field(default_factory=lambda: deque(maxlen=WAIT_TIME_WINDOW))
+
+
+class BackgroundJobScheduler:
+    """
+    后台任务调度器
+
+    记忆构建、表达学习、关系构建、情绪更新、表情包注册等维护任务统一在这里排队，
+    按类别优先级和并发上限执行，避免与回复生成同时争抢模型配额。
+    有回复正在生成或最近的回复耗时偏高时推迟任务，但每个任务最多推迟该类别的 max_defer_seconds。
+    同一个键的任务在排队期间只保留最新提交的一个。
+    """
+
+    def __init__(self) -> None:
+        self._queues: Dict[JobClass, Deque[BackgroundJob]] = {job_class: deque() for job_class in JobClass}
+        self._queued_by_key: Dict[str, BackgroundJob] = {}
+        self._running: Dict[int, BackgroundJob] = {}
+        self._running_per_class: Dict[JobClass, int] = {job_class: 0 for job_class in JobClass}
+        self._ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._dispatcher_running = False
+
+        self._active_interactive = 0
+        self._reply_latency: Optional[float] = None
+        self._last_reply_at = 0.0
+        self.stats: Dict[JobClass, JobClassStats] = {job_class: JobClassStats() for job_class in JobClass}
+
+    # === 提交任务 ===
+
+    def submit(self, job_class: JobClass, key: Optional[str], func: Callable[[], Awaitable[Any]]) -> BackgroundJob:
+        """
+        提交后台任务，不等待执行
+
+        Args:
+            job_class: 任务类别
+            key: 去重键，同键任务仍在排队时用新任务替换（保留原来的排队位置），为None时不去重
+            func: 无参数的异步函数，开始执行时才会调用
+        """
+        stats = self.stats[job_class]
+        stats.submitted += 1
+        if key is not None and (queued := self._queued_by_key.get(key)):
+            queued.func = func
+            queued.context = contextvars.copy_context()
+            stats.coalesced += 1
+            return queued
+
+        now = time.time()
+        job = BackgroundJob(
+            job_id=next(self._ids),
+            job_class=job_class,
+            key=key,
+            func=func,
+            context=contextvars.copy_context(),
+            submitted_at=now,
+            deadline=now + JOB_CLASS_POLICIES[job_class].max_defer_seconds,
+        )
+        queue = self._queues[job_class]
+        if len(queue) >= MAX_QUEUED_PER_CLASS:
+            dropped = queue.popleft()
+            self._forget_queued(dropped)
+            for waiter in dropped.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+            stats.dropped += 1
+            logger.warning(f"后台任务队列 {job_class.value} 已满，丢弃最早的任务 {dropped.key or dropped.job_id}")
+        queue.append(job)
+        if key is not None:
+            self._queued_by_key[key] = job
+        self._wakeup.set()
+        return job
+
+    async def run(self, job_class: JobClass, key: Optional[str], func: Callable[[], Awaitable[Any]]) -> Any:
+        """提交后台任务并等待其完成，返回任务结果（任务抛出的异常会原样抛出）"""
+        job = self.submit(job_class, key, func)
+        waiter = asyncio.get_running_loop().create_future()
+        job.waiters.append(waiter)
+        return await waiter
+
+    # === 回复负载 ===
+
+    @contextmanager
+    def track_interactive(self):
+        """标记一次回复处理，期间推迟后台任务，结束时记录耗时"""
+        self._active_interactive += 1
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self._active_interactive -= 1
+            self.report_reply_latency(time.time() - start_time)
+
+    def report_reply_latency(self, latency: float) -> None:
+        if self._reply_latency is None:
+            self._reply_latency = latency
+        else:
+            self._reply_latency += REPLY_LATENCY_ALPHA * (latency - self._reply_latency)
+        self._last_reply_at = time.time()
+        self._wakeup.set()
+
+    def is_busy(self, now: Optional[float] = None) -> bool:
+        """是否应推迟后台任务：有回复正在处理，或最近的回复耗时偏高"""
+        now = time.time() if now is None else now
+        if self._active_interactive > 0:
+            return True
+        return (
+            self._reply_latency is not None
+            and self._reply_latency > REPLY_LATENCY_THRESHOLD
+            and now - self._last_reply_at < REPLY_LATENCY_STALE_SECONDS
+        )
+
+    # === 调度 ===
+
+    async def run_dispatcher(self) -> None:
+        """调度循环，由 BackgroundJobDispatchTask 在 AsyncTaskManager 中运行"""
+        self._dispatcher_running = True
+        try:
+            while True:
+                self._wakeup.clear()
+                has_deferred = self._dispatch()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=DEFER_CHECK_INTERVAL if has_deferred else None)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._dispatcher_running = False
+            for job in list(self._running.values()):
+                if job.task and not job.task.done():
+                    job.task.cancel()
+
+    def _dispatch(self) -> bool:
+        """启动可以运行的任务，返回是否有任务因繁忙被推迟"""
+        now = time.time()
+        busy = self.is_busy(now)
+        has_deferred = False
+        for job_class in sorted(JobClass, key=lambda c: JOB_CLASS_POLICIES[c].priority):
+            policy = JOB_CLASS_POLICIES[job_class]
+            queue = self._queues[job_class]
+            while (
+                queue
+                and len(self._running) < MAX_RUNNING_JOBS
+                and self._running_per_class[job_class] < policy.max_concurrency
+            ):
+                job = queue[0]
+                if busy and now < job.deadline:
+                    # 同类别任务的推迟时长相同，队首未到期则后面的也未到期
+                    if not job.deferred:
+                        job.deferred = True
+                        self.stats[job_class].deferred += 1
+                    has_deferred = True
+                    break
+                if busy:
+                    self.stats[job_class].forced += 1
+                queue.popleft()
+                self._forget_queued(job)
+                self._start(job, now)
+        return has_deferred
+
+    def _forget_queued(self, job: BackgroundJob) -> None:
+        if job.key is not None and self._queued_by_key.get(job.key) is job:
+            del self._queued_by_key[job.key]
+
+    def _start(self, job: BackgroundJob, now: float) -> None:
+        job.started_at = now
+        stats = self.stats[job.job_class]
+        stats.started += 1
+        stats.wait_times.append(now - job.submitted_at)
+        self._running[job.job_id] = job
+        self._running_per_class[job.job_class] += 1
+        # 在提交时上下文的副本中创建任务
+        job.task = job.context.run(asyncio.create_task, self._run_job(job))
+        job.task.set_name(f"background-{job.job_class.value}-{job.job_id}")
+
+    async def _run_job(self, job: BackgroundJob) -> None:
+        stats = self.stats[job.job_class]
+        try:
+            result = await job.func()
+        except asyncio.CancelledError:
+            for waiter in job.waiters:
+                if not waiter.done():
+                    waiter.cancel()
+            raise
+        except Exception as e:
+            stats.failed += 1
+            if job.waiters:
+                for waiter in job.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+            else:
+                logger.error(f"后台任务 {job.job_class.value}:{job.key or job.job_id} 执行失败: {e}", exc_info=True)
+        else:
+            stats.completed += 1
+            for waiter in job.waiters:
+                if not waiter.done():
+                    waiter.set_result(result)
+        finally:
+            self._running.pop(job.job_id, None)
+            self._running_per_class[job.job_class] -= 1
+            self._wakeup.set()
+
+    # === 状态 ===
+
+    def get_status(self) -> dict:
+        """排队中和运行中的任务及其等待时间，以及各类别的累计统计"""
+        now = time.time()
+        classes = {}
+        for job_class, stats in self.stats.items():
+            wait_times = stats.wait_times
+            classes[job_class.value] = {
+                "queued": len(self._queues[job_class]),
+                "running": self._running_per_class[job_class],
+                "submitted": stats.submitted,
+                "coalesced": stats.coalesced,
+                "dropped": stats.dropped,
+                "started": stats.started,
+                "completed": stats.completed,
+                "failed": stats.failed,
+                "deferred": stats.deferred,
+                "forced": stats.forced,
+                "avg_wait_seconds": sum(wait_times) / len(wait_times) if wait_times else 0.0,
+                "max_wait_seconds": max(wait_times) if wait_times else 0.0,
+            }
+        return {
+            "dispatcher_running": self._dispatcher_running,
+            "busy": self.is_busy(now),
+            "active_interactive": self._active_interactive,
+            "reply_latency": self._reply_latency,
+            "queued": [job.to_dict(now) for queue in self._queues.values() for job in queue],
+            "running": [job.to_dict(now) for job in self._running.values()],
+            "classes": classes,
+            "tasks": async_task_manager.get_tasks_status(),
+        }
+
+
+background_job_scheduler = BackgroundJobScheduler()
+"""全局后台任务调度器实例"""
+
+
+class BackgroundJobDispatchTask(AsyncTask):
+    """在 AsyncTaskManager 中运行后台任务调度循环"""
+
+    def __init__(self):
+        super().__init__(task_name="Background Job Dispatcher")
+
+    async def run(self):
+        await background_job_scheduler.run_dispatcher()
+
+
+router = APIRouter()
+
+
+@router.get("/background_jobs")
+async def get_background_jobs():
+    """后台任务调度状态"""
+    return background_job_scheduler.get_status()
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from src.common.logger import get_logger
+
+logger = get_logger("startup")
+
+
+@dataclass
+class StartupComponent:
+    """启动图中的一个子系统"""
+
+    name: str
+    func: Callable[[], Any]
+    """初始化函数，可以是同步函数或返回协程的函数"""
+    depends_on: List[str] = field(default_factory=list)
+    blocking: bool = False
+    """同步且耗时的初始化函数（读取大量文件或数据库），放到线程中执行，避免阻塞事件循环"""
+
+    state: str = "pending"
+    """pending / running / done / failed / skipped"""
+    started_at: float = 0.0
+    """相对启动图开始运行的时间（秒）"""
+    duration: float = 0.0
+    error: Optional[BaseException] = None
+
+
+class StartupGraph:
+    """
+    声明依赖关系的启动图
+
+    每个子系统在其依赖全部完成后立即开始初始化，互不依赖的子系统并发执行，
+    运行结束后输出各子系统的开始时间和耗时，便于发现拖慢启动的部分。
+    某个子系统失败时，依赖它的子系统会被跳过，其他子系统照常初始化，最后抛出第一个错误。
+    """
+
+    def __init__(self) -> None:
+        self.components: Dict[str, StartupComponent] = {}
+        self.total_time: float = 0.0
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        depends_on: Sequence[str] = (),
+        blocking: bool = False,
+    ) -> None:
+        if name in self.components:
+            raise ValueError(f"启动组件 {name} 重复注册")
+        self.components[name] = StartupComponent(name, func, list(depends_on), blocking)
+
+    def _check(self) -> None:
+        """检查依赖是否都已注册且不存在循环依赖"""
+        for component in self.components.values():
+            for dependency in component.depends_on:
+                if dependency not in self.components:
+                    raise ValueError(f"启动组件 {component.name} 依赖了未注册的组件 {dependency}")
+
+        visiting, visited = set(), set()
+
+        def visit(name: str, path: List[str]) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"启动组件存在循环依赖: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in self.components[name].depends_on:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.components:
+            visit(name, [])
+
+    async def run(self) -> None:
+        self._check()
+        start_time = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_component(component: StartupComponent) -> None:
+            if component.depends_on:
+                await asyncio.gather(*(tasks[name] for name in component.depends_on))
+            failed = [name for name in component.depends_on if self.components[name].state != "done"]
+            if failed:
+                component.state = "skipped"
+                component.started_at = time.perf_counter() - start_time
+                logger.warning(f"启动组件 {component.name} 的依赖 {', '.join(failed)} 未能完成，跳过")
+                return
+
+            component.state = "running"
+            component.started_at = time.perf_counter() - start_time
+            try:
+                if component.blocking:
+                    result = await asyncio.to_thread(component.func)
+                else:
+                    result = component.func()
+                if asyncio.iscoroutine(result):
+                    await result
+                component.state = "done"
+            except Exception as e:
+                component.state = "failed"
+                component.error = e
+                logger.exception(f"启动组件 {component.name} 初始化失败: {e}")
+            component.duration = time.perf_counter() - start_time - component.started_at
+
+        # 先创建全部任务再开始等待，依赖的任务总是已经存在
+        for name, component in self.components.items():
+            tasks[name] = asyncio.create_task(run_component(component))
+        await asyncio.gather(*tasks.values())
+        self.total_time = time.perf_counter() - start_time
+
+        self.log_report()
+        for component in self.components.values():
+            if component.error is not None:
+                raise component.error
+
+    def get_report(self) -> List[dict]:
+        """按开始时间排序的各组件启动情况"""
+        return [
+            {
+                "name": component.name,
+                "state": component.state,
+                "started_at": round(component.started_at, 3),
+                "duration": round(component.duration, 3),
+                "blocking": component.blocking,
+                "depends_on": component.depends_on,
+            }
+            for component in sorted(self.components.values(), key=lambda c: c.started_at)
+        ]
+
+    def log_report(self) -> None:
+        serial_time = sum(component.duration for component in self.components.values())
+        lines = [f"启动耗时 {self.total_time:.2f}秒（各组件耗时合计 {serial_time:.2f}秒）："]
+        for item in self.get_report():
+            mode = "线程" if item["blocking"] else "协程"
+            lines.append(
+                f"  {item['name']:<20} 开始 {item['started_at']:>7.2f}s  耗时 {item['duration']:>7.2f}s  [{mode}] {item['state']}"
+            )
+        logger.info("\n".join(lines))
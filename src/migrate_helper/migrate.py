@@ -288,6 +288,55 @@ async def set_all_person_known():
         raise
 
 
+async def backfill_memory_keywords(batch_size: int = 500):
+    """
+    为已有的即时记忆补建关键词倒排索引(memory_keyword表)
+    已经建立过索引的记忆会被跳过，可以重复执行
+    """
+    logger.info("开始补建即时记忆关键词索引...")
+
+    from src.common.database.database import db
+    from src.common.database.database_model import Memory, MemoryKeyword
+    from src.chat.memory_system.instant_memory import parse_stored_keywords
+
+    indexed_ids = {row.memory_id for row in MemoryKeyword.select(MemoryKeyword.memory_id).distinct()}
+    rows = []
+    memory_count = 0
+    for memory in Memory.select(Memory.memory_id, Memory.chat_id, Memory.keywords, Memory.create_time):
+        if memory.memory_id in indexed_ids:
+            continue
+        try:
+            keywords = parse_stored_keywords(memory.keywords)
+        except Exception as e:
+            logger.warning(f"解析记忆 {memory.memory_id} 的关键词失败，跳过: {e}")
+            continue
+        memory_count += 1
+        rows.extend(
+            {
+                "keyword": keyword,
+                "chat_id": memory.chat_id,
+                "memory_id": memory.memory_id,
+                "create_time": memory.create_time,
+            }
+            for keyword in keywords
+        )
+
+    with db.atomic():
+        for i in range(0, len(rows), batch_size):
+            MemoryKeyword.insert_many(rows[i : i + batch_size]).execute()
+
+    logger.info(f"即时记忆关键词索引补建完成: {memory_count} 条记忆, {len(rows)} 个关键词")
+    return {"memories": memory_count, "keywords": len(rows)}
+
+async def migrate_relationship_caches():
+    """
+    将 data/relationship 下旧版按聊天保存的pickle关系缓存导入 relationship_segment 表
+    """
+    from src.person_info.relationship_builder import import_all_legacy_relationship_caches
+
+    if imported := import_all_legacy_relationship_caches():
+        logger.info(f"已将 {imported} 个旧版关系缓存文件导入数据库")
+
 
 async def check_and_run_migrations():
     # 获取根目录
@@ -309,4 +358,15 @@ async def check_and_run_migrations():
         # 创建done.mem文件
         with open(done_file, "w", encoding="utf-8") as f:
             f.write("done")
+
+    # 即时记忆关键词索引的补建单独标记，已完成旧迁移的实例也会执行一次
+    keyword_done_file = os.path.join(temp_dir, "memory_keyword.done")
+    if not os.path.exists(keyword_done_file):
+        os.makedirs(temp_dir, exist_ok=True)
+        await backfill_memory_keywords()
+        with open(keyword_done_file, "w", encoding="utf-8") as f:
+            f.write("done")
+
+    # 旧版pickle关系缓存导入数据库，导入后的文件会被重命名，可以重复执行
+    await migrate_relationship_caches()
         
\ No newline at end of file
@@ -3,9 +3,13 @@ import traceback
 import os
 import pickle
 import random
+import glob
 from typing import List, Dict, Any
 from src.config.config import global_config
+from src.common.database.database import db
+from src.common.database.database_model import RelationshipSegment, RelationshipBuilderState
 from src.common.logger import get_logger
+from src.manager.background_job_scheduler import JobClass, background_job_scheduler
 from src.person_info.relationship_manager import get_relationship_manager
 from src.person_info.person_info import Person,get_person_id
 from src.chat.message_receive.chat_stream import get_chat_manager
@@ -15,10 +19,13 @@ from src.chat.utils.chat_message_builder import (
     get_raw_msg_before_timestamp_with_chat,
     num_new_messages_since,
 )
-import asyncio
+import functools
 
 logger = get_logger("relationship_builder")
 
+# 旧版按聊天保存的pickle缓存，启动后导入数据库并重命名
+LEGACY_CACHE_DIR = os.path.join("data", "relationship")
+
 # 消息段清理配置
 SEGMENT_CLEANUP_CONFIG = {
     "enable_cleanup": True,  # 是否启用清理
@@ -46,11 +53,9 @@ class RelationshipBuilder:
         self.chat_id = chat_id
         # 新的消息段缓存结构：
         # {person_id: [{"start_time": float, "end_time": float, "last_msg_time": float, "message_count": int}, ...]}
+        # 每个消息段的 "id" 为其在 relationship_segment 表中的行id
         self.person_engaged_cache: Dict[str, List[Dict[str, Any]]] = {}
 
-        # 持久化存储文件路径
-        self.cache_file_path = os.path.join("data", "relationship", f"relationship_cache_{self.chat_id}.pkl")
-
         # 最后处理的消息时间，避免重复处理相同消息
         current_time = time.time()
         self.last_processed_message_time = current_time
@@ -74,40 +79,78 @@ class RelationshipBuilder:
     # ================================
 
     def _load_cache(self):
-        """从文件加载持久化的缓存"""
-        if os.path.exists(self.cache_file_path):
-            try:
-                with open(self.cache_file_path, "rb") as f:
-                    cache_data = pickle.load(f)
-                    # 新格式：包含额外信息的缓存
-                    self.person_engaged_cache = cache_data.get("person_engaged_cache", {})
-                    self.last_processed_message_time = cache_data.get("last_processed_message_time", 0.0)
-                    self.last_cleanup_time = cache_data.get("last_cleanup_time", 0.0)
-
-                logger.info(
-                    f"{self.log_prefix} 成功加载关系缓存，包含 {len(self.person_engaged_cache)} 个用户，最后处理时间：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_processed_message_time)) if self.last_processed_message_time > 0 else '未设置'}"
+        """从数据库加载该聊天的消息段与处理进度，首次加载时导入旧版pickle缓存"""
+        try:
+            if not RelationshipBuilderState.select().where(RelationshipBuilderState.chat_id == self.chat_id).exists():
+                import_legacy_relationship_cache(self.chat_id)
+
+            if state := RelationshipBuilderState.get_or_none(RelationshipBuilderState.chat_id == self.chat_id):
+                self.last_processed_message_time = state.last_processed_message_time
+                self.last_cleanup_time = state.last_cleanup_time
+
+            self.person_engaged_cache = {}
+            query = (
+                RelationshipSegment.select()
+                .where(RelationshipSegment.chat_id == self.chat_id)
+                .order_by(RelationshipSegment.start_time)
+            )
+            for row in query:
+                self.person_engaged_cache.setdefault(row.person_id, []).append(
+                    {
+                        "id": row.id,
+                        "start_time": row.start_time,
+                        "end_time": row.end_time,
+                        "last_msg_time": row.last_msg_time,
+                        "message_count": row.message_count,
+                    }
                 )
-            except Exception as e:
-                logger.error(f"{self.log_prefix} 加载关系缓存失败: {e}")
-                self.person_engaged_cache = {}
-                self.last_processed_message_time = 0.0
-        else:
-            logger.info(f"{self.log_prefix} 关系缓存文件不存在，使用空缓存")
 
-    def _save_cache(self):
-        """保存缓存到文件"""
+            logger.info(
+                f"{self.log_prefix} 成功加载关系缓存，包含 {len(self.person_engaged_cache)} 个用户，最后处理时间：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_processed_message_time)) if self.last_processed_message_time > 0 else '未设置'}"
+            )
+        except Exception as e:
+            logger.error(f"{self.log_prefix} 加载关系缓存失败: {e}")
+            self.person_engaged_cache = {}
+
+    def _save_state(self):
+        """保存处理进度"""
+        try:
+            RelationshipBuilderState.insert(
+                chat_id=self.chat_id,
+                last_processed_message_time=self.last_processed_message_time,
+                last_cleanup_time=self.last_cleanup_time,
+            ).on_conflict(
+                conflict_target=[RelationshipBuilderState.chat_id],
+                preserve=[RelationshipBuilderState.last_processed_message_time, RelationshipBuilderState.last_cleanup_time],
+            ).execute()
+        except Exception as e:
+            logger.error(f"{self.log_prefix} 保存关系构建进度失败: {e}")
+
+    def _save_segment(self, person_id: str, segment: Dict[str, Any]):
+        """写入单个消息段，新消息段写入后记录其行id"""
         try:
-            os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
-            cache_data = {
-                "person_engaged_cache": self.person_engaged_cache,
-                "last_processed_message_time": self.last_processed_message_time,
-                "last_cleanup_time": self.last_cleanup_time,
+            fields = {
+                "start_time": segment["start_time"],
+                "end_time": segment["end_time"],
+                "last_msg_time": segment["last_msg_time"],
+                "message_count": segment["message_count"],
             }
-            with open(self.cache_file_path, "wb") as f:
-                pickle.dump(cache_data, f)
-            logger.debug(f"{self.log_prefix} 成功保存关系缓存")
+            if "id" in segment:
+                RelationshipSegment.update(**fields).where(RelationshipSegment.id == segment["id"]).execute()
+            else:
+                segment["id"] = RelationshipSegment.insert(
+                    person_id=person_id, chat_id=self.chat_id, **fields
+                ).execute()
+        except Exception as e:
+            logger.error(f"{self.log_prefix} 保存消息段失败: {e}")
+
+    def _delete_segments(self, segment_ids: List[int]):
+        """删除指定的消息段"""
+        try:
+            for i in range(0, len(segment_ids), 500):
+                RelationshipSegment.delete().where(RelationshipSegment.id.in_(segment_ids[i : i + 500])).execute()  # type: ignore
         except Exception as e:
-            logger.error(f"{self.log_prefix} 保存关系缓存失败: {e}")
+            logger.error(f"{self.log_prefix} 删除消息段失败: {e}")
 
     # ================================
     # 消息段管理模块
@@ -117,6 +160,8 @@ class RelationshipBuilder:
     def _update_message_segments(self, person_id: str, message_time: float):
         """更新用户的消息段
 
+        消息数随消息增量累加，不再重新统计整个时间范围
+
         Args:
             person_id: 用户ID
             message_time: 消息时间戳
@@ -139,16 +184,17 @@ class RelationshipBuilder:
                 "start_time": potential_start_time,
                 "end_time": message_time,
                 "last_msg_time": message_time,
-                "message_count": self._count_messages_in_timerange(potential_start_time, message_time),
+                # 段内包含前面的消息和当前消息
+                "message_count": len(before_messages) + 1,
             }
             segments.append(new_segment)
+            self._save_segment(person_id, new_segment)
 
             person = Person(person_id=person_id)
             person_name = person.person_name or person_id
             logger.debug(
                 f"{self.log_prefix} 眼熟用户 {person_name} 在 {time.strftime('%H:%M:%S', time.localtime(potential_start_time))} - {time.strftime('%H:%M:%S', time.localtime(message_time))} 之间有 {new_segment['message_count']} 条消息"
             )
-            self._save_cache()
             return
 
         # 获取最后一个消息段
@@ -158,50 +204,40 @@ class RelationshipBuilder:
         messages_between = self._count_messages_between(last_segment["last_msg_time"], message_time)
 
         if messages_between <= 10:
-            # 在10条消息内，延伸当前消息段
+            # 在10条消息内，延伸当前消息段，累加中间的消息和当前消息
             last_segment["end_time"] = message_time
             last_segment["last_msg_time"] = message_time
-            # 重新计算整个消息段的消息数量
-            last_segment["message_count"] = self._count_messages_in_timerange(
-                last_segment["start_time"], last_segment["end_time"]
-            )
+            last_segment["message_count"] += messages_between + 1
+            self._save_segment(person_id, last_segment)
             logger.debug(f"{self.log_prefix} 延伸用户 {person_id} 的消息段: {last_segment}")
-        else:
-            # 超过10条消息，结束当前消息段并创建新的
-            # 结束当前消息段：延伸到原消息段最后一条消息后5条消息的时间
-            current_time = time.time()
-            after_messages = get_raw_msg_by_timestamp_with_chat(
-                self.chat_id, last_segment["last_msg_time"], current_time, limit=5, limit_mode="earliest"
-            )
-            if after_messages and len(after_messages) >= 5:
-                # 如果有足够的后续消息，使用第5条消息的时间作为结束时间
-                last_segment["end_time"] = after_messages[4]["time"]
-
-            # 重新计算当前消息段的消息数量
-            last_segment["message_count"] = self._count_messages_in_timerange(
-                last_segment["start_time"], last_segment["end_time"]
-            )
-
-            # 创建新的消息段
-            new_segment = {
-                "start_time": potential_start_time,
-                "end_time": message_time,
-                "last_msg_time": message_time,
-                "message_count": self._count_messages_in_timerange(potential_start_time, message_time),
-            }
-            segments.append(new_segment)
-            person = Person(person_id=person_id)
-            person_name = person.person_name or person_id
-            logger.debug(
-                f"{self.log_prefix} 重新眼熟用户 {person_name} 创建新消息段（超过10条消息间隔）: {new_segment}"
-            )
-
-        self._save_cache()
+            return
 
-    def _count_messages_in_timerange(self, start_time: float, end_time: float) -> int:
-        """计算指定时间范围内的消息数量（包含边界）"""
-        messages = get_raw_msg_by_timestamp_with_chat_inclusive(self.chat_id, start_time, end_time)
-        return len(messages)
+        # 超过10条消息，结束当前消息段并创建新的
+        # 结束当前消息段：延伸到原消息段最后一条消息后5条消息的时间
+        current_time = time.time()
+        after_messages = get_raw_msg_by_timestamp_with_chat(
+            self.chat_id, last_segment["last_msg_time"], current_time, limit=5, limit_mode="earliest"
+        )
+        if after_messages and len(after_messages) >= 5:
+            # 如果有足够的后续消息，使用第5条消息的时间作为结束时间，并计入这些消息
+            last_segment["end_time"] = after_messages[4]["time"]
+            last_segment["message_count"] += len(after_messages)
+            self._save_segment(person_id, last_segment)
+
+        # 创建新的消息段
+        new_segment = {
+            "start_time": potential_start_time,
+            "end_time": message_time,
+            "last_msg_time": message_time,
+            "message_count": len(before_messages) + 1,
+        }
+        segments.append(new_segment)
+        self._save_segment(person_id, new_segment)
+        person = Person(person_id=person_id)
+        person_name = person.person_name or person_id
+        logger.debug(
+            f"{self.log_prefix} 重新眼熟用户 {person_name} 创建新消息段（超过10条消息间隔）: {new_segment}"
+        )
 
     def _count_messages_between(self, start_time: float, end_time: float) -> int:
         """计算两个时间点之间的消息数量（不包含边界），用于间隔检查"""
@@ -239,6 +275,7 @@ class RelationshipBuilder:
         max_segments_per_user = SEGMENT_CLEANUP_CONFIG["max_segments_per_user"]
 
         users_to_remove = []
+        removed_segment_ids = []
 
         for person_id, segments in self.person_engaged_cache.items():
             cleanup_stats["total_segments_before"] += len(segments)
@@ -252,6 +289,8 @@ class RelationshipBuilder:
                     segments_after_age_cleanup.append(segment)
                 else:
                     cleanup_stats["segments_removed"] += 1
+                    if "id" in segment:
+                        removed_segment_ids.append(segment["id"])
                     logger.debug(
                         f"{self.log_prefix} 移除用户 {person_id} 的过期消息段: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(segment['start_time']))} - {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(segment['end_time']))}"
                     )
@@ -262,7 +301,13 @@ class RelationshipBuilder:
                 segments_after_age_cleanup.sort(key=lambda x: x["end_time"], reverse=True)
                 segments_removed_count = len(segments_after_age_cleanup) - max_segments_per_user
                 cleanup_stats["segments_removed"] += segments_removed_count
-                segments_after_age_cleanup = segments_after_age_cleanup[:max_segments_per_user]
+                removed_segment_ids.extend(
+                    segment["id"] for segment in segments_after_age_cleanup[max_segments_per_user:] if "id" in segment
+                )
+                # 保留的消息段恢复为时间正序，最后一个仍是最新的消息段
+                segments_after_age_cleanup = sorted(
+                    segments_after_age_cleanup[:max_segments_per_user], key=lambda x: x["start_time"]
+                )
                 logger.debug(
                     f"{self.log_prefix} 用户 {person_id} 消息段数量过多，移除 {segments_removed_count} 个最老的消息段"
                 )
@@ -285,10 +330,11 @@ class RelationshipBuilder:
 
         # 更新最后清理时间
         self.last_cleanup_time = current_time
+        self._save_state()
 
-        # 保存缓存
+        # 删除被清理的消息段
         if cleanup_stats["segments_removed"] > 0 or users_to_remove:
-            self._save_cache()
+            self._delete_segments(removed_segment_ids)
             logger.info(
                 f"{self.log_prefix} 清理完成 - 影响用户: {cleanup_stats['users_cleaned']}, 移除消息段: {cleanup_stats['segments_removed']}, 移除用户: {len(users_to_remove)}"
             )
@@ -375,6 +421,8 @@ class RelationshipBuilder:
                     )
                     self.last_processed_message_time = max(self.last_processed_message_time, msg_time)
 
+            self._save_state()
+
         # 1. 检查是否有用户达到关系构建条件（总消息数达到45条）
         users_to_build_relationship = []
         for person_id, segments in self.person_engaged_cache.items():
@@ -401,10 +449,14 @@ class RelationshipBuilder:
             # 异步执行关系构建
             person = Person(person_id=person_id)
             if person.is_known: 
-                asyncio.create_task(self.update_impression_on_segments(person_id, self.chat_id, segments))
+                background_job_scheduler.submit(
+                    JobClass.RELATION,
+                    None,
+                    functools.partial(self.update_impression_on_segments, person_id, self.chat_id, segments),
+                )
             # 移除已处理的用户缓存
             del self.person_engaged_cache[person_id]
-            self._save_cache()
+            self._delete_segments([segment["id"] for segment in segments if "id" in segment])
             
 
     # ================================
@@ -485,3 +537,57 @@ class RelationshipBuilder:
         except Exception as e:
             logger.error(f"为 {person_id} 更新印象时发生错误: {e}")
             logger.error(traceback.format_exc())
+
+
+def import_legacy_relationship_cache(chat_id: str) -> bool:
+    """将旧版pickle关系缓存导入数据库，导入后把文件重命名为 .migrated
+
+    Returns:
+        bool: 是否导入了缓存文件
+    """
+    cache_file_path = os.path.join(LEGACY_CACHE_DIR, f"relationship_cache_{chat_id}.pkl")
+    if not os.path.exists(cache_file_path):
+        return False
+
+    with open(cache_file_path, "rb") as f:
+        cache_data = pickle.load(f)
+
+    rows = [
+        {
+            "person_id": person_id,
+            "chat_id": chat_id,
+            "start_time": segment["start_time"],
+            "end_time": segment["end_time"],
+            "last_msg_time": segment.get("last_msg_time", segment["end_time"]),
+            "message_count": segment.get("message_count", 0),
+        }
+        for person_id, segments in cache_data.get("person_engaged_cache", {}).items()
+        for segment in segments
+    ]
+    with db.atomic():
+        # 已有进度说明该聊天已经导入过，不重复写入消息段
+        if not RelationshipBuilderState.select().where(RelationshipBuilderState.chat_id == chat_id).exists():
+            for i in range(0, len(rows), 100):
+                RelationshipSegment.insert_many(rows[i : i + 100]).execute()
+            RelationshipBuilderState.create(
+                chat_id=chat_id,
+                last_processed_message_time=cache_data.get("last_processed_message_time", 0.0),
+                last_cleanup_time=cache_data.get("last_cleanup_time", 0.0),
+            )
+
+    os.replace(cache_file_path, f"{cache_file_path}.migrated")
+    logger.info(f"[{chat_id}] 已将旧版关系缓存导入数据库，共 {len(rows)} 个消息段")
+    return True
+
+
+def import_all_legacy_relationship_caches() -> int:
+    """导入所有旧版pickle关系缓存，返回导入的文件数"""
+    imported = 0
+    prefix = "relationship_cache_"
+    for path in glob.glob(os.path.join(LEGACY_CACHE_DIR, f"{prefix}*.pkl")):
+        chat_id = os.path.basename(path)[len(prefix) : -len(".pkl")]
+        try:
+            imported += import_legacy_relationship_cache(chat_id)
+        except Exception as e:
+            logger.error(f"导入旧版关系缓存 {path} 失败: {e}")
+    return imported
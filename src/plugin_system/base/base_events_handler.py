@@ -23,6 +23,8 @@ class BaseEventHandler(ABC):
     """处理器权重，越大权重越高"""
     intercept_message: bool = False
     """是否拦截消息，默认为否"""
+    timeout: Optional[float] = None
+    """拦截型处理器的执行超时（秒），为 None 时使用默认值；同一权重的拦截型处理器会并发执行"""
 
     def __init__(self):
         self.log_prefix = "[EventHandler]"
@@ -0,0 +1,172 @@
+import re
+
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse  # type: ignore
+
+# 含有反向引用的正则合并后组号会错位，不参与兜底合并预筛
+_BACKREF_PATTERN = re.compile(r"\\[1-9]|\(\?P=")
+
+
+def _is_index_safe_char(char: str) -> bool:
+    """判断字符在忽略大小写匹配下能否用 lower() 可靠归一
+
+    ASCII 字符与无大小写的字符（如中文）可以；其余带大小写的非 ASCII 字符
+    （如 ſ、K）在正则的忽略大小写规则下存在特殊等价关系，不参与索引。
+    """
+    return char.isascii() or (char.lower() == char and char.upper() == char)
+
+
+def _collect_literal_prefix(tokens, prefix: List[str]) -> bool:
+    """沿解析树收集开头的字面量前缀，返回整段是否都是字面量"""
+    for op, arg in tokens:
+        if op is sre_parse.AT and arg in (sre_parse.AT_BEGINNING, sre_parse.AT_BEGINNING_STRING):
+            continue
+        if op is sre_parse.LITERAL:
+            char = chr(arg)
+            if not _is_index_safe_char(char):
+                return False
+            prefix.append(char.lower())
+            continue
+        if op is sre_parse.SUBPATTERN:
+            # (group, add_flags, del_flags, pattern)
+            _, add_flags, del_flags, sub_tokens = arg
+            if add_flags or del_flags:
+                return False
+            if not _collect_literal_prefix(sub_tokens, prefix):
+                return False
+            continue
+        return False
+    return True
+
+
+def extract_literal_prefix(pattern: str, flags: int = 0) -> str:
+    """从正则中提取开头的字面量前缀（已转为小写），无法提取时返回空串"""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except re.error:
+        return ""
+    prefix: List[str] = []
+    _collect_literal_prefix(list(parsed), prefix)
+    return "".join(prefix)
+
+
+class CommandIndex:
+    """命令正则的前缀索引
+
+    按从正则中提取的字面量前缀对命令分桶，查找时只匹配文本前缀命中的桶，
+    无前缀的正则通过一个合并的预筛正则统一判断，保持注册顺序优先。
+    命令正则统一以 re.IGNORECASE | re.DOTALL 编译，并使用 match 语义。
+    """
+
+    def __init__(self, flags: int = re.IGNORECASE | re.DOTALL):
+        self.flags = flags
+        self._seq = 0
+        self._entries: Dict[Pattern, Tuple[int, str]] = {}
+        """正则 -> (注册序号, command名)"""
+        self._buckets: Dict[str, List[Pattern]] = {}
+        """字面量前缀 -> 正则列表"""
+        self._prefix_lengths: List[int] = []
+        self._fallback: List[Pattern] = []
+        """无法提取前缀的正则"""
+        self._fallback_filter: Optional[Pattern] = None
+        self._fallback_standalone: Set[Pattern] = set()
+        self._fallback_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, pattern: Pattern, command_name: str) -> None:
+        """添加命令正则"""
+        if pattern in self._entries:
+            # 重复添加时保留原注册顺序
+            self._entries[pattern] = (self._entries[pattern][0], command_name)
+            return
+        self._seq += 1
+        self._entries[pattern] = (self._seq, command_name)
+        if prefix := extract_literal_prefix(pattern.pattern, self.flags):
+            self._buckets.setdefault(prefix, []).append(pattern)
+            self._refresh_prefix_lengths()
+        else:
+            self._fallback.append(pattern)
+            self._fallback_dirty = True
+
+    def remove(self, pattern: Pattern) -> None:
+        """移除命令正则"""
+        if self._entries.pop(pattern, None) is None:
+            return
+        for prefix, patterns in list(self._buckets.items()):
+            if pattern in patterns:
+                patterns.remove(pattern)
+                if not patterns:
+                    del self._buckets[prefix]
+                    self._refresh_prefix_lengths()
+                return
+        self._fallback.remove(pattern)
+        self._fallback_dirty = True
+
+    def rebuild(self, patterns: Dict[Pattern, str]) -> None:
+        """按给定的注册顺序重建索引"""
+        self._entries.clear()
+        self._buckets.clear()
+        self._fallback.clear()
+        self._prefix_lengths = []
+        self._fallback_dirty = True
+        for pattern, command_name in patterns.items():
+            self.add(pattern, command_name)
+
+    def _refresh_prefix_lengths(self) -> None:
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._buckets})
+
+    def _compile_fallback_filter(self) -> None:
+        """将无前缀的正则合并为一个预筛正则，无法合并的单独保留"""
+        self._fallback_dirty = False
+        self._fallback_standalone = {p for p in self._fallback if _BACKREF_PATTERN.search(p.pattern)}
+        mergeable = [p.pattern for p in self._fallback if p not in self._fallback_standalone]
+        self._fallback_filter = None
+        if len(mergeable) < 2:
+            # 只有一个正则时预筛没有意义
+            self._fallback_standalone = set(self._fallback)
+            return
+        try:
+            self._fallback_filter = re.compile("|".join(f"(?:{p})" for p in mergeable), self.flags)
+        except re.error:
+            # 例如多个命令使用了同名的命名分组
+            self._fallback_standalone = set(self._fallback)
+
+    def _candidates(self, text: str) -> List[Pattern]:
+        candidates: List[Pattern] = []
+        if self._prefix_lengths:
+            head = text[: self._prefix_lengths[-1]]
+            if all(_is_index_safe_char(char) for char in head):
+                head = head.lower()
+                for length in self._prefix_lengths:
+                    if length > len(head):
+                        break
+                    candidates.extend(self._buckets.get(head[:length], ()))
+            else:
+                # 文本开头含有特殊大小写字符，退化为检查所有带前缀的正则
+                for patterns in self._buckets.values():
+                    candidates.extend(patterns)
+
+        if self._fallback:
+            if self._fallback_dirty:
+                self._compile_fallback_filter()
+            if self._fallback_filter is None or self._fallback_filter.match(text):
+                candidates.extend(self._fallback)
+            else:
+                candidates.extend(self._fallback_standalone)
+
+        candidates.sort(key=lambda p: self._entries[p][0])
+        return candidates
+
+    def find(self, text: str) -> List[Tuple[str, re.Match]]:
+        """按注册顺序返回所有匹配的 (command名, 匹配对象)"""
+        results: List[Tuple[str, re.Match]] = []
+        for pattern in self._candidates(text):
+            if match := pattern.match(text):
+                results.append((self._entries[pattern][1], match))
+        return results
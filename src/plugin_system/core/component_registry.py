@@ -16,6 +16,7 @@ from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.base_action import BaseAction
 from src.plugin_system.base.base_tool import BaseTool
 from src.plugin_system.base.base_events_handler import BaseEventHandler
+from src.plugin_system.core.command_index import CommandIndex
 
 logger = get_logger("component_registry")
 
@@ -50,6 +51,8 @@ class ComponentRegistry:
         """Command类注册表 command名 -> command类"""
         self._command_patterns: Dict[Pattern, str] = {}
         """编译后的正则 -> command名"""
+        self._command_index = CommandIndex()
+        """命令正则的前缀索引，与 _command_patterns 保持同步"""
 
         # 工具特定注册表
         self._tool_registry: Dict[str, Type[BaseTool]] = {}  # 工具名 -> 工具类
@@ -182,9 +185,10 @@ class ComponentRegistry:
 
         # 如果启用了且有匹配模式
         if command_info.enabled and command_info.command_pattern:
-            pattern = re.compile(command_info.command_pattern, re.IGNORECASE | re.DOTALL)
+            pattern = re.compile(command_info.command_pattern, self._command_index.flags)
             if pattern not in self._command_patterns:
                 self._command_patterns[pattern] = command_name
+                self._command_index.add(pattern, command_name)
             else:
                 logger.warning(
                     f"'{command_name}' 对应的命令模式与 '{self._command_patterns[pattern]}' 重复，忽略此命令"
@@ -246,6 +250,7 @@ class ComponentRegistry:
                     keys_to_remove = [k for k, v in self._command_patterns.items() if v == component_name]
                     for key in keys_to_remove:
                         self._command_patterns.pop(key)
+                        self._command_index.remove(key)
                 case ComponentType.TOOL:
                     self._tool_registry.pop(component_name)
                     self._llm_available_tools.pop(component_name)
@@ -306,8 +311,9 @@ class ComponentRegistry:
                 self._default_actions[component_name] = target_component_info
             case ComponentType.COMMAND:
                 assert isinstance(target_component_info, CommandInfo)
-                pattern = target_component_info.command_pattern
-                self._command_patterns[re.compile(pattern)] = component_name
+                pattern = re.compile(target_component_info.command_pattern, self._command_index.flags)
+                self._command_patterns[pattern] = component_name
+                self._command_index.add(pattern, component_name)
             case ComponentType.TOOL:
                 assert isinstance(target_component_info, ToolInfo)
                 assert issubclass(target_component_class, BaseTool)
@@ -345,6 +351,7 @@ class ComponentRegistry:
                     self._default_actions.pop(component_name)
                 case ComponentType.COMMAND:
                     self._command_patterns = {k: v for k, v in self._command_patterns.items() if v != component_name}
+                    self._command_index.rebuild(self._command_patterns)
                 case ComponentType.TOOL:
                     self._llm_available_tools.pop(component_name)
                 case ComponentType.EVENT_HANDLER:
@@ -503,16 +510,17 @@ class ComponentRegistry:
             Tuple: (命令类, 匹配的命名组, 是否拦截消息, 插件名) 或 None
         """
 
-        candidates = [pattern for pattern in self._command_patterns if pattern.match(text)]
+        # 通过前缀索引只检查可能命中的正则，按注册顺序返回
+        candidates = self._command_index.find(text)
         if not candidates:
             return None
         if len(candidates) > 1:
-            logger.warning(f"文本 '{text}' 匹配到多个命令模式: {candidates}，使用第一个匹配")
-        command_name = self._command_patterns[candidates[0]]
+            logger.warning(f"文本 '{text}' 匹配到多个命令模式: {[match.re for _, match in candidates]}，使用第一个匹配")
+        command_name, match = candidates[0]
         command_info: CommandInfo = self.get_registered_command_info(command_name)  # type: ignore
         return (
             self._command_registry[command_name],
-            candidates[0].match(text).groupdict(),  # type: ignore
+            match.groupdict(),
             command_info,
         )
 
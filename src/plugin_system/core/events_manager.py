@@ -1,5 +1,9 @@
 import asyncio
 import contextlib
+import time
+
+from dataclasses import dataclass
+from itertools import groupby
 from typing import List, Dict, Optional, Type, Tuple, Any
 
 from src.chat.message_receive.message import MessageRecv
@@ -11,6 +15,37 @@ from .global_announcement_manager import global_announcement_manager
 
 logger = get_logger("events_manager")
 
+DEFAULT_HANDLER_TIMEOUT = 30.0
+"""拦截型事件处理器的默认执行超时（秒）"""
+
+
+@dataclass
+class HandlerStats:
+    """单个事件处理器的执行统计"""
+
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    last_time: float = 0.0
+
+    def record(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "avg_time": self.total_time / self.calls if self.calls else 0.0,
+            "max_time": self.max_time,
+            "last_time": self.last_time,
+        }
+
 
 class EventsManager:
     def __init__(self):
@@ -18,6 +53,8 @@ class EventsManager:
         self._events_subscribers: Dict[EventType, List[BaseEventHandler]] = {event: [] for event in EventType}
         self._handler_mapping: Dict[str, Type[BaseEventHandler]] = {}  # 事件处理器映射表
         self._handler_tasks: Dict[str, List[asyncio.Task]] = {}  # 事件处理器正在处理的任务
+        self._plugin_configs: Dict[str, Dict] = {}  # 插件配置缓存，插件名 -> 配置，插件注册变更时失效
+        self._handler_stats: Dict[str, HandlerStats] = {}  # 事件处理器执行统计，处理器名 -> 统计
 
     def register_event_subscriber(self, handler_info: EventHandlerInfo, handler_class: Type[BaseEventHandler]) -> bool:
         """注册事件处理器
@@ -40,6 +77,7 @@ class EventsManager:
             return False
 
         self._handler_mapping[handler_name] = handler_class
+        self.invalidate_plugin_config(handler_info.plugin_name)
         return self._insert_event_handler(handler_class, handler_info)
 
     async def handle_mai_events(
@@ -52,8 +90,6 @@ class EventsManager:
         action_usage: Optional[List[str]] = None,
     ) -> bool:
         """处理 events"""
-        from src.plugin_system.core import component_registry
-
         continue_flag = True
         transformed_message: Optional[MaiMessages] = None
         if not message:
@@ -66,26 +102,28 @@ class EventsManager:
                 )
         else:
             transformed_message = self._transform_event_message(message, llm_prompt, llm_response)
-        for handler in self._events_subscribers.get(event_type, []):
-            if transformed_message.stream_id:
-                stream_id = transformed_message.stream_id
-                if handler.handler_name in global_announcement_manager.get_disabled_chat_event_handlers(stream_id):
+
+        handlers = self._events_subscribers.get(event_type, [])
+        if not handlers:
+            return continue_flag
+        disabled_handlers = (
+            set(global_announcement_manager.get_disabled_chat_event_handlers(transformed_message.stream_id))
+            if transformed_message.stream_id
+            else set()
+        )
+
+        # 订阅者已按权重降序排列，同一权重为一个层级：层级之间按顺序执行，层级内的拦截型处理器并发执行
+        for _, tier in groupby(handlers, key=lambda h: h.weight):
+            intercepting_handlers: List[BaseEventHandler] = []
+            for handler in tier:
+                if handler.handler_name in disabled_handlers:
                     continue
-            handler.set_plugin_config(component_registry.get_plugin_config(handler.plugin_name) or {})
-            if handler.intercept_message:
-                try:
-                    success, continue_processing, result = await handler.execute(transformed_message)
-                    if not success:
-                        logger.error(f"EventHandler {handler.handler_name} 执行失败: {result}")
-                    else:
-                        logger.debug(f"EventHandler {handler.handler_name} 执行成功: {result}")
-                    continue_flag = continue_flag and continue_processing
-                except Exception as e:
-                    logger.error(f"EventHandler {handler.handler_name} 发生异常: {e}")
+                handler.set_plugin_config(self._get_plugin_config(handler.plugin_name))
+                if handler.intercept_message:
+                    intercepting_handlers.append(handler)
                     continue
-            else:
                 try:
-                    handler_task = asyncio.create_task(handler.execute(transformed_message))
+                    handler_task = asyncio.create_task(self._execute_handler(handler, transformed_message))
                     handler_task.add_done_callback(self._task_done_callback)
                     handler_task.set_name(f"{handler.plugin_name}-{handler.handler_name}")
                     if handler.handler_name not in self._handler_tasks:
@@ -94,8 +132,84 @@ class EventsManager:
                 except Exception as e:
                     logger.error(f"创建事件处理器任务 {handler.handler_name} 时发生异常: {e}")
                     continue
+
+            if not intercepting_handlers:
+                continue
+            results = await asyncio.gather(
+                *(
+                    self._execute_handler(handler, transformed_message, handler.timeout or DEFAULT_HANDLER_TIMEOUT)
+                    for handler in intercepting_handlers
+                ),
+                return_exceptions=True,
+            )
+            for handler, result in zip(intercepting_handlers, results, strict=True):
+                if isinstance(result, asyncio.TimeoutError):
+                    logger.warning(f"EventHandler {handler.handler_name} 执行超时，已跳过")
+                    continue
+                if isinstance(result, BaseException):
+                    logger.error(f"EventHandler {handler.handler_name} 发生异常: {result}")
+                    continue
+                success, continue_processing, handler_result = result
+                if not success:
+                    logger.error(f"EventHandler {handler.handler_name} 执行失败: {handler_result}")
+                else:
+                    logger.debug(f"EventHandler {handler.handler_name} 执行成功: {handler_result}")
+                continue_flag = continue_flag and continue_processing
         return continue_flag
 
+    async def _execute_handler(
+        self, handler: BaseEventHandler, message: MaiMessages, timeout: Optional[float] = None
+    ) -> Tuple[bool, bool, Optional[str]]:
+        """执行单个事件处理器并记录耗时、失败与超时统计"""
+        stats = self._handler_stats.setdefault(handler.handler_name, HandlerStats())
+        start_time = time.perf_counter()
+        try:
+            if timeout:
+                result = await asyncio.wait_for(handler.execute(message), timeout=timeout)
+            else:
+                result = await handler.execute(message)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.failures += 1
+            raise
+        finally:
+            stats.record(time.perf_counter() - start_time)
+        if not result[0]:
+            stats.failures += 1
+        return result
+
+    def _get_plugin_config(self, plugin_name: str) -> Dict:
+        """获取插件配置，命中缓存时不再查询组件注册中心"""
+        if (config := self._plugin_configs.get(plugin_name)) is not None:
+            return config
+        from src.plugin_system.core import component_registry
+
+        config = component_registry.get_plugin_config(plugin_name)
+        if config is None:
+            # 插件实例尚未加载完成，暂不缓存
+            return {}
+        self._plugin_configs[plugin_name] = config
+        return config
+
+    def invalidate_plugin_config(self, plugin_name: Optional[str] = None) -> None:
+        """使插件配置缓存失效
+
+        Args:
+            plugin_name (Optional[str]): 插件名称，为 None 时清空全部缓存
+        """
+        if plugin_name is None:
+            self._plugin_configs.clear()
+        else:
+            self._plugin_configs.pop(plugin_name, None)
+
+    def get_handler_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各事件处理器的执行耗时、失败与超时统计"""
+        return {name: stats.to_dict() for name, stats in self._handler_stats.items()}
+
     def _insert_event_handler(self, handler_class: Type[BaseEventHandler], handler_info: EventHandlerInfo) -> bool:
         """插入事件处理器到对应的事件类型列表中并设置其插件配置"""
         if handler_class.event_type == EventType.UNKNOWN:
@@ -120,6 +234,7 @@ class EventsManager:
         for i, handler in enumerate(handlers):
             if isinstance(handler, handler_class):
                 del handlers[i]
+                self.invalidate_plugin_config(handler.plugin_name)
                 logger.debug(f"事件处理器 {display_handler_name} 已移除")
                 return True
 
@@ -252,6 +367,7 @@ class EventsManager:
         await self.cancel_handler_tasks(handler_name)
 
         handler_class = self._handler_mapping.pop(handler_name)
+        self._handler_stats.pop(handler_name, None)
         if not self._remove_event_handler_instance(handler_class):
             return False
 
@@ -2,7 +2,7 @@ from typing import Dict, Any
 
 from src.common.logger import get_logger
 from src.config.config import global_config
-from src.chat.knowledge.knowledge_lib import qa_manager
+from src.chat.knowledge.knowledge_lib import qa_manager, knowledge_loader
 from src.plugin_system import BaseTool, ToolParamType
 
 logger = get_logger("lpmm_get_knowledge_tool")
@@ -36,6 +36,9 @@ class SearchKnowledgeFromLPMMTool(BaseTool):
             if qa_manager is None:
                 logger.debug("LPMM知识库已禁用，跳过知识获取")
                 return {"type": "info", "id": query, "content": "LPMM知识库已禁用"}
+            if not knowledge_loader.is_ready():
+                logger.debug("LPMM知识库仍在加载中，跳过知识获取")
+                return {"type": "info", "id": query, "content": "LPMM知识库正在加载中，暂时无法查询"}
 
             # 调用知识库搜索
 